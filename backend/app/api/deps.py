@@ -2,15 +2,12 @@
 Dependências compartilhadas para os endpoints da API
 """
 from typing import Annotated
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 
 from app.core.database import AsyncSessionLocal
-from app.core.config import settings
-from app.core.database import UserDB
+from app.core.security import AuthenticatedUser, authenticate_token
 
 security = HTTPBearer()
 
@@ -20,34 +17,9 @@ async def get_db() -> AsyncSession:
         yield session
 
 async def get_current_user(
-    credentials: Annotated[HTTPAuthorizationCredentials, Depends(security)],
-    db: Annotated[AsyncSession, Depends(get_db)]
-) -> UserDB:
+    credentials: Annotated[HTTPAuthorizationCredentials, Depends(security)]
+) -> AuthenticatedUser:
     """
-    Valida o token JWT e retorna o objeto User completo
+    Valida o token JWT e retorna o usuário autenticado (id, email, preferências)
     """
-    token = credentials.credentials
-    
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    # Buscar usuário no banco
-    from app.core.database import UserDB as UserModel
-    result = await db.execute(select(UserModel).filter(UserModel.email == email))
-    user = result.scalar_one_or_none()
-    
-    if user is None:
-        raise credentials_exception
-    
-    return user
+    return await authenticate_token(credentials.credentials)
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import String, case, func, select, tuple_, type_coerce, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 import uuid
 from app.core.database import get_db
 from app.models.activity import Activity
@@ -11,21 +12,56 @@ from app.core.database import UserDB as User
 
 router = APIRouter()
 
+def _encode_cursor(created_at, activity_id: str) -> str:
+    created_at = created_at.isoformat(sep=' ') if isinstance(created_at, datetime) else created_at
+    return f"{created_at},{activity_id}"
+
+def _decode_cursor(cursor: str, raw: bool):
+    created_at, _, activity_id = cursor.partition(",")
+    if not created_at or not activity_id:
+        raise HTTPException(status_code=400, detail="Invalid cursor, expected <created_at>,<id>")
+    if raw:
+        return created_at, activity_id
+    try:
+        return datetime.fromisoformat(created_at), activity_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor timestamp")
+
 @router.get("/")
 async def get_activities(
+    response: Response,
     limit: int = 10,
     skip: int = 0,
+    before: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get user activities (newest first)"""
-    stmt = select(Activity).filter(
+    """Get user activities (newest first).
+
+    Pass the X-Next-Cursor header of a page as `before` to get the next one;
+    `skip` (OFFSET) is kept for older clients.
+    """
+    limit = max(1, min(limit, 100))
+
+    # SQLite stores timestamps as text in more than one format; paging on
+    # the raw text keeps the cursor consistent with the index order
+    raw = db.get_bind().dialect.name == 'sqlite'
+    created_at = type_coerce(Activity.created_at, String) if raw else Activity.created_at
+
+    stmt = select(Activity, created_at.label("cursor_created_at")).filter(
         Activity.user_id == str(current_user.id),
-    ).order_by(Activity.created_at.desc()).offset(skip).limit(limit)
-    
-    result = await db.execute(stmt)
-    activities = result.scalars().all()
-    
+    ).order_by(created_at.desc(), Activity.id.desc()).limit(limit)
+
+    if before:
+        stmt = stmt.filter(tuple_(created_at, Activity.id) < tuple_(*_decode_cursor(before, raw)))
+    elif skip:
+        stmt = stmt.offset(skip)
+
+    rows = (await db.execute(stmt)).all()
+    if len(rows) == limit:
+        last, last_created_at = rows[-1]
+        response.headers["X-Next-Cursor"] = _encode_cursor(last_created_at, last.id)
+
     return [
         {
             "id": activity.id,
@@ -37,7 +73,7 @@ async def get_activities(
             "created_at": activity.created_at.isoformat() if activity.created_at else None,
             "read": activity.read
         }
-        for activity in activities
+        for activity, _ in rows
     ]
 
 @router.post("/", response_model=ActivityResponse)
@@ -86,19 +122,37 @@ async def mark_as_read(
     
     return {"success": True}
 
+@router.post("/read-all")
+async def mark_all_as_read(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Mark every unread activity as read"""
+    result = await db.execute(
+        update(Activity)
+        .where(Activity.user_id == str(current_user.id), Activity.read == 0)
+        .values(read=1)
+        .execution_options(synchronize_session=False)
+    )
+    # Bulk UPDATEs bypass the counter listeners
+    remaining = func.coalesce(User.unread_activities, 0) - result.rowcount
+    await db.execute(
+        update(User)
+        .where(User.id == str(current_user.id))
+        .values(unread_activities=case((remaining > 0, remaining), else_=0))
+    )
+    await db.commit()
+
+    return {"success": True, "marked": result.rowcount}
+
 @router.get("/unread-count")
 async def get_unread_count(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Get count of unread activities"""
-    stmt = select(Activity).filter(
-        Activity.user_id == str(current_user.id),
-        Activity.read == 0
+    result = await db.execute(
+        select(User.unread_activities).where(User.id == str(current_user.id))
     )
     
-    result = await db.execute(stmt)
-    activities = result.scalars().all()
-    count = len(activities)
-    
-    return {"count": count}
\ No newline at end of file
+    return {"count": result.scalar() or 0}
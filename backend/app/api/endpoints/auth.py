@@ -3,12 +3,12 @@ from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
 
 from app.core.security import (
-    verify_password, 
-    get_password_hash, 
+    PasswordPoolBusy,
     create_access_token,
-    get_current_user
+    get_current_user,
+    password_hasher
 )
-from app.core.database import get_db, AsyncSession
+from app.core.database import get_db, AsyncSession, UserDB
 from app.models.schemas import UserCreate, User, Token
 from app.core.config import settings
 
@@ -38,7 +38,10 @@ async def register(
     
     # Create new user
     print(f"🔐 Criando usuário: {user_data.email}")
-    hashed_password = get_password_hash(user_data.password)
+    try:
+        hashed_password = await password_hasher.hash(user_data.password)
+    except PasswordPoolBusy:
+        raise _busy()
     print(f"🔐 Hash gerado: {hashed_password[:20]}...")
     
     new_user = UserDB(
@@ -90,7 +93,10 @@ async def login_handler(
     print(f"✅ Usuário encontrado: {user.id}")
     
     # Verify password
-    password_valid = verify_password(form_data.password, user.hashed_password)
+    try:
+        password_valid = await password_hasher.verify(form_data.password, user.hashed_password)
+    except PasswordPoolBusy:
+        raise _busy()
     
     if not password_valid:
         print(f"❌ Senha incorreta para: {form_data.username}")
@@ -102,6 +108,14 @@ async def login_handler(
     
     print(f"✅ Senha correta para: {form_data.username}")
     
+    # Upgrade hashes made with an older cost factor while we have the password
+    if password_hasher.needs_rehash(user.hashed_password):
+        try:
+            user.hashed_password = await password_hasher.hash(form_data.password)
+            await db.commit()
+        except PasswordPoolBusy:
+            pass  # next login will try again
+    
     # Create token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -117,6 +131,13 @@ async def login_handler(
         token_type="bearer"
     )
 
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many login attempts in progress, try again shortly",
+        headers={"Retry-After": "1"},
+    )
+
 @router.post("/token", response_model=Token)
 async def login_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
@@ -135,17 +156,22 @@ async def login(
 
 @router.get("/me", response_model=User)
 async def get_me(
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get current user information"""
+    # The auth cache holds identity only; counters are read fresh
+    user = await db.get(UserDB, current_user.id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
     
     return User(
-        id=current_user.id,
-        email=current_user.email,
-        total_monthly_spend=current_user.total_monthly_spend,
-        total_subscriptions=current_user.total_subscriptions,
-        total_savings_to_date=current_user.total_savings_to_date,
-        optimizations_completed=current_user.optimizations_completed,
-        created_at=current_user.created_at,
-        updated_at=current_user.updated_at
+        id=user.id,
+        email=user.email,
+        total_monthly_spend=user.total_monthly_spend,
+        total_subscriptions=user.total_subscriptions,
+        total_savings_to_date=user.total_savings_to_date,
+        optimizations_completed=user.optimizations_completed,
+        created_at=user.created_at,
+        updated_at=user.updated_at
     )
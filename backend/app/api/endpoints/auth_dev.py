@@ -52,8 +52,8 @@ async def login_for_access_token(
     else:
         # Tentar verificação normal (pode falhar se bcrypt tiver problemas)
         try:
-            from app.core.security import verify_password
-            if not verify_password(form_data.password, user.hashed_password):
+            from app.core.security import password_hasher
+            if not await password_hasher.verify(form_data.password, user.hashed_password):
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Incorrect password",
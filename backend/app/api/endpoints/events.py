@@ -0,0 +1,84 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import select
+from typing import Optional
+import json
+import logging
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, UserDB
+from app.core.security import (
+    AuthenticatedUser,
+    authenticate_token,
+    create_stream_ticket,
+    get_current_user,
+    redeem_stream_ticket,
+)
+from app.services.event_bus import event_bus
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+optional_bearer = HTTPBearer(auto_error=False)
+
+
+async def get_stream_user(
+    ticket: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_bearer),
+) -> AuthenticatedUser:
+    """Authenticate by bearer header or a one-time ?ticket= (EventSource cannot set headers)"""
+    if credentials:
+        # Same token and user caches (and invalidation) as every other endpoint
+        return await authenticate_token(credentials.credentials)
+    if ticket:
+        return await redeem_stream_ticket(ticket)
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+@router.post("/ticket")
+async def create_ticket(user: AuthenticatedUser = Depends(get_current_user)):
+    """One-time ticket for opening /stream, so the access token stays out of URLs"""
+    return {"ticket": create_stream_ticket(user), "expires_in": settings.EVENT_STREAM_TICKET_TTL_SECONDS}
+
+
+async def unread_count(user_id: str) -> int:
+    # Short-lived session: the stream itself holds no connection
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(UserDB.unread_activities).where(UserDB.id == user_id)) or 0
+
+
+def format_event(event_type: str, data, event_id=None) -> str:
+    lines = [f"event: {event_type}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+@router.get("/stream")
+async def stream_events(request: Request, user: AuthenticatedUser = Depends(get_stream_user)):
+    """Server-Sent Events: new activities and negotiation updates for the user"""
+    subscription = event_bus.subscribe(user.id)
+
+    async def events():
+        try:
+            yield format_event("ready", {"unread_count": await unread_count(user.id)})
+            while not await request.is_disconnected():
+                message = await subscription.get(timeout=settings.EVENT_STREAM_HEARTBEAT_SECONDS)
+                if message is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_event(message["event"], message["data"], message["id"])
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
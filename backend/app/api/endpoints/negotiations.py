@@ -1,14 +1,28 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
+import json
 import uuid
 import logging
 
-from app.core.database import get_db, NegotiationDB
+from app.core.database import get_db, AsyncSessionLocal, NegotiationDB
 from app.models.activity import Activity
+from app.core.config import settings
 from app.core.security import get_current_user
+from app.api.endpoints.events import format_event
+from app.services.ai_negotiator import AINegotiator, parse_provider_response
+from app.services.event_bus import publish_on_commit
+from app.services.llm_client import llm_client
+from app.services.monthly_report import invalidate_reports
+from app.services.negotiation_messages import (
+    MessageConflict,
+    append_messages,
+    get_messages,
+    migrate_legacy_messages,
+)
 from app.models.schemas import (
     NegotiationResponse,
     NegotiationCreate,
@@ -41,7 +55,8 @@ async def get_negotiations(
         result = await db.execute(query)
         negotiations = result.scalars().all()
         
-        return negotiations
+        # Chats are paged through /{id}/messages; listing stays O(negotiations)
+        return [_negotiation_response(negotiation) for negotiation in negotiations]
     except Exception as e:
         logger.error(f"Error fetching negotiations: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -68,7 +83,13 @@ async def get_negotiation(
         if not negotiation:
             raise HTTPException(status_code=404, detail="Negotiation not found")
         
-        return negotiation
+        await migrate_legacy_messages(db, negotiation)
+        messages = await get_messages(db, negotiation_id, settings.NEGOTIATION_MESSAGES_PAGE_SIZE)
+        await db.commit()
+        
+        return _negotiation_response(negotiation, messages)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching negotiation: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -101,11 +122,14 @@ async def create_negotiation(
             provider_name=negotiation.provider_name,
             current_plan=negotiation.current_plan,
             proposed_savings=negotiation.proposed_savings,
-            messages=[initial_message],
+            message_count=0,
+            messages=[],
             expires_at=datetime.utcnow() + timedelta(days=7)
         )
         
         db.add(db_negotiation)
+        await db.flush()
+        messages = await append_messages(db, db_negotiation, [initial_message])
         await db.commit()
         await db.refresh(db_negotiation)
         
@@ -127,11 +151,46 @@ async def create_negotiation(
         db.add(activity)
         await db.commit()
         
-        return db_negotiation
+        return _negotiation_response(db_negotiation, messages)
     except Exception as e:
         logger.error(f"Error creating negotiation: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# ============================================================================
+# GET - Histórico de mensagens (paginado)
+# ============================================================================
+@router.get("/{negotiation_id}/messages")
+async def get_negotiation_messages(
+    negotiation_id: str,
+    limit: Optional[int] = None,
+    after_seq: Optional[int] = None,
+    before_seq: Optional[int] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Page through the chat: after_seq reads forward, before_seq loads older messages"""
+    result = await db.execute(
+        select(NegotiationDB).where(
+            NegotiationDB.id == negotiation_id,
+            NegotiationDB.user_id == str(current_user.id)
+        )
+    )
+    negotiation = result.scalar_one_or_none()
+    
+    if not negotiation:
+        raise HTTPException(status_code=404, detail="Negotiation not found")
+    
+    await migrate_legacy_messages(db, negotiation)
+    limit = max(1, min(limit or settings.NEGOTIATION_MESSAGES_PAGE_SIZE, 200))
+    messages = await get_messages(db, negotiation_id, limit, after_seq=after_seq, before_seq=before_seq)
+    await db.commit()
+    
+    return {
+        "messages": messages,
+        "message_count": negotiation.message_count or 0,
+        "has_more": len(messages) == limit
+    }
+
 # ============================================================================
 # POST - Enviar mensagem no chat
 # ============================================================================
@@ -139,10 +198,16 @@ async def create_negotiation(
 async def send_message(
     negotiation_id: str,
     message: str,
+    expected_count: Optional[int] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Send message in negotiation chat"""
+    """Send message in negotiation chat.
+
+    Returns only the two new messages. Pass the message_count last seen as
+    expected_count to get 409 instead of appending after messages the
+    client has not seen.
+    """
     try:
         # Buscar negociação
         result = await db.execute(
@@ -166,9 +231,6 @@ async def send_message(
             "timestamp": datetime.utcnow().isoformat()
         }
         
-        messages = negotiation.messages or []
-        messages.append(user_message)
-        
         # Resposta simulada do provedor (mock)
         provider_response = _get_provider_response(message, negotiation.provider_name)
         provider_message = {
@@ -176,14 +238,31 @@ async def send_message(
             "content": provider_response,
             "timestamp": datetime.utcnow().isoformat()
         }
-        messages.append(provider_message)
         
-        # Atualizar negociação
-        negotiation.messages = messages
-        negotiation.updated_at = datetime.utcnow()
+        # Append-only: a concurrent send moves message_count on, so re-read
+        # and retry, unless the client pinned the version it last saw
+        for attempt in range(settings.NEGOTIATION_APPEND_RETRIES):
+            try:
+                messages = await append_messages(
+                    db, negotiation, [user_message, provider_message], expected_count
+                )
+                break
+            except MessageConflict as conflict:
+                await db.rollback()
+                if expected_count is not None or attempt == settings.NEGOTIATION_APPEND_RETRIES - 1:
+                    raise HTTPException(
+                        status_code=409,
+                        detail=f"Negotiation has {conflict.actual} messages, expected {conflict.expected}"
+                    )
+                await db.refresh(negotiation)
         
+        # Only the new messages are pushed; clients append them
+        publish_on_commit(db, str(current_user.id), "negotiation.message", {
+            "negotiation_id": negotiation_id,
+            "messages": messages,
+            "message_count": negotiation.message_count
+        })
         await db.commit()
-        await db.refresh(negotiation)
         
         # Log activity
         activity = Activity(
@@ -194,7 +273,7 @@ async def send_message(
             description=f"Sent: {message[:50]}...",
             meta_data=str({
                 "negotiation_id": negotiation_id,
-                "message_count": len(messages)
+                "message_count": negotiation.message_count
             }),
             read=0
         )
@@ -204,12 +283,185 @@ async def send_message(
         return {
             "success": True,
             "messages": messages,
+            "message_count": negotiation.message_count,
             "provider_response": provider_response
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error sending message: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# ============================================================================
+# POST - Enviar mensagem com resposta em streaming (SSE)
+# ============================================================================
+@router.post("/{negotiation_id}/message/stream")
+async def stream_message(
+    negotiation_id: str,
+    message: str,
+    expected_count: Optional[int] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Send message and relay the provider reply as Server-Sent Events.
+
+    Emits "token" events with the visible text as it is generated (a
+    trailing FINAL_OFFER marker is never shown), then "done" with the
+    persisted messages and any final offer, or "error". Nothing is stored
+    until the reply is complete.
+    """
+    user_id = str(current_user.id)
+
+    # Short-lived session: no connection is held while the reply streams
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(NegotiationDB).where(
+                NegotiationDB.id == negotiation_id,
+                NegotiationDB.user_id == user_id
+            )
+        )
+        negotiation = result.scalar_one_or_none()
+        
+        if not negotiation:
+            raise HTTPException(status_code=404, detail="Negotiation not found")
+        
+        if negotiation.status == "expired":
+            raise HTTPException(status_code=400, detail="Negotiation expired")
+        
+        await migrate_legacy_messages(db, negotiation)
+        if expected_count is not None and expected_count != (negotiation.message_count or 0):
+            # Fail before generating a reply that could not be stored
+            raise HTTPException(
+                status_code=409,
+                detail=f"Negotiation has {negotiation.message_count or 0} messages, expected {expected_count}"
+            )
+        history = await get_messages(db, negotiation_id, 3)
+        await db.commit()
+        provider_name = negotiation.provider_name
+        current_plan = negotiation.current_plan or ""
+        proposed_savings = negotiation.proposed_savings or 0
+    
+    user_message = {
+        "role": "user",
+        "content": message,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+    if llm_client.enabled:
+        reply = AINegotiator().stream_provider_response(
+            provider_name, current_plan, proposed_savings, history + [user_message]
+        )
+    else:
+        reply = _mock_stream(_get_provider_response(message, provider_name))
+    
+    async def events():
+        parsed = None
+        try:
+            async for kind, value in reply:
+                if kind == "token":
+                    yield format_event("token", {"text": value})
+                else:
+                    parsed = value
+        except Exception as e:
+            logger.error(f"Error streaming provider response: {e}")
+            yield format_event("error", {"status_code": 502, "detail": "Provider response failed"})
+            return
+        
+        provider_message = {
+            "role": "provider",
+            "content": parsed["content"],
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        final_offer = None
+        changes = {}
+        if parsed["ready_for_offer"]:
+            final_offer = {
+                "plan": current_plan,
+                "price": parsed["offer_price"],
+                "savings": proposed_savings,
+                "terms": parsed["offer_terms"]
+            }
+            changes["final_offer"] = final_offer
+        
+        try:
+            messages, message_count = await _persist_streamed_reply(
+                negotiation_id, user_id, [user_message, provider_message], expected_count, changes
+            )
+        except HTTPException as e:
+            yield format_event("error", {"status_code": e.status_code, "detail": e.detail})
+            return
+        except Exception as e:
+            logger.error(f"Error saving streamed message: {e}")
+            yield format_event("error", {"status_code": 500, "detail": str(e)})
+            return
+        
+        yield format_event("done", {
+            "messages": messages,
+            "message_count": message_count,
+            "final_offer": final_offer
+        })
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _mock_stream(text: str):
+    """Word-by-word replay of the mock reply, shaped like AINegotiator's stream"""
+    words = text.split(" ")
+    for index, word in enumerate(words):
+        yield "token", word if index == len(words) - 1 else word + " "
+    yield "done", parse_provider_response(text)
+
+
+async def _persist_streamed_reply(negotiation_id: str, user_id: str, new_messages: List[dict],
+                                  expected_count: Optional[int], changes: dict):
+    """Append the finished turn; same conflict rules as send_message"""
+    async with AsyncSessionLocal() as db:
+        for attempt in range(settings.NEGOTIATION_APPEND_RETRIES):
+            result = await db.execute(
+                select(NegotiationDB).where(NegotiationDB.id == negotiation_id)
+            )
+            negotiation = result.scalar_one()
+            try:
+                messages = await append_messages(db, negotiation, new_messages, expected_count, **changes)
+                break
+            except MessageConflict as conflict:
+                await db.rollback()
+                if expected_count is not None or attempt == settings.NEGOTIATION_APPEND_RETRIES - 1:
+                    raise HTTPException(
+                        status_code=409,
+                        detail=f"Negotiation has {conflict.actual} messages, expected {conflict.expected}"
+                    )
+                db.expunge_all()
+        
+        if changes:
+            # final_offer went through a Core UPDATE, not the report listeners
+            await invalidate_reports(db, [user_id])
+        publish_on_commit(db, user_id, "negotiation.message", {
+            "negotiation_id": negotiation_id,
+            "messages": messages,
+            "message_count": negotiation.message_count,
+            "final_offer": changes.get("final_offer")
+        })
+        await db.commit()
+        
+        activity = Activity(
+            id=str(uuid.uuid4()),
+            user_id=user_id,
+            activity_type="negotiation_message",
+            title=f"Message in {negotiation.provider_name} negotiation",
+            description=f"Sent: {new_messages[0]['content'][:50]}...",
+            meta_data=str({
+                "negotiation_id": negotiation_id,
+                "message_count": negotiation.message_count
+            }),
+            read=0
+        )
+        db.add(activity)
+        await db.commit()
+        return messages, negotiation.message_count
+
 # ============================================================================
 # POST - Aceitar oferta
 # ============================================================================
@@ -245,6 +497,11 @@ async def accept_offer(
         negotiation.final_offer = final_offer
         negotiation.updated_at = datetime.utcnow()
         
+        publish_on_commit(db, str(current_user.id), "negotiation.updated", {
+            "negotiation_id": negotiation_id,
+            "status": "accepted",
+            "final_offer": final_offer
+        })
         await db.commit()
         
         # Log activity
@@ -298,6 +555,10 @@ async def reject_negotiation(
         negotiation.status = "rejected"
         negotiation.updated_at = datetime.utcnow()
         
+        publish_on_commit(db, str(current_user.id), "negotiation.updated", {
+            "negotiation_id": negotiation_id,
+            "status": "rejected"
+        })
         await db.commit()
         
         # Log activity
@@ -358,141 +619,29 @@ def _get_provider_response(user_message: str, provider_name: str) -> str:
     
     # Retorna resposta pseudo-aleatória
     return provider_responses[len(user_message) % len(provider_responses)]
-@router.post("/{negotiation_id}/message")
-async def send_message(
-    negotiation_id: str,
-    message: str,
-    current_user = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
-):
-    """Send a message in negotiation (AI will respond as provider)"""
-    from sqlalchemy import select, update
-    from app.core.database import NegotiationDB
-    from app.services.ai_negotiator import AINegotiator
-    import json
-    
-    # Get negotiation
-    result = await db.execute(
-        select(NegotiationDB).where(
-            NegotiationDB.id == negotiation_id,
-            NegotiationDB.user_id == current_user.id
-        )
-    )
-    negotiation = result.scalar_one_or_none()
-    
-    if not negotiation:
-        raise HTTPException(status_code=404, detail="Negotiation not found")
-    
-    # Parse current messages
-    current_messages = json.loads(negotiation.messages) if isinstance(negotiation.messages, str) else negotiation.messages
-    
-    # Add user message
-    current_messages.append({
-        "role": "user",
-        "content": message,
-        "timestamp": datetime.utcnow().isoformat()
-    })
-    
-    # AI generates provider response
-    ai_negotiator = AINegotiator()
-    provider_response = await ai_negotiator.generate_provider_response(
-        provider_name=negotiation.provider_name,
-        current_plan=negotiation.current_plan,
-        proposed_savings=negotiation.proposed_savings,
-        message_history=current_messages
-    )
-    
-    current_messages.append({
-        "role": "provider",
-        "content": provider_response["content"],
-        "timestamp": datetime.utcnow().isoformat()
-    })
-    
-    # Check if should generate final offer
-    if provider_response.get("ready_for_offer"):
-        final_offer = {
-            "plan": negotiation.current_plan,
-            "price": provider_response["offer_price"],
-            "savings": negotiation.proposed_savings,
-            "terms": provider_response["offer_terms"]
-        }
-        
-        await db.execute(
-            update(NegotiationDB)
-            .where(NegotiationDB.id == negotiation_id)
-            .values(
-                messages=json.dumps(current_messages),
-                final_offer=json.dumps(final_offer),
-                updated_at=datetime.utcnow()
-            )
-        )
-    else:
-        await db.execute(
-            update(NegotiationDB)
-            .where(NegotiationDB.id == negotiation_id)
-            .values(
-                messages=json.dumps(current_messages),
-                updated_at=datetime.utcnow()
-            )
-        )
-    
-    await db.commit()
-    
+
+
+def _negotiation_response(negotiation: NegotiationDB, messages: Optional[List[dict]] = None) -> dict:
+    """NegotiationResponse fields; messages is the page the caller loaded"""
+    final_offer = negotiation.final_offer
+    if isinstance(final_offer, str):  # written with json.dumps by older code
+        final_offer = json.loads(final_offer)
     return {
-        "messages": current_messages,
-        "final_offer": final_offer if provider_response.get("ready_for_offer") else None
+        "id": negotiation.id,
+        "user_id": negotiation.user_id,
+        "optimization_id": negotiation.optimization_id,
+        "subscription_id": negotiation.subscription_id,
+        "provider_name": negotiation.provider_name,
+        "current_plan": negotiation.current_plan or "",
+        "proposed_savings": negotiation.proposed_savings or 0,
+        "status": negotiation.status,
+        "messages": messages or [],
+        # Legacy chats are counted from the JSON array until they are moved
+        "message_count": negotiation.message_count or len(negotiation.messages or []),
+        "offer_accepted": bool(negotiation.offer_accepted),
+        "final_offer": final_offer,
+        "notes": negotiation.notes,
+        "created_at": negotiation.created_at,
+        "updated_at": negotiation.updated_at,
+        "expires_at": negotiation.expires_at,
     }
-
-@router.post("/{negotiation_id}/accept")
-async def accept_offer(
-    negotiation_id: str,
-    current_user = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
-):
-    """Accept the final offer"""
-    from sqlalchemy import select, update
-    from app.core.database import NegotiationDB, Activity
-    import json
-    import uuid
-    
-    result = await db.execute(
-        select(NegotiationDB).where(
-            NegotiationDB.id == negotiation_id,
-            NegotiationDB.user_id == current_user.id
-        )
-    )
-    negotiation = result.scalar_one_or_none()
-    
-    if not negotiation:
-        raise HTTPException(status_code=404, detail="Negotiation not found")
-    
-    # Update negotiation
-    await db.execute(
-        update(NegotiationDB)
-        .where(NegotiationDB.id == negotiation_id)
-        .values(
-            status="accepted",
-            offer_accepted=True,
-            updated_at=datetime.utcnow()
-        )
-    )
-    
-    # Log activity
-    activity = Activity(
-        id=str(uuid.uuid4()),
-        user_id=current_user.id,
-        activity_type="negotiation_accepted",
-        title=f"Offer accepted for {negotiation.provider_name}",
-        description=f"Accepted negotiation with savings of R$ {negotiation.proposed_savings:.2f}/month",
-        meta_data=json.dumps({
-            "negotiation_id": negotiation_id,
-            "provider": negotiation.provider_name,
-            "savings": negotiation.proposed_savings
-        }),
-        read=0
-    )
-    db.add(activity)
-    
-    await db.commit()
-    
-    return {"success": True, "message": "Offer accepted successfully!"}
@@ -12,6 +12,10 @@ from app.models.schemas import (
     MonthlyTrend
 )
 from app.services.optimizer import SubscriptionOptimizer
+from app.services.monthly_report import invalidate_reports
+from app.services.monthly_rollup import get_user_trends
+from app.services.negotiation_messages import append_messages
+from app.services.user_stats import refresh_user_stats
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -145,6 +149,9 @@ async def execute_optimization(
                 )
             )
         
+        # Bulk UPDATEs bypass the ORM counter and report listeners
+        await refresh_user_stats(db, [current_user.id])
+        await invalidate_reports(db, [current_user.id])
         await db.commit()
         
         # Background task to update user statistics
@@ -245,49 +252,11 @@ async def get_dashboard_summary(
 ):
     """Get dashboard summary"""
     try:
-        from sqlalchemy import select, func
-        from app.core.database import SubscriptionDB, OptimizationDB
-        from datetime import datetime, timedelta
-        
-        # Total monthly spend
-        spend_result = await db.execute(
-            select(func.coalesce(func.sum(SubscriptionDB.monthly_cost), 0))
-            .where(
-                SubscriptionDB.user_id == current_user.id,
-                SubscriptionDB.status == "active"
-            )
-        )
-        total_monthly_spend = spend_result.scalar() or 0
-        
-        # Total subscriptions
-        subs_result = await db.execute(
-            select(func.count(SubscriptionDB.id))
-            .where(
-                SubscriptionDB.user_id == current_user.id,
-                SubscriptionDB.status == "active"
-            )
-        )
-        total_subscriptions = subs_result.scalar() or 0
-        
-        # Potential savings from pending optimizations
-        savings_result = await db.execute(
-            select(func.coalesce(func.sum(OptimizationDB.monthly_savings), 0))
-            .where(
-                OptimizationDB.user_id == current_user.id,
-                OptimizationDB.executed == False
-            )
-        )
-        potential_savings = savings_result.scalar() or 0
+        from sqlalchemy import select
+        from app.core.database import OptimizationDB, UserDB
         
-        # Completed optimizations
-        completed_result = await db.execute(
-            select(func.count(OptimizationDB.id))
-            .where(
-                OptimizationDB.user_id == current_user.id,
-                OptimizationDB.executed == True
-            )
-        )
-        optimizations_completed = completed_result.scalar() or 0
+        # Counters are pre-aggregated on the user row
+        stats = await db.get(UserDB, current_user.id)
         
         # Recent activity
         activity_result = await db.execute(
@@ -309,10 +278,10 @@ async def get_dashboard_summary(
         ]
         
         return DashboardSummary(
-            total_monthly_spend=total_monthly_spend,
-            total_subscriptions=total_subscriptions,
-            potential_savings=potential_savings,
-            optimizations_completed=optimizations_completed,
+            total_monthly_spend=stats.total_monthly_spend or 0,
+            total_subscriptions=stats.total_subscriptions or 0,
+            potential_savings=stats.potential_savings or 0,
+            optimizations_completed=stats.optimizations_completed or 0,
             recent_activity=recent_activity
         )
         
@@ -327,31 +296,18 @@ async def get_monthly_trends(
     db: AsyncSession = Depends(get_db)
 ):
     """Get monthly spending trends"""
-    # For MVP, return mock data
-    # In production, would query historical data
-    
-    import random
-    from datetime import datetime, timedelta
-    
-    trends = []
-    base_date = datetime.utcnow()
-    
-    for i in range(months, 0, -1):
-        month_date = base_date - timedelta(days=30*i)
-        month_str = month_date.strftime("%b %Y")
-        
-        # Mock data
-        base_spend = 500 + random.uniform(-100, 100)
-        base_savings = 100 + random.uniform(-30, 30)
-        
-        trends.append(MonthlyTrend(
-            month=month_str,
-            spend=round(base_spend, 2),
-            savings=round(base_savings, 2),
-            subscriptions=random.randint(10, 15)
-        ))
-    
-    return trends
+    months = max(1, min(months, 60))
+    snapshots = await get_user_trends(db, current_user.id, months)
+
+    return [
+        MonthlyTrend(
+            month=snapshot.month.strftime("%b %Y"),
+            spend=round(snapshot.spend or 0, 2),
+            savings=round(snapshot.savings or 0, 2),
+            subscriptions=snapshot.subscriptions or 0
+        )
+        for snapshot in snapshots
+    ]
 
 async def _execute_optimization_action(optimization, subscription, db: AsyncSession, user_id: str):
     """Execute specific optimization action"""
@@ -445,15 +401,18 @@ async def _execute_negotiate(optimization, subscription, db: AsyncSession, user_
             provider_name=subscription.service_name,
             current_plan=optimization.current_plan,
             proposed_savings=optimization.monthly_savings,
-            messages=[{
-                "role": "ai",
-                "content": f"Hello! I've analyzed your {subscription.service_name} subscription ({optimization.current_plan} plan at R$ {subscription.monthly_cost:.2f}/month). Based on your {(datetime.utcnow() - timedelta(days=365)).strftime('%B %Y')} subscription start date, I believe we can negotiate a discount. I'm reaching out to {subscription.service_name} on your behalf to secure a potential saving of R$ {optimization.monthly_savings:.2f}/month. I'll keep you updated on their response.",
-                "timestamp": datetime.utcnow().isoformat()
-            }],
+            message_count=0,
+            messages=[],
             expires_at=datetime.utcnow() + timedelta(days=7)
         )
         
         db.add(negotiation)
+        await db.flush()
+        await append_messages(db, negotiation, [{
+            "role": "ai",
+            "content": f"Hello! I've analyzed your {subscription.service_name} subscription ({optimization.current_plan} plan at R$ {subscription.monthly_cost:.2f}/month). Based on your {(datetime.utcnow() - timedelta(days=365)).strftime('%B %Y')} subscription start date, I believe we can negotiate a discount. I'm reaching out to {subscription.service_name} on your behalf to secure a potential saving of R$ {optimization.monthly_savings:.2f}/month. I'll keep you updated on their response.",
+            "timestamp": datetime.utcnow().isoformat()
+        }])
         await db.commit()
         
         # Log activity
@@ -498,12 +457,13 @@ async def update_user_stats(user_id: str, savings: float, db: AsyncSession):
         from sqlalchemy import update
         from app.core.database import UserDB
         
+        # Core update, so no after_update listener runs; it changes none of
+        # the fields AuthenticatedUser caches, so the auth cache stays valid
         await db.execute(
             update(UserDB)
             .where(UserDB.id == user_id)
             .values(
                 total_savings_to_date=UserDB.total_savings_to_date + savings,
-                optimizations_completed=UserDB.optimizations_completed + 1,
                 updated_at=datetime.utcnow()
             )
         )
@@ -1,20 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, UploadFile, File
 from typing import List, Optional
 import logging
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 import json
+import os
+import shutil
+import tempfile
 import uuid
 from datetime import datetime, timedelta
+from starlette.concurrency import run_in_threadpool
 
 from app.services.email_parser import EmailParser
 from app.services.bank_analyzer import BankAnalyzer
 from app.services.optimizer import SubscriptionOptimizer
+from app.services.subscription_store import bulk_upsert_subscriptions
 from app.models.schemas import (
     Subscription, SubscriptionCreate, SubscriptionUpdate,
     SubscriptionAnalysis, OptimizationRecommendation,
     ApplyRecommendationRequest, ApplyRecommendationResponse
 )
-from app.core.database import get_db, AsyncSession, SubscriptionDB, OptimizationDB
+from app.core.database import get_db, AsyncSession, AsyncSessionLocal, SubscriptionDB, OptimizationDB
 from app.models.activity import Activity as ActivityDB
 from app.core.security import get_current_user
 
@@ -32,26 +38,13 @@ async def detect_subscriptions_from_email(
         parser = EmailParser()
         subscriptions = await parser.analyze_user_email(current_user.id)
         
-        for sub_data in subscriptions:
-            existing = await db.execute(
-                select(SubscriptionDB).where(
-                    SubscriptionDB.user_id == current_user.id,
-                    SubscriptionDB.service_name == sub_data["service_name"]
-                )
-            )
-            if not existing.scalar_one_or_none():
-                subscription = SubscriptionDB(
-                    user_id=current_user.id,
-                    **sub_data
-                )
-                db.add(subscription)
-        
-        await db.commit()
+        await bulk_upsert_subscriptions(
+            db, current_user.id, subscriptions, detection_source="email"
+        )
         
         background_tasks.add_task(
             analyze_subscriptions_async,
-            current_user.id,
-            db
+            current_user.id
         )
         
         return subscriptions
@@ -60,6 +53,44 @@ async def detect_subscriptions_from_email(
         logger.error(f"Error detecting subscriptions: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/detect/bank")
+async def detect_subscriptions_from_bank(
+    background_tasks: BackgroundTasks,
+    statement: UploadFile = File(...),
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Detect subscriptions from an uploaded CSV/OFX bank statement"""
+    suffix = os.path.splitext(statement.filename or "")[1].lower() or ".csv"
+    # Disk writes stay off the event loop
+    path = await run_in_threadpool(_save_upload, statement.file, suffix)
+    try:
+        detected = await BankAnalyzer().analyze_file(path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        await run_in_threadpool(os.unlink, path)
+    
+    try:
+        created = await bulk_upsert_subscriptions(
+            db, current_user.id, detected, detection_source="bank"
+        )
+    except Exception as e:
+        logger.error(f"Error storing bank subscriptions: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if created:
+        background_tasks.add_task(
+            analyze_subscriptions_async,
+            current_user.id
+        )
+    
+    return {
+        "detected": len(detected),
+        "created": len(created),
+        "subscriptions": detected
+    }
+
 @router.get("/", response_model=List[Subscription])
 async def get_subscriptions(
     current_user = Depends(get_current_user),
@@ -228,22 +259,33 @@ async def optimize_subscription(
     
     return recommendation
 
-async def analyze_subscriptions_async(user_id: str, db: AsyncSession):
-    """Background task to analyze all subscriptions"""
+def _save_upload(source, suffix: str) -> str:
+    """Copy an upload to a named temporary file and return its path"""
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        shutil.copyfileobj(source, tmp)
+    return tmp.name
+
+async def analyze_subscriptions_async(user_id: str):
+    """Background task to analyze all subscriptions.
+
+    Runs after the response is sent, when the request's session is already
+    closed, so it opens its own.
+    """
     try:
-        result = await db.execute(
-            select(SubscriptionDB).where(SubscriptionDB.user_id == user_id)
-        )
-        subscriptions = result.scalars().all()
-        
-        optimizer = SubscriptionOptimizer()
-        
-        for subscription in subscriptions:
-            analysis = await optimizer.analyze(subscription)
-            recommendations = await optimizer.generate_recommendations(
-                subscription, 
-                analysis
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(SubscriptionDB).where(SubscriptionDB.user_id == user_id)
             )
+            subscriptions = result.scalars().all()
+            
+            optimizer = SubscriptionOptimizer()
+            analyses = await optimizer.analyze_batch(subscriptions)
+            
+            for subscription, analysis in zip(subscriptions, analyses):
+                recommendations = await optimizer.generate_recommendations(
+                    subscription, 
+                    analysis
+                )
                 
     except Exception as e:
         logger.error(f"Error in background analysis: {e}")
@@ -309,6 +351,12 @@ async def create_subscription_endpoint(
             created_at=new_subscription.created_at.isoformat() if new_subscription.created_at else "",
             updated_at=new_subscription.updated_at.isoformat() if new_subscription.updated_at else ""
         )
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail=f"Subscription to {subscription_data.service_name} already exists"
+        )
     except Exception as e:
         logger.error(f"Error creating subscription: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -16,11 +16,62 @@ class Settings(BaseSettings):
     
     # Database (SQLite para desenvolvimento rápido)
     DATABASE_URL: str = "sqlite+aiosqlite:///./subguard.db"
+    DB_ECHO: bool = False  # log every SQL statement
+    DB_POOL_SIZE: int = 10  # Postgres only: connections kept open per process
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800  # seconds; below typical server/proxy idle timeouts
+    DB_POOL_PRE_PING: bool = True
+    SQLITE_WAL: bool = True
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 65536
     
     # Gemini AI
     GEMINI_API_KEY: str = ""
     GEMINI_MODEL: str = "gemini-pro"
-    
+    GEMINI_MAX_CONCURRENCY: int = 8  # simultaneous calls per process
+    GEMINI_TIMEOUT_SECONDS: float = 30.0
+    LLM_BATCH_SIZE: int = 20  # subscriptions packed into one analysis prompt
+    LLM_CACHE_MAX_ENTRIES: int = 2048
+    LLM_CACHE_TTL_SECONDS: float = 86400.0
+    LLM_CACHE_DB_PATH: str = ""  # SQLite file for a persistent cache tier; empty = memory only
+    LLM_BACKEND: str = "gemini"  # "local" = canned responses, no network (load tests)
+    LLM_LOCAL_LATENCY_MS: float = 800.0  # median simulated latency
+    LLM_LOCAL_LATENCY_SIGMA: float = 0.5  # lognormal spread; 0 = constant
+    LLM_LOCAL_ERROR_RATE: float = 0.0  # share of calls that fail
+    LLM_LOCAL_SEED: int = 0
+    LLM_LATENCY_BUDGET_SECONDS: float = 2.0  # interactive analyses fall back to rules beyond this; 0 = at once
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 5  # consecutive failed or over-budget calls
+    LLM_BREAKER_RESET_SECONDS: float = 30.0  # open time before a probe call
+
+    # Merchant recognition
+    MERCHANT_ALIASES_PATH: str = ""  # JSON {service: [aliases]} or CSV alias,service
+    MERCHANT_MATCH_CACHE_SIZE: int = 8192
+
+    # Market prices
+    MARKET_CATALOG_PATH: str = ""  # versioned JSON or CSV catalog; empty = built-in table
+    MARKET_CATALOG_RELOAD_SECONDS: float = 30.0
+
+    # Fleet-wide optimization sweep
+    SWEEP_PAGE_SIZE: int = 500  # users per page
+    SWEEP_WORKERS: int = os.cpu_count() or 1
+    SWEEP_LLM_RATE_PER_MINUTE: float = 60.0
+    SWEEP_LLM_CONCURRENCY: int = 4
+    SWEEP_CHECKPOINT_PATH: str = "sweep_checkpoint.json"  # nightly run and the CLI
+    SWEEP_WEEKLY_CHECKPOINT_PATH: str = "sweep_checkpoint_weekly.json"
+
+    # Monthly reports
+    REPORT_CACHE_TTL_SECONDS: float = 3600.0  # cached reports are also dropped on every write
+
+    # Negotiation chat
+    NEGOTIATION_MESSAGES_PAGE_SIZE: int = 50
+    NEGOTIATION_APPEND_RETRIES: int = 3  # re-reads after a concurrent append
+
+    # Server push (SSE)
+    EVENT_STREAM_QUEUE_SIZE: int = 100  # per connection; oldest events are dropped beyond this
+    EVENT_STREAM_HEARTBEAT_SECONDS: float = 15.0
+    EVENT_STREAM_TICKET_TTL_SECONDS: int = 30  # one-time tickets for opening the stream
+
     # Server
     HOST: str = "0.0.0.0"
     PORT: int = 8000
@@ -30,6 +81,12 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "dev-secret-key-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    AUTH_TOKEN_CACHE_SIZE: int = 10000  # verified tokens kept until they expire
+    AUTH_USER_CACHE_SIZE: int = 10000
+    AUTH_USER_CACHE_TTL_SECONDS: float = 60.0  # bounds staleness across workers
+    PASSWORD_BCRYPT_ROUNDS: int = 12  # stored hashes with another cost are upgraded at login
+    PASSWORD_HASH_WORKERS: int = min(4, os.cpu_count() or 1)
+    PASSWORD_HASH_MAX_PENDING: int = 64  # waiting logins beyond this get 503
     
     class Config:
         env_file = ".env"
@@ -1,17 +1,83 @@
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy import Column, String, DateTime, Float, Boolean, JSON, Integer, Text
+from sqlalchemy import Column, String, Date, DateTime, Float, Boolean, JSON, Integer, Text, Index, event, func, inspect, update
 from datetime import datetime
 import uuid
 
 from app.core.config import settings
+from app.core.metrics import instrument_engine, metric_lines, registry
 
-# Create async engine - SQLite para desenvolvimento
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=settings.DEBUG,
-    connect_args={"check_same_thread": False}  # Apenas para SQLite
-)
+def database_url(url: str) -> str:
+    """Point plain Postgres URLs (as hosting providers hand them out) at asyncpg"""
+    for prefix in ("postgres://", "postgresql://", "postgresql+psycopg2://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers run alongside the single writer, so several workers
+    # can share the file; the busy timeout queues writers instead of failing
+    if settings.SQLITE_WAL:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints, safe in WAL
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+    cursor.close()
+
+
+def create_engine_for(url: str):
+    """Async engine with per-backend settings.
+
+    Postgres: pooled asyncpg connections, checked before use and recycled
+    before server-side timeouts. SQLite: WAL and a busy timeout, so several
+    processes can use one file without "database is locked" errors.
+    """
+    url = database_url(url)
+    options = {"echo": settings.DB_ECHO}
+
+    if url.startswith("sqlite"):
+        engine = create_async_engine(
+            url,
+            connect_args={"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000},
+            **options,
+        )
+        if ":memory:" not in url:
+            event.listen(engine.sync_engine, "connect", _sqlite_pragmas)
+        return engine
+
+    return create_async_engine(
+        url,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        **options,
+    )
+
+
+def pool_stats(bind=None) -> dict:
+    """Connection pool counters for the health endpoint"""
+    bind = bind or engine
+    pool = bind.sync_engine.pool
+    stats = {"backend": bind.dialect.name, "pool": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if callable(method):
+            stats[name] = method()
+    return stats
+
+
+engine = create_engine_for(settings.DATABASE_URL)
+instrument_engine(engine)
+registry.add_collector(lambda: metric_lines(
+    "db_pool_connections", "gauge", "Connections in the pool by state",
+    [({"state": state}, value) for state, value in pool_stats().items()
+     if state in ("checkedin", "checkedout", "overflow")],
+))
 
 # Create session factory
 AsyncSessionLocal = sessionmaker(
@@ -37,11 +103,14 @@ class UserDB(Base):
     risk_tolerance = Column(Float, default=0.5)
     automation_preference = Column(Float, default=0.7)
     
-    # Statistics
+    # Statistics (dashboard counters, kept current by the listeners below
+    # and checked by app.services.user_stats.reconcile_user_stats)
     total_monthly_spend = Column(Float, default=0)
     total_subscriptions = Column(Integer, default=0)
+    potential_savings = Column(Float, default=0)
     total_savings_to_date = Column(Float, default=0)
     optimizations_completed = Column(Integer, default=0)
+    unread_activities = Column(Integer, default=0)
     
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -50,6 +119,9 @@ class UserDB(Base):
 class SubscriptionDB(Base):
     """Database model for subscriptions"""
     __tablename__ = "subscriptions"
+    __table_args__ = (
+        Index("uq_subscriptions_user_service", "user_id", "service_name", unique=True),
+    )
     
     id = Column(String, primary_key=True, default=generate_uuid)
     user_id = Column(String, nullable=False, index=True)
@@ -126,7 +198,10 @@ class NegotiationDB(Base):
     proposed_savings = Column(Float, default=0)
     status = Column(String, default="active")  # active, accepted, rejected, expired
     
-    # Chat messages (stored as JSON array)
+    # Chat messages live in negotiation_messages; message_count is the last
+    # seq and doubles as the version for optimistic concurrency
+    message_count = Column(Integer, default=0)
+    # Legacy JSON array, moved into negotiation_messages on first access
     messages = Column(JSON, default=list)  # [{role: "user"|"provider", content: str, timestamp: str}]
     
     # Result
@@ -139,6 +214,137 @@ class NegotiationDB(Base):
     updated_at = Column(DateTime, default=datetime.utcnow)
     expires_at = Column(DateTime)  # 7 days from creation
 
+class NegotiationMessageDB(Base):
+    """Database model for negotiation chat messages (append-only)"""
+    __tablename__ = "negotiation_messages"
+    __table_args__ = (
+        # One row per position; a concurrent append on a stale seq fails here
+        Index("uq_negotiation_messages_seq", "negotiation_id", "seq", unique=True),
+    )
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    negotiation_id = Column(String, nullable=False)
+    seq = Column(Integer, nullable=False)  # 1-based position in the chat
+    role = Column(String, nullable=False)  # user, provider, ai
+    content = Column(Text, nullable=False)
+
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class MonthlySnapshotDB(Base):
+    """Database model for per-user monthly spend/savings rollups"""
+    __tablename__ = "monthly_snapshots"
+    __table_args__ = (
+        # Trends are a range scan over (user_id, month)
+        Index("uq_monthly_snapshots_user_month", "user_id", "month", unique=True),
+    )
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    user_id = Column(String, nullable=False)
+    month = Column(Date, nullable=False)  # first day of the month
+
+    # Values in effect during the month
+    spend = Column(Float, default=0)
+    savings = Column(Float, default=0)
+    subscriptions = Column(Integer, default=0)
+
+    # Timestamps
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class ReportArtifactDB(Base):
+    """Database model for cached monthly reports"""
+    __tablename__ = "report_artifacts"
+    __table_args__ = (
+        Index("uq_report_artifacts_user_month", "user_id", "year", "month", unique=True),
+    )
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    user_id = Column(String, nullable=False)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    payload = Column(JSON, nullable=False)
+
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Dashboard counters: every ORM write to a subscription or optimization
+# adjusts its owner's statistics in the same flush. Core bulk writes bypass
+# these listeners and call app.services.user_stats.refresh_user_stats.
+def _subscription_stats(status, monthly_cost):
+    if status != "active":
+        return {}
+    return {"total_monthly_spend": monthly_cost or 0, "total_subscriptions": 1}
+
+def _optimization_stats(executed, monthly_savings):
+    if executed:
+        return {"optimizations_completed": 1}
+    return {"potential_savings": monthly_savings or 0}
+
+def _bump_user_stats(connection, user_id, stats, sign=1):
+    if not user_id or not stats:
+        return
+    users = UserDB.__table__
+    connection.execute(
+        update(users)
+        .where(users.c.id == user_id)
+        .values({name: func.coalesce(users.c[name], 0) + sign * delta for name, delta in stats.items()})
+    )
+
+def _previous(target, attr):
+    history = inspect(target).attrs[attr].history
+    return history.deleted[0] if history.deleted else getattr(target, attr)
+
+def _stats_listeners(stats_of, fields):
+    def after_insert(mapper, connection, target):
+        _bump_user_stats(connection, target.user_id, stats_of(*(getattr(target, f) for f in fields)))
+
+    def after_update(mapper, connection, target):
+        old_user = _previous(target, "user_id")
+        old = stats_of(*(_previous(target, f) for f in fields))
+        new = stats_of(*(getattr(target, f) for f in fields))
+        if old_user != target.user_id:
+            _bump_user_stats(connection, old_user, old, sign=-1)
+            _bump_user_stats(connection, target.user_id, new)
+        elif old != new:
+            _bump_user_stats(connection, target.user_id, {
+                name: new.get(name, 0) - old.get(name, 0) for name in {**old, **new}
+            })
+
+    def after_delete(mapper, connection, target):
+        _bump_user_stats(connection, target.user_id, stats_of(*(getattr(target, f) for f in fields)), sign=-1)
+
+    return after_insert, after_update, after_delete
+
+def register_stats_source(model, stats_of, fields):
+    """Keep user counters current on writes to model; stats_of(*fields) -> deltas"""
+    for _event, _listener in zip(("after_insert", "after_update", "after_delete"),
+                                 _stats_listeners(stats_of, fields)):
+        event.listen(model, _event, _listener)
+
+register_stats_source(SubscriptionDB, _subscription_stats, ("status", "monthly_cost"))
+register_stats_source(OptimizationDB, _optimization_stats, ("executed", "monthly_savings"))
+
+# Cached reports: any ORM write to data a report shows drops the owner's
+# cached reports in the same flush. Core bulk writes call
+# app.services.monthly_report.invalidate_reports.
+def invalidate_user_reports(connection, *user_ids):
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if user_ids:
+        artifacts = ReportArtifactDB.__table__
+        connection.execute(artifacts.delete().where(artifacts.c.user_id.in_(user_ids)))
+
+def register_report_sources(model, skip=None):
+    """Invalidate cached reports on writes to model, unless skip(target)"""
+    def listener(mapper, connection, target):
+        if skip is None or not skip(target):
+            invalidate_user_reports(connection, target.user_id, _previous(target, "user_id"))
+
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(model, _event, listener)
+
+register_report_sources(SubscriptionDB)
+register_report_sources(NegotiationDB)
+
 # Database session dependency
 async def get_db():
     """Dependency to get database session"""
@@ -0,0 +1,248 @@
+"""
+Request metrics in Prometheus text format.
+
+RequestMetricsMiddleware times every HTTP request by route template (so
+/api/negotiations/{negotiation_id} is one series, not one per id), keeps an
+in-flight gauge, and counts the SQL statements each request runs and the
+time spent in them, via engine events. Other subsystems (LLM calls, the
+connection pool, auth caches) register collectors that are read only when
+/metrics is scraped. Everything is plain in-process counters: recording a
+request is a few dict updates, and each worker reports its own numbers.
+"""
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values"""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, List] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.label_names + ('le',), labels + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.label_names + ('le',), labels + ('+Inf',))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter keyed by label values"""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+def metric_lines(name: str, kind: str, documentation: str,
+                 samples: Iterable[Tuple[Dict[str, str], float]]) -> List[str]:
+    """Exposition lines for values read at scrape time (used by collectors)"""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {value}")
+    return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], List[str]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+request_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route",
+    ("method", "route", "status"),
+))
+request_sql_statements = registry.register(Histogram(
+    "http_request_sql_statements", "SQL statements executed per request",
+    ("method", "route"), buckets=SQL_COUNT_BUCKETS,
+))
+request_sql_seconds = registry.register(Histogram(
+    "http_request_sql_duration_seconds", "Time spent in SQL per request",
+    ("method", "route"),
+))
+sql_statements = registry.register(Counter(
+    "sql_statements_total", "SQL statements executed, in or out of requests",
+))
+llm_latency = registry.register(Histogram(
+    "llm_request_duration_seconds", "Gemini call latency", ("kind", "outcome"),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+))
+
+_in_flight = 0
+registry.add_collector(lambda: metric_lines(
+    "http_requests_in_flight", "gauge", "Requests being served", [({}, _in_flight)]
+))
+
+# Per-request SQL tally; a mutable list so engine events (run in
+# SQLAlchemy's greenlet, which shares the request's context) can update it
+_request_sql: ContextVar[Optional[List[float]]] = ContextVar("request_sql", default=None)
+
+
+def _route_template(scope) -> str:
+    """The matched path with parameter values put back as {name}.
+
+    Built from the path params rather than route.path, which lacks the
+    router prefix on FastAPI versions that resolve included routers lazily.
+    Unmatched paths share one series so scanners cannot blow up cardinality.
+    """
+    if "route" not in scope:
+        return "unmatched"
+    params = {str(value): name for name, value in (scope.get("path_params") or {}).items()}
+    if not params:
+        return scope["path"]
+    return "/".join(
+        "{" + params[segment] + "}" if segment in params else segment
+        for segment in scope["path"].split("/")
+    )
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording latency, status and SQL use per route.
+
+    Server-sent event streams stay open for as long as the client listens,
+    so they are timed to their first response message instead of their end.
+    """
+
+    def __init__(self, app, skip_paths: Iterable[str] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = frozenset(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        global _in_flight
+        status = [500]
+        tally = [0, 0.0]  # statements, seconds
+        recorded = [False]
+        token = _request_sql.set(tally)
+
+        def record():
+            global _in_flight
+            if recorded[0]:
+                return
+            recorded[0] = True
+            elapsed = time.perf_counter() - started
+            _in_flight -= 1
+            template = _route_template(scope)
+            method = scope["method"]
+            request_latency.observe(elapsed, method, template, status[0])
+            request_sql_statements.observe(tally[0], method, template)
+            request_sql_seconds.observe(tally[1], method, template)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if _is_event_stream(message):
+                    record()
+            await send(message)
+
+        _in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_sql.reset(token)
+            record()
+
+
+def _is_event_stream(message) -> bool:
+    for name, value in message.get("headers", ()):
+        if name.lower() == b"content-type":
+            return value.split(b";")[0].strip() == b"text/event-stream"
+    return False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    sql_statements.inc()
+    tally = _request_sql.get()
+    if tally is not None:
+        tally[0] += 1
+        tally[1] += elapsed
+
+
+def _handle_error(context):
+    started = context.connection.info.get("query_started") if context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine):
+    """Count and time statements run through an (async) engine"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
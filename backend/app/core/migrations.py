@@ -0,0 +1,117 @@
+"""
+Schema upgrades for databases created by earlier versions.
+
+create_all only creates missing tables: it never adds a column to an
+existing table or builds an index on one. upgrade_schema compares the
+models with the live schema and fills the gap:
+
+- missing tables are created (with their indexes);
+- missing columns are added with ALTER TABLE, their scalar default
+  applied to existing rows;
+- missing indexes are built, after merging duplicate subscriptions when
+  the (user_id, service_name) unique index is among them;
+- when dashboard counters were just added to users, every user's counters
+  are computed from source.
+
+It runs at startup and is a no-op on an up-to-date schema. To preview or
+apply it by hand:
+
+    python -m app.core.migrations [--dry-run]
+"""
+import argparse
+import asyncio
+import json
+import logging
+from typing import Dict, List
+
+from sqlalchemy import inspect, text
+
+from app.core.database import AsyncSessionLocal, Base, SubscriptionDB, UserDB, engine
+import app.models.activity  # noqa: F401 - registers the activities table on Base.metadata
+
+logger = logging.getLogger(__name__)
+
+
+def _pending_changes(sync_conn) -> Dict[str, List[str]]:
+    """Tables, columns ("table.column") and indexes the live schema lacks"""
+    inspector = inspect(sync_conn)
+    existing = set(inspector.get_table_names())
+    changes = {'tables': [], 'columns': [], 'indexes': []}
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            changes['tables'].append(table.name)
+            continue
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        changes['columns'] += [f"{table.name}.{column.name}" for column in table.columns
+                               if column.name not in columns]
+        indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        changes['indexes'] += [index.name for index in table.indexes if index.name not in indexes]
+    return changes
+
+
+def _add_column(sync_conn, table_name: str, column_name: str):
+    column = Base.metadata.tables[table_name].c[column_name]
+    preparer = sync_conn.dialect.identifier_preparer
+    ddl = (f"ALTER TABLE {preparer.quote(table_name)} ADD COLUMN {preparer.quote(column_name)} "
+           f"{column.type.compile(dialect=sync_conn.dialect)}")
+    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+    literal = column.type.literal_processor(sync_conn.dialect) if default is not None else None
+    if literal is not None:
+        # A literal default also fills the rows that already exist
+        ddl += f" DEFAULT {literal(default)}"
+    sync_conn.execute(text(ddl))
+
+
+def _create_indexes(sync_conn, names: List[str]):
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in names:
+                index.create(sync_conn, checkfirst=True)
+
+
+async def upgrade_schema(fix: bool = True) -> Dict:
+    """Bring the database up to the models; returns what was (or would be) changed"""
+    async with engine.connect() as conn:
+        changes = await conn.run_sync(_pending_changes)
+    report = {**changes, 'fixed': fix}
+    if not fix or not any(changes.values()):
+        return report
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        for name in changes['columns']:
+            await conn.run_sync(_add_column, *name.split('.'))
+            logger.info(f"Added column {name}")
+
+    unique_service = next(index.name for index in SubscriptionDB.__table__.indexes if index.unique)
+    if unique_service in changes['indexes']:
+        from app.services.subscription_store import dedupe_subscriptions
+
+        async with AsyncSessionLocal() as db:
+            report['subscriptions'] = await dedupe_subscriptions(db)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(_create_indexes, changes['indexes'])
+    for name in changes['indexes']:
+        logger.info(f"Created index {name}")
+
+    if any(name.startswith(f"{UserDB.__tablename__}.") for name in changes['columns']):
+        from app.services.user_stats import reconcile_user_stats
+
+        async with AsyncSessionLocal() as db:
+            stats = await reconcile_user_stats(db)
+        report['users_recounted'] = stats['users_drifted']
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add the tables, columns and indexes the models expect")
+    parser.add_argument('--dry-run', action='store_true', help="report missing schema without changing anything")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(asyncio.run(upgrade_schema(fix=not args.dry_run)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
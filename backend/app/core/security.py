@@ -2,7 +2,12 @@
 Security utilities for SubGuard AI - VERSÃO CORRIGIDA
 """
 from datetime import datetime, timedelta
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+import asyncio
+import logging
+import secrets
+import time
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
@@ -10,15 +15,19 @@ from fastapi.security import OAuth2PasswordBearer
 
 from app.core.config import settings
 from app.core.database import AsyncSessionLocal, UserDB
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from app.utils.cache import TTLCache
+from sqlalchemy import event, inspect, select
+
+logger = logging.getLogger(__name__)
 
 # Configurar contexto de senha com fallback ROBUSTO
 try:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-    print("✅ Bcrypt carregado com sucesso")
+    pwd_context = CryptContext(
+        schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.PASSWORD_BCRYPT_ROUNDS
+    )
+    logger.debug("Bcrypt carregado com sucesso")
 except Exception as e:
-    print(f"⚠️ Bcrypt falhou ({e}), usando sha256_crypt")
+    logger.warning(f"Bcrypt falhou ({e}), usando sha256_crypt")
     pwd_context = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
 
 # OAuth2 scheme
@@ -29,17 +38,17 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     try:
         # Primeiro tenta verificação normal
         result = pwd_context.verify(plain_password, hashed_password)
-        print(f"🔐 Senha verificada: {result}")
+        logger.debug(f"Senha verificada: {result}")
         return result
     except Exception as e:
-        print(f"⚠️ Erro ao verificar senha: {e}")
+        logger.debug(f"Erro ao verificar senha: {e}")
         # Fallback 1: Hash de desenvolvimento
         if hashed_password.startswith("dev_hash_"):
             expected_password = hashed_password.replace("dev_hash_", "")
             return plain_password == expected_password
         # Fallback 2: Senha padrão de teste
         if plain_password == "senha123":
-            print("🔓 Usando senha padrão de desenvolvimento")
+            logger.debug("Usando senha padrão de desenvolvimento")
             return True
         return False
 
@@ -50,13 +59,102 @@ def get_password_hash(password: str) -> str:
         if len(password) > 72:
             password = password[:72]
         hashed = pwd_context.hash(password)
-        print(f"✅ Hash gerado com sucesso")
+        logger.debug("Hash gerado com sucesso")
         return hashed
     except Exception as e:
-        print(f"⚠️ Erro ao gerar hash ({e}), usando fallback")
+        logger.warning(f"Erro ao gerar hash ({e}), usando fallback")
         # Em desenvolvimento, usar hash simples que pode ser verificado
         return f"dev_hash_{password}"
 
+class PasswordPoolBusy(Exception):
+    """Too many password operations already waiting"""
+
+
+class PasswordHasher:
+    """Runs bcrypt off the event loop on a bounded thread pool.
+
+    bcrypt releases the GIL while hashing, so threads run in parallel and
+    the loop keeps serving other requests during a login burst. At most
+    max_workers operations run at once; beyond max_pending waiting callers
+    get PasswordPoolBusy instead of queueing without bound.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None):
+        self.max_workers = max_workers or settings.PASSWORD_HASH_WORKERS
+        self.max_pending = settings.PASSWORD_HASH_MAX_PENDING if max_pending is None else max_pending
+        self._semaphore = asyncio.Semaphore(self.max_workers)
+        self._executor = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.by_kind: Dict[str, Dict[str, float]] = {}
+
+    async def _run(self, kind: str, func, *args):
+        if self.waiting >= self.max_pending:
+            self.rejected += 1
+            raise PasswordPoolBusy(f"{self.waiting} password operations pending")
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix='passwords'
+            )
+        queued = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        started = time.perf_counter()
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+            self._record(kind, (started - queued) * 1000, (time.perf_counter() - started) * 1000)
+
+    def _record(self, kind: str, wait_ms: float, run_ms: float):
+        stats = self.by_kind.setdefault(kind, {
+            'calls': 0, 'total_wait_ms': 0.0, 'total_ms': 0.0, 'max_ms': 0.0,
+        })
+        stats['calls'] += 1
+        stats['total_wait_ms'] += wait_ms
+        stats['total_ms'] += run_ms
+        stats['max_ms'] = max(stats['max_ms'], run_ms)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run('verify', verify_password, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._run('hash', get_password_hash, password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """True when the hash was made with another cost factor or scheme"""
+        try:
+            return pwd_context.needs_update(hashed_password)
+        except (ValueError, TypeError):  # dev_hash_ fallbacks
+            return False
+
+    def stats(self) -> Dict:
+        kinds = {}
+        for kind, stats in self.by_kind.items():
+            kinds[kind] = dict(stats)
+            kinds[kind]['avg_wait_ms'] = stats['total_wait_ms'] / stats['calls'] if stats['calls'] else 0.0
+            kinds[kind]['avg_ms'] = stats['total_ms'] / stats['calls'] if stats['calls'] else 0.0
+        return {
+            'bcrypt_rounds': settings.PASSWORD_BCRYPT_ROUNDS,
+            'max_workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'rejected': self.rejected,
+            'kinds': kinds,
+        }
+
+
+password_hasher = PasswordHasher()
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
     to_encode = data.copy()
@@ -76,43 +174,150 @@ def decode_access_token(token: str):
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         return payload
     except JWTError as e:
-        print(f"⚠️ Erro ao decodificar token: {e}")
+        logger.debug(f"Invalid access token: {e}")
         return None
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(lambda: AsyncSessionLocal())
-):
-    """Get current user from JWT token"""
+
+class AuthenticatedUser:
+    """What authenticated endpoints need to know about the caller.
+
+    Cached per token subject, so a repeat request resolves without a
+    database round trip; load UserDB by id for anything else.
+    """
+
+    __slots__ = ('id', 'email', 'risk_tolerance', 'automation_preference')
+
+    def __init__(self, id: str, email: str, risk_tolerance: Optional[float] = None,
+                 automation_preference: Optional[float] = None):
+        self.id = id
+        self.email = email
+        self.risk_tolerance = risk_tolerance
+        self.automation_preference = automation_preference
+
+
+# Verified tokens (until they expire) and resolved users (until they change)
+token_cache = TTLCache(settings.AUTH_TOKEN_CACHE_SIZE)
+user_cache = TTLCache(settings.AUTH_USER_CACHE_SIZE, settings.AUTH_USER_CACHE_TTL_SECONDS)
+
+
+def _verified_payload(token: str) -> Optional[dict]:
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+
+    payload = decode_access_token(token)
+    if payload is None:
+        return None
+    expires_in = payload.get("exp", 0) - time.time()
+    if expires_in > 0:
+        token_cache.set(token, payload, ttl=expires_in)
+    return payload
+
+
+def invalidate_user(*emails: str):
+    """Forget cached users; called when a user row changes"""
+    for email in emails:
+        if email:
+            user_cache.pop(email)
+
+
+async def authenticate_token(token: str) -> AuthenticatedUser:
+    """Resolve a bearer token to its user; cached, so repeats skip the database"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    payload = decode_access_token(token)
-    if payload is None:
+    payload = _verified_payload(token)
+    # Stream tickets (typ) only open the event stream
+    if payload is None or payload.get("typ") is not None:
         raise credentials_exception
-    
+    return await _resolve_user(payload, credentials_exception)
+
+
+async def _resolve_user(payload: dict, credentials_exception: HTTPException) -> AuthenticatedUser:
+    """The user a verified token or ticket payload names"""
     # CORREÇÃO: Buscar por email (que é o "sub" do token)
     email: str = payload.get("sub")
     
     if email is None:
         raise credentials_exception
     
-    # Buscar usuário no banco
-    result = await db.execute(
-        select(UserDB).where(UserDB.email == email)
-    )
-    user = result.scalar_one_or_none()
+    # Tokens carry user_id since login started adding it; older ones only the email
+    user_id = payload.get("user_id")
+    user = user_cache.get(email)
+    if user is not None:
+        if user_id and user.id != user_id:
+            # The email now belongs to another account
+            raise credentials_exception
+        return user
+    
+    condition = UserDB.id == user_id if user_id else UserDB.email == email
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(UserDB.id, UserDB.email, UserDB.risk_tolerance, UserDB.automation_preference)
+            .where(condition)
+        )
+        row = result.one_or_none()
     
-    if user is None:
+    if row is None or row.email != email:
         raise credentials_exception
     
+    user = AuthenticatedUser(*row)
+    user_cache.set(email, user)
     return user
 
+
+STREAM_TICKET = "stream_ticket"
+
+# Stream tickets already exchanged, kept until they would have expired
+used_stream_tickets = TTLCache(settings.AUTH_TOKEN_CACHE_SIZE)
+
+
+def create_stream_ticket(user: AuthenticatedUser) -> str:
+    """Short-lived, one-time token for opening the event stream.
+
+    EventSource cannot send headers, so the stream is opened with
+    ?ticket= instead of putting the access token in URLs and access logs.
+    """
+    return create_access_token(
+        {"sub": user.email, "user_id": user.id, "typ": STREAM_TICKET, "jti": secrets.token_urlsafe(16)},
+        expires_delta=timedelta(seconds=settings.EVENT_STREAM_TICKET_TTL_SECONDS),
+    )
+
+
+async def redeem_stream_ticket(ticket: str) -> AuthenticatedUser:
+    """Resolve a stream ticket to its user; a ticket works once"""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or used stream ticket",
+    )
+    payload = decode_access_token(ticket)
+    if payload is None or payload.get("typ") != STREAM_TICKET:
+        raise credentials_exception
+    jti = payload.get("jti")
+    if not jti or used_stream_tickets.get(jti) is not None:
+        raise credentials_exception
+    used_stream_tickets.set(jti, True, ttl=max(payload.get("exp", 0) - time.time(), 1))
+    return await _resolve_user(payload, credentials_exception)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> AuthenticatedUser:
+    """Get current user from JWT token"""
+    return await authenticate_token(token)
+
 async def get_current_active_user(
-    current_user: UserDB = Depends(get_current_user),
+    current_user: AuthenticatedUser = Depends(get_current_user),
 ):
     """Get current active user"""
-    return current_user
\ No newline at end of file
+    return current_user
+
+
+def _user_changed(mapper, connection, target):
+    history = inspect(target).attrs.email.history
+    invalidate_user(target.email, *(history.deleted or ()))
+
+
+event.listen(UserDB, 'after_update', _user_changed)
+event.listen(UserDB, 'after_delete', _user_changed)
@@ -1,14 +1,27 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from datetime import datetime
 import logging
 
 from app.core.config import settings
+from app.core.metrics import RequestMetricsMiddleware, registry
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Columns and indexes added since the database was created
+    from app.core.migrations import upgrade_schema
+    changes = await upgrade_schema()
+    if any(changes[key] for key in ('tables', 'columns', 'indexes')):
+        logger.info(f"Upgraded database schema: {changes}")
+    yield
+
 app = FastAPI(
+    lifespan=lifespan,
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
     docs_url="/docs",
@@ -28,10 +41,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # activity feed pagination
 )
 
+# Latency, in-flight and SQL-per-request metrics, served at /metrics
+app.add_middleware(RequestMetricsMiddleware)
+
 # Incluir routers
-from app.api.endpoints import auth, subscriptions, optimizations, activities, negotiations, reports
+from app.api.endpoints import auth, subscriptions, optimizations, activities, negotiations, reports, events
 
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(subscriptions.router, prefix="/api/subscriptions", tags=["Subscriptions"])
@@ -39,6 +56,7 @@ app.include_router(optimizations.router, prefix="/api/optimizations", tags=["Opt
 app.include_router(activities.router, prefix="/api/activities", tags=["Activities"])
 app.include_router(negotiations.router, prefix="/api/negotiations", tags=["Negotiations"])
 app.include_router(reports.router, prefix="/api/reports", tags=["Reports"])
+app.include_router(events.router, prefix="/api/events", tags=["Events"])
 
 @app.get("/")
 async def root():
@@ -53,6 +71,36 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/llm")
+async def llm_health():
+    from app.services.llm_cache import llm_cache
+    from app.services.gemini_service import gemini_service
+    from app.services.llm_client import llm_client
+    return {
+        "enabled": llm_client.enabled,
+        **llm_client.stats(),
+        "cache": llm_cache.stats(),
+        "breaker": gemini_service.breaker.stats(),
+    }
+
+@app.get("/health/auth")
+async def auth_health():
+    from app.core.security import password_hasher, token_cache, user_cache
+    return {
+        "passwords": password_hasher.stats(),
+        "token_cache": token_cache.stats(),
+        "user_cache": user_cache.stats(),
+    }
+
+@app.get("/health/db")
+async def db_health():
+    from app.core.database import pool_stats
+    return pool_stats()
+
 @app.get("/api/test/gemini")
 async def test_gemini():
     try:
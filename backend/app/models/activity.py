@@ -1,16 +1,38 @@
-from sqlalchemy import Column, String, DateTime, Text, Integer
+from datetime import datetime
+from sqlalchemy import Column, String, DateTime, Text, Integer, Index, inspect
 from sqlalchemy.sql import func
-from app.core.database import Base
+from app.core.database import Base, register_report_sources, register_stats_source
 
 class Activity(Base):
     __tablename__ = "activities"
-    __table_args__ = {'extend_existing': True}
 
     id = Column(String, primary_key=True, index=True)
-    user_id = Column(String, nullable=False, index=True)
+    user_id = Column(String, nullable=False)
     activity_type = Column(String, nullable=False)  # email_connected, subscription_added, ai_analysis, etc
     title = Column(String, nullable=False)
     description = Column(Text, nullable=True)
     meta_data = Column(Text, nullable=True)  # JSON string for extra data (renamed to avoid SQLAlchemy reserved word)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow, server_default=func.now())
     read = Column(Integer, default=0)  # 0 = unread, 1 = read
+
+    __table_args__ = (
+        # Feed pages are keyset scans in (created_at, id) order
+        Index("ix_activities_user_created", user_id, created_at.desc(), id.desc()),
+        Index("ix_activities_user_unread", user_id,
+              sqlite_where=read == 0, postgresql_where=read == 0),
+        {'extend_existing': True},
+    )
+
+
+def _report_unchanged(activity):
+    """Generating a report or marking an activity read changes no report"""
+    if activity.activity_type == 'report_generated':
+        return True
+    changed = {attr.key for attr in inspect(activity).attrs if attr.history.has_changes()}
+    return changed == {'read'}
+
+
+register_report_sources(Activity, skip=_report_unchanged)
+
+# users.unread_activities follows inserts, mark-as-read and deletes
+register_stats_source(Activity, lambda read: {} if read else {'unread_activities': 1}, ('read',))
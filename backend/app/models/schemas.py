@@ -116,6 +116,7 @@ class SubscriptionAnalysis(BaseModel):
     confidence: float = Field(..., ge=0, le=1)
     suggested_actions: List[str]
     ai_model_used: Optional[str] = None
+    degraded: bool = False  # rule-based only: the AI answer was not available in time
     
     @validator('monthly_savings')
     def validate_savings(cls, v):
@@ -204,6 +205,7 @@ class NegotiationMessage(BaseModel):
     role: str  # "user" or "provider"
     content: str
     timestamp: str
+    seq: Optional[int] = None
 
 class NegotiationFinalOffer(BaseModel):
     plan: str
@@ -232,7 +234,8 @@ class NegotiationResponse(NegotiationBase):
     id: str
     user_id: str
     status: str
-    messages: List[NegotiationMessage]
+    messages: List[NegotiationMessage] = []  # latest page; older ones via /messages
+    message_count: int = 0
     offer_accepted: bool
     final_offer: Optional[NegotiationFinalOffer]
     notes: Optional[str]
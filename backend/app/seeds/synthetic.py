@@ -0,0 +1,304 @@
+"""
+Synthetic dataset at production scale.
+
+Generates users with subscriptions, optimizations, negotiations (with their
+chat), activities and, optionally, one CSV bank statement per user, all
+derived from a seeded RNG so runs are reproducible. Rows are written with
+Core executemany inserts, one transaction per batch of users, and the
+users' dashboard counters are computed while generating, so no listener or
+refresh pass is needed afterwards (reconcile_user_stats finds no drift).
+
+Every synthetic user logs in with the password "synthetic". It is hashed
+once per run with the app's bcrypt settings and shared by every row, so
+logins against seeded users pay the same bcrypt cost as real ones.
+
+    python -m app.seeds.synthetic --users 10000 --transactions 10000000 \\
+        --statements-dir synthetic_statements --rollup
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import insert
+
+from app.core.database import (
+    AsyncSessionLocal,
+    Base,
+    NegotiationDB,
+    NegotiationMessageDB,
+    OptimizationDB,
+    SubscriptionDB,
+    UserDB,
+    engine,
+)
+from app.core.security import get_password_hash
+from app.models.activity import Activity
+
+logger = logging.getLogger(__name__)
+
+# service, category, statement descriptor, [(plan, monthly price)]
+CATALOG = [
+    ('Netflix', 'Entretenimento', 'NETFLIX.COM', [('Basic', 23.90), ('Standard', 38.90), ('Premium', 45.90)]),
+    ('Spotify', 'Música', 'SPOTIFY AB', [('Individual', 21.90), ('Duo', 27.90), ('Family', 34.90)]),
+    ('Amazon Prime', 'Entretenimento', 'AMAZON PRIME BR', [('Mensal', 19.90), ('Anual', 14.90)]),
+    ('YouTube Premium', 'Entretenimento', 'GOOGLE YOUTUBE PREMIUM', [('Individual', 24.90), ('Família', 41.90)]),
+    ('Disney+', 'Entretenimento', 'DISNEY PLUS', [('Padrão', 33.90), ('Premium', 43.90)]),
+    ('Max', 'Entretenimento', 'HBO MAX', [('Básico', 29.90), ('Standard', 39.90)]),
+    ('ChatGPT Plus', 'Produtividade', 'OPENAI CHATGPT', [('Plus', 110.00)]),
+    ('Microsoft 365', 'Produtividade', 'MICROSOFT 365', [('Personal', 36.00), ('Family', 45.00)]),
+    ('Adobe Creative Cloud', 'Produtividade', 'ADOBE SYSTEMS', [('Photography', 49.00), ('All Apps', 224.00)]),
+    ('Google One', 'Armazenamento', 'GOOGLE ONE', [('100 GB', 7.99), ('2 TB', 34.99)]),
+    ('iCloud+', 'Armazenamento', 'APPLE ICLOUD', [('50 GB', 4.90), ('200 GB', 14.90)]),
+    ('Gympass', 'Saúde', 'GYMPASS', [('Basic', 89.90), ('Gold', 199.90)]),
+    ('iFood Club', 'Delivery', 'IFOOD CLUB', [('Club', 12.90)]),
+    ('Uber One', 'Transporte', 'UBER ONE', [('Mensal', 19.90)]),
+]
+MERCHANTS = ['PADARIA', 'POSTO', 'SUPERMERCADO', 'FARMACIA', 'RESTAURANTE', 'LOJA', 'PIX', 'ESTACIONAMENTO']
+ACTIVITY_TYPES = ['subscription_added', 'ai_analysis', 'optimization_executed', 'negotiation_message',
+                  'email_connected', 'report_generated']
+PROVIDER_LINES = [
+    "Entendo. Para clientes de longa data, posso oferecer um desconto.",
+    "Temos uma promoção especial de 20% para clientes como você.",
+    "Perfeito! Vou processar seu desconto agora.",
+]
+PASSWORD = "synthetic"
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+class SyntheticUser:
+    """One user's rows for every table, plus its counters"""
+
+    def __init__(self, index: int, rng: random.Random, now: datetime, months: int, activities: int,
+                 password_hash: str):
+        self.id = _uuid(rng)
+        self.email = f"user{index:07d}@synthetic.subguard.ai"
+        history_start = now - timedelta(days=30 * months)
+        joined = history_start + timedelta(days=rng.randint(0, 30 * max(1, months // 3)))
+
+        self.subscriptions: List[Dict] = []
+        self.optimizations: List[Dict] = []
+        self.negotiations: List[Dict] = []
+        self.messages: List[Dict] = []
+        self.activities: List[Dict] = []
+        spend = potential = saved = 0.0
+        completed = unread = 0
+
+        for service, category, descriptor, plans in rng.sample(CATALOG, rng.randint(3, 10)):
+            plan, price = rng.choice(plans)
+            start = joined + timedelta(days=rng.randint(0, max(1, (now - joined).days - 1)))
+            status = 'active' if rng.random() < 0.85 else 'cancelled'
+            subscription = {
+                'id': _uuid(rng), 'user_id': self.id, 'service_name': service,
+                'service_category': category, 'plan_name': plan, 'monthly_cost': price,
+                'billing_cycle': 'monthly', 'status': status,
+                'detection_source': rng.choice(['manual', 'email', 'bank']),
+                'start_date': start, 'next_billing_date': now + timedelta(days=rng.randint(1, 30)),
+                'last_used_date': now - timedelta(days=rng.randint(0, 90)),
+                'confidence_score': round(rng.uniform(0.7, 1.0), 2),
+                'created_at': start, 'updated_at': start,
+                '_descriptor': descriptor,
+            }
+            self.subscriptions.append(subscription)
+            if status == 'active':
+                spend += price
+
+            if rng.random() < 0.4:
+                cheaper = [p for p in plans if p[1] < price]
+                action, new_plan, new_cost = (
+                    ('downgrade', *rng.choice(cheaper)) if cheaper else
+                    (rng.choice(['cancel', 'negotiate']), plan, 0.0 if rng.random() < 0.5 else price * 0.8)
+                )
+                savings = round(price - new_cost, 2)
+                executed = rng.random() < 0.3
+                created = start + timedelta(days=rng.randint(1, 60))
+                optimization = {
+                    'id': _uuid(rng), 'subscription_id': subscription['id'], 'user_id': self.id,
+                    'action_type': action, 'current_plan': plan, 'recommended_plan': new_plan,
+                    'current_cost': price, 'new_cost': new_cost, 'monthly_savings': savings,
+                    'yearly_savings': round(savings * 12, 2), 'confidence_score': round(rng.uniform(0.6, 0.95), 2),
+                    'reasoning': f"Synthetic {action} recommendation", 'steps_required': [],
+                    'estimated_time_minutes': rng.choice([5, 10, 15, 30]), 'presented_to_user': True,
+                    'executed': executed, 'execution_date': created + timedelta(days=2) if executed else None,
+                    'actual_savings': savings if executed else None,
+                    'created_at': created, 'updated_at': created,
+                }
+                self.optimizations.append(optimization)
+                if executed:
+                    completed += 1
+                    saved += savings
+                else:
+                    potential += savings
+
+                if action == 'negotiate' and rng.random() < 0.5:
+                    self._negotiation(rng, subscription, optimization, created, now)
+
+        for offset in range(activities):
+            read = 1 if rng.random() < 0.7 else 0
+            unread += not read
+            self.activities.append({
+                'id': _uuid(rng), 'user_id': self.id, 'activity_type': rng.choice(ACTIVITY_TYPES),
+                'title': f"Synthetic activity {offset}", 'description': None, 'meta_data': None,
+                'created_at': joined + timedelta(seconds=rng.randint(0, int((now - joined).total_seconds()))),
+                'read': read,
+            })
+
+        self.row = {
+            'id': self.id, 'email': self.email, 'hashed_password': password_hash,
+            'risk_tolerance': round(rng.uniform(0.2, 0.8), 2),
+            'automation_preference': round(rng.uniform(0.3, 0.9), 2),
+            'total_monthly_spend': round(spend, 2), 'total_subscriptions': sum(
+                1 for s in self.subscriptions if s['status'] == 'active'),
+            'potential_savings': round(potential, 2), 'total_savings_to_date': round(saved, 2),
+            'optimizations_completed': completed, 'unread_activities': unread,
+            'created_at': joined, 'updated_at': now,
+        }
+
+    def _negotiation(self, rng, subscription, optimization, created, now):
+        negotiation_id = _uuid(rng)
+        turns = rng.randint(1, 4)
+        status = rng.choice(['in_progress', 'accepted', 'rejected']) if created < now - timedelta(days=7) \
+            else 'in_progress'
+        accepted = status == 'accepted'
+        savings = optimization['monthly_savings']
+        for seq in range(1, turns * 2 + 2):
+            role = 'provider' if seq % 2 else 'user'
+            self.messages.append({
+                'id': _uuid(rng), 'negotiation_id': negotiation_id, 'seq': seq, 'role': role,
+                'content': rng.choice(PROVIDER_LINES) if role == 'provider' else "Gostaria de um desconto.",
+                'created_at': created + timedelta(minutes=seq),
+            })
+        self.negotiations.append({
+            'id': negotiation_id, 'optimization_id': optimization['id'],
+            'subscription_id': subscription['id'], 'user_id': self.id,
+            'provider_name': subscription['service_name'], 'current_plan': subscription['plan_name'],
+            'proposed_savings': savings, 'status': status, 'message_count': turns * 2 + 1,
+            'messages': [], 'offer_accepted': accepted,
+            'final_offer': {'plan': subscription['plan_name'], 'price': subscription['monthly_cost'] - savings * 0.6,
+                            'savings': round(savings * 0.6, 2), 'terms': '12 month commitment'}
+            if accepted else None,
+            'created_at': created, 'updated_at': created + timedelta(minutes=turns * 2 + 1),
+            'expires_at': created + timedelta(days=7),
+        })
+
+
+def write_statement(path: str, user: SyntheticUser, rows: int, rng: random.Random, now: datetime):
+    """A chronological CSV statement: monthly charges for the user's subscriptions plus purchases"""
+    transactions = []
+    for subscription in user.subscriptions:
+        day = subscription['start_date']
+        last = now if subscription['status'] == 'active' else subscription['start_date'] + timedelta(days=120)
+        while day <= last and len(transactions) < rows:
+            transactions.append((day, subscription['_descriptor'], -subscription['monthly_cost']))
+            day += timedelta(days=rng.randint(29, 31))
+
+    start = user.row['created_at']
+    span = max(1, int((now - start).total_seconds()))
+    for _ in range(rows - len(transactions)):
+        transactions.append((
+            start + timedelta(seconds=rng.randrange(span)),
+            f"COMPRA {rng.choice(MERCHANTS)} {rng.randint(1, 999)}",
+            -round(rng.uniform(5, 400), 2),
+        ))
+
+    transactions.sort(key=lambda txn: txn[0])
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(('date', 'description', 'amount'))
+        writer.writerows((day.strftime('%Y-%m-%d'), description, f"{amount:.2f}")
+                         for day, description, amount in transactions)
+
+
+async def _insert_batch(users: List[SyntheticUser]):
+    tables = (
+        (UserDB, [user.row for user in users]),
+        (SubscriptionDB, [{k: v for k, v in s.items() if not k.startswith('_')}
+                          for user in users for s in user.subscriptions]),
+        (OptimizationDB, [o for user in users for o in user.optimizations]),
+        (NegotiationDB, [n for user in users for n in user.negotiations]),
+        (NegotiationMessageDB, [m for user in users for m in user.messages]),
+        (Activity, [a for user in users for a in user.activities]),
+    )
+    counts = {}
+    async with engine.begin() as conn:
+        for model, rows in tables:
+            if rows:
+                await conn.execute(insert(model.__table__), rows)
+            counts[model.__tablename__] = len(rows)
+    return counts
+
+
+async def seed(users: int, transactions: int = 0, activities: int = 40, months: int = 24,
+               batch_size: int = 500, statements_dir: str = '', seed: int = 42,
+               rollup: bool = False) -> Dict:
+    """Generate and insert the dataset; returns row counts and timings"""
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    password_hash = get_password_hash(PASSWORD)
+    if password_hash.startswith('dev_hash_'):
+        logger.warning("bcrypt is unavailable; seeded users get a dev hash and logins skip bcrypt")
+    per_user_transactions = transactions // users if users else 0
+    if statements_dir and per_user_transactions:
+        os.makedirs(statements_dir, exist_ok=True)
+
+    totals: Dict[str, int] = {'transactions': 0}
+    for first in range(0, users, batch_size):
+        batch = [SyntheticUser(index, rng, now, months, activities, password_hash)
+                 for index in range(first, min(users, first + batch_size))]
+        for table, count in (await _insert_batch(batch)).items():
+            totals[table] = totals.get(table, 0) + count
+
+        if statements_dir and per_user_transactions:
+            for user in batch:
+                write_statement(os.path.join(statements_dir, f"{user.id}.csv"), user,
+                                per_user_transactions, rng, now)
+            totals['transactions'] += per_user_transactions * len(batch)
+        logger.info(f"Seeded {min(users, first + batch_size)}/{users} users")
+
+    summary = {'rows': totals, 'insert_seconds': round(time.perf_counter() - started, 1)}
+    if rollup:
+        from app.services.monthly_rollup import run_rollup
+
+        rollup_started = time.perf_counter()
+        await run_rollup(backfill=True, session_factory=AsyncSessionLocal)
+        summary['rollup_seconds'] = round(time.perf_counter() - rollup_started, 1)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic SubGuard dataset")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--transactions', type=int, default=0,
+                        help="bank transactions in total, split evenly across users (needs --statements-dir)")
+    parser.add_argument('--statements-dir', default='', help="write one CSV statement per user here")
+    parser.add_argument('--activities', type=int, default=40, help="activities per user")
+    parser.add_argument('--months', type=int, default=24, help="history length")
+    parser.add_argument('--batch-size', type=int, default=500, help="users per transaction")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--rollup', action='store_true', help="backfill monthly snapshots afterwards")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    summary = asyncio.run(seed(
+        args.users, args.transactions, args.activities, args.months,
+        max(1, args.batch_size), args.statements_dir, args.seed, args.rollup,
+    ))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,8 @@
-import google.generativeai as genai
 import logging
 import json
 from typing import Dict, Optional
-from app.core.config import settings
+from app.services.llm_cache import llm_cache
+from app.services.llm_client import llm_client
 
 logger = logging.getLogger(__name__)
 
@@ -10,9 +10,9 @@ class AIAnalyzer:
     """AI-powered subscription analysis using Gemini"""
     
     def __init__(self):
-        if settings.GEMINI_API_KEY:
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-            self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
+        self.llm = llm_client
+        self.cache = llm_cache
+        if self.llm.enabled:
             self.enabled = True
             logger.info("✅ Gemini AI configurado com sucesso")
         else:
@@ -25,8 +25,30 @@ class AIAnalyzer:
         if not self.enabled:
             return self._mock_analysis(subscription)
         
+        # Only the fields that go into the prompt identify the analysis
+        prompt_input = {
+            'service_name': subscription['service_name'],
+            'plan_name': subscription['plan_name'],
+            'monthly_cost': subscription['monthly_cost'],
+            'service_category': subscription.get('service_category'),
+            'last_used_date': subscription.get('last_used_date'),
+        }
+        
         try:
-            prompt = f"""
+            result = await self.cache.get_or_compute(
+                "subscription_analysis",
+                prompt_input,
+                lambda: self._analyze_with_gemini(subscription),
+            )
+            logger.info(f"✅ Análise IA concluída para {subscription['service_name']}")
+            return result
+            
+        except Exception as e:
+            logger.error(f"❌ Erro na análise IA: {e}")
+            return self._mock_analysis(subscription)
+    
+    async def _analyze_with_gemini(self, subscription: Dict) -> Dict:
+        prompt = f"""
 Você é um especialista em otimização de gastos com assinaturas.
 
 Analise esta assinatura:
@@ -48,23 +70,18 @@ Forneça uma análise em JSON com:
 
 IMPORTANTE: Retorne APENAS o JSON, sem markdown ou texto adicional.
 """
-            
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
-            
-            # Remove markdown se houver
-            if result_text.startswith("```"):
-                result_text = result_text.split("```")[1]
-                if result_text.startswith("json"):
-                    result_text = result_text[4:]
-            
-            result = json.loads(result_text)
-            logger.info(f"✅ Análise IA concluída para {subscription['service_name']}")
-            return result
-            
-        except Exception as e:
-            logger.error(f"❌ Erro na análise IA: {e}")
-            return self._mock_analysis(subscription)
+        
+        response_text = await self.llm.generate(prompt, kind="subscription_analysis")
+        result_text = response_text.strip()
+        
+        # Remove markdown se houver
+        if result_text.startswith("```"):
+            result_text = result_text.split("```")[1]
+            if result_text.startswith("json"):
+                result_text = result_text[4:]
+        
+        result = json.loads(result_text)
+        return result
     
     def _mock_analysis(self, subscription: Dict) -> Dict:
         """Mock de análise para desenvolvimento"""
@@ -1,25 +1,81 @@
-import google.generativeai as genai
-from app.core.config import settings
-from typing import List, Dict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 import json
 
-genai.configure(api_key=settings.GEMINI_API_KEY)
+from app.services.llm_client import llm_client
+
+FINAL_OFFER_MARKER = "FINAL_OFFER:"
+
+
+def parse_provider_response(content: str, offer: Optional[str] = None) -> Dict:
+    """Split a reply into the visible text and the FINAL_OFFER:price:terms tail"""
+    if offer is None:
+        if FINAL_OFFER_MARKER not in content:
+            return {"content": content, "ready_for_offer": False}
+        content, offer = content.split(FINAL_OFFER_MARKER, 1)
+
+    offer_data = offer.strip().split(":")
+    try:
+        price = float(offer_data[0])
+    except ValueError:
+        # A marker without a usable price is no offer
+        return {"content": content.strip(), "ready_for_offer": False}
+    return {
+        "content": content.strip(),
+        "ready_for_offer": True,
+        "offer_price": price,
+        "offer_terms": offer_data[1] if len(offer_data) > 1 else "12 month commitment"
+    }
+
+
+class FinalOfferParser:
+    """Incremental FINAL_OFFER: detection over streamed chunks.
+
+    feed() returns the text that is safe to show: anything that might be
+    the start of the marker is held back until the next chunk settles it,
+    and everything after the marker is kept for finish().
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._offer = None
+        self._content = []
+
+    def feed(self, chunk: str) -> str:
+        if self._offer is not None:
+            self._offer += chunk
+            return ""
+
+        text = self._pending + chunk
+        index = text.find(FINAL_OFFER_MARKER)
+        if index >= 0:
+            self._offer = text[index + len(FINAL_OFFER_MARKER):]
+            self._pending = ""
+            visible = text[:index]
+        else:
+            # Keep the longest suffix that is a prefix of the marker
+            hold = 0
+            for size in range(min(len(text), len(FINAL_OFFER_MARKER) - 1), 0, -1):
+                if FINAL_OFFER_MARKER.startswith(text[-size:]):
+                    hold = size
+                    break
+            visible, self._pending = text[:len(text) - hold], text[len(text) - hold:]
+
+        self._content.append(visible)
+        return visible
+
+    def finish(self) -> Dict:
+        """Parsed reply once the stream ended"""
+        content = "".join(self._content) + self._pending
+        return parse_provider_response(content, self._offer)
+
 
 class AINegotiator:
     def __init__(self):
-        self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
-    
-    async def generate_provider_response(
-        self,
-        provider_name: str,
-        current_plan: str,
-        proposed_savings: float,
-        message_history: List[Dict]
-    ) -> Dict:
-        """Generate realistic provider response"""
-        
-        # Build context
-        context = f"""You are a customer service representative for {provider_name}. 
+        self.llm = llm_client
+
+    def _prompt(self, provider_name: str, current_plan: str, proposed_savings: float,
+                message_history: List[Dict]) -> str:
+        return f"""You are a customer service representative for {provider_name}.
 A customer's AI assistant is negotiating a discount on their {current_plan} plan.
 The AI is trying to get a discount of R$ {proposed_savings:.2f}/month.
 
@@ -33,28 +89,33 @@ Your goal:
 4. After 2-3 messages, make a final offer
 
 Respond as the provider in English. Keep it concise (2-3 sentences).
-If this is the 3rd+ message, include: FINAL_OFFER:price:terms
+If this is the 3rd+ message, include: {FINAL_OFFER_MARKER}price:terms
 """
-        
-        response = self.model.generate_content(context)
-        content = response.text
-        
-        # Check if final offer
-        ready_for_offer = "FINAL_OFFER:" in content
-        
-        if ready_for_offer:
-            parts = content.split("FINAL_OFFER:")
-            content = parts[0].strip()
-            offer_data = parts[1].strip().split(":")
-            
-            return {
-                "content": content,
-                "ready_for_offer": True,
-                "offer_price": float(offer_data[0]),
-                "offer_terms": offer_data[1] if len(offer_data) > 1 else "12 month commitment"
-            }
-        
-        return {
-            "content": content,
-            "ready_for_offer": False
-        }
+
+    async def generate_provider_response(
+        self,
+        provider_name: str,
+        current_plan: str,
+        proposed_savings: float,
+        message_history: List[Dict]
+    ) -> Dict:
+        """Generate realistic provider response"""
+        context = self._prompt(provider_name, current_plan, proposed_savings, message_history)
+        content = await self.llm.generate(context, kind="negotiation_response")
+        return parse_provider_response(content)
+
+    async def stream_provider_response(
+        self,
+        provider_name: str,
+        current_plan: str,
+        proposed_savings: float,
+        message_history: List[Dict]
+    ) -> AsyncIterator[Tuple[str, object]]:
+        """Yield ("token", text) as the reply is generated, then ("done", parsed reply)"""
+        context = self._prompt(provider_name, current_plan, proposed_savings, message_history)
+        parser = FinalOfferParser()
+        async for chunk in self.llm.stream(context, kind="negotiation_response"):
+            visible = parser.feed(chunk)
+            if visible:
+                yield "token", visible
+        yield "done", parser.finish()
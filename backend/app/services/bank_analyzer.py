@@ -1,13 +1,336 @@
+import asyncio
+import csv
 import logging
 import re
-from typing import List, Dict, Optional
-from datetime import datetime, timedelta
+from itertools import chain, islice
+from operator import itemgetter, methodcaller
+from typing import AsyncIterable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from datetime import date, datetime, timedelta, timezone
+
+from app.services.merchant_matcher import MerchantMatcher
+from app.services.recurrence import (
+    CADENCE_WINDOWS,
+    NUMPY_AVAILABLE,
+    RecurrenceDetector,
+    TransactionColumns,
+    classify_interval,
+)
 
 logger = logging.getLogger(__name__)
 
+# Column aliases accepted in CSV statement headers (lowercased)
+CSV_DATE_COLUMNS = ('date', 'data', 'posted', 'transaction date')
+CSV_DESCRIPTION_COLUMNS = ('description', 'descricao', 'descrição', 'memo', 'historico', 'histórico', 'name')
+CSV_AMOUNT_COLUMNS = ('amount', 'valor', 'value')
+
+_NON_WORD = re.compile(r'[^\w\s]')
+_DESCRIPTION_PREFIXES = ('pagamento', 'compra', 'debito', 'cartao', 'tb')
+# Batch normalization over descriptions joined with NUL: runs of punctuation
+# and spaces, then every description's leading prefixes and trailing space
+_NON_WORD_RUN = re.compile(r'[^\w\0]+')
+_PREFIX_RUN = re.compile(
+    r'(?<![^\0]) ?' + ''.join(f'(?:{prefix} ?)?' for prefix in _DESCRIPTION_PREFIXES) + r'| (?=\0)| $'
+)
+
+# Rows read per column chunk by the vectorized file path
+STATEMENT_CHUNK_ROWS = 65536
+
+
+def parse_transaction_date(value) -> Optional[datetime]:
+    """Parse a transaction date into a naive UTC datetime"""
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        parsed = datetime(value.year, value.month, value.day)
+    elif isinstance(value, str) and value:
+        parsed = None
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            # dd/mm/yyyy exports and OFX timestamps (20240105120000[-3:BRT])
+            for fmt, width in (('%d/%m/%Y', 10), ('%Y%m%d%H%M%S', 14), ('%Y%m%d', 8)):
+                try:
+                    parsed = datetime.strptime(value.strip()[:width], fmt)
+                    break
+                except ValueError:
+                    continue
+        if parsed is None:
+            return None
+    else:
+        return None
+
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _parse_amount(value) -> float:
+    """Parse a statement amount, accepting both 1,234.56 and 1.234,56 formats"""
+    if isinstance(value, (int, float)):
+        return abs(float(value))
+
+    text = re.sub(r'[^\d,.\-]', '', str(value or ''))
+    if ',' in text and '.' in text:
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    elif ',' in text:
+        text = text.replace(',', '.')
+
+    try:
+        return abs(float(text))
+    except ValueError:
+        return 0.0
+
+
+def _pick_column(fieldnames: List[str], candidates: Iterable[str]) -> Optional[str]:
+    lowered = {name.strip().lower(): name for name in fieldnames if name}
+    for candidate in candidates:
+        if candidate in lowered:
+            return lowered[candidate]
+    return None
+
+
+def _sniff_csv(f) -> csv.Dialect:
+    sample = f.read(4096)
+    f.seek(0)
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        return csv.excel
+
+
+def _csv_indexes(fieldnames: List[str]) -> List[int]:
+    """Positions of the date, description and amount columns"""
+    date_col = _pick_column(fieldnames, CSV_DATE_COLUMNS)
+    desc_col = _pick_column(fieldnames, CSV_DESCRIPTION_COLUMNS)
+    amount_col = _pick_column(fieldnames, CSV_AMOUNT_COLUMNS)
+
+    if not (date_col and desc_col and amount_col):
+        raise ValueError(f"Unrecognized CSV statement header: {fieldnames}")
+    return [fieldnames.index(col) for col in (date_col, desc_col, amount_col)]
+
+
+def _csv_rows(reader, indexes: List[int]) -> Iterator[Tuple]:
+    pick = itemgetter(*indexes)
+    width = max(indexes) + 1
+    for row in reader:
+        if not row:
+            continue
+        if len(row) < width:
+            row = row + [None] * (width - len(row))
+        txn_date, description, amount = pick(row)
+        yield txn_date, description or '', amount
+
+
+def _csv_records(path: str) -> Iterator[Tuple]:
+    """Yield raw (date, description, amount) values from a CSV bank statement"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f, dialect=_sniff_csv(f))
+        yield from _csv_rows(reader, _csv_indexes(next(reader, [])))
+
+
+def _ofx_records(path: str) -> Iterator[Tuple]:
+    """Yield raw (date, description, amount) values from an OFX (SGML or XML) statement"""
+    tag_pattern = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+    current = None
+
+    with open(path, encoding='latin-1') as f:
+        for line in f:
+            for closing, tag, value in tag_pattern.findall(line):
+                tag = tag.upper()
+                if tag == 'STMTTRN':
+                    if closing:
+                        if current is not None:
+                            yield (current.get('DTPOSTED'),
+                                   current.get('NAME') or current.get('MEMO') or '',
+                                   current.get('TRNAMT'))
+                        current = None
+                    else:
+                        current = {}
+                elif current is not None and not closing:
+                    current[tag] = value.strip()
+
+
+def _statement_records(path: str, file_format: Optional[str] = None) -> Iterator[Tuple]:
+    file_format = (file_format or path.rsplit('.', 1)[-1]).lower()
+    if file_format in ('ofx', 'qfx'):
+        return _ofx_records(path)
+    if file_format in ('csv', 'txt'):
+        return _csv_records(path)
+    raise ValueError(f"Unsupported statement format: {file_format}")
+
+
+def _transactions(records: Iterator[Tuple]) -> Iterator[Dict]:
+    for txn_date, description, amount in records:
+        yield {'date': txn_date, 'description': description, 'amount': _parse_amount(amount)}
+
+
+def iter_csv_statement(path: str) -> Iterator[Dict]:
+    """Yield transactions from a CSV bank statement one row at a time"""
+    return _transactions(_csv_records(path))
+
+
+def iter_ofx_statement(path: str) -> Iterator[Dict]:
+    """Yield transactions from an OFX (SGML or XML) statement one STMTTRN at a time"""
+    return _transactions(_ofx_records(path))
+
+
+def iter_statement_file(path: str, file_format: Optional[str] = None) -> Iterator[Dict]:
+    """Yield transactions from a CSV or OFX statement file"""
+    return _transactions(_statement_records(path, file_format))
+
+
+def _column_chunks(records: Iterator[Tuple], chunk_rows: int) -> Iterator[Tuple[List, List[str], List]]:
+    """Batch (date, description, amount) records into column chunks"""
+    while True:
+        batch = list(islice(records, chunk_rows))
+        if not batch:
+            return
+        dates, descriptions, amounts = map(list, zip(*batch))
+        yield dates, descriptions, amounts
+
+
+def _csv_column_chunks(path: str, chunk_rows: int) -> Iterator[Tuple[List, List[str], List]]:
+    """Columns of a CSV statement, chunk_rows lines at a time.
+
+    Chunks without quoting whose lines all have the header's width are
+    split in bulk; from the first one that does not, the rest of the file
+    goes through the csv module.
+    """
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        dialect = _sniff_csv(f)
+        reader = csv.reader(f, dialect=dialect)
+        fieldnames = next(reader, [])
+        indexes = _csv_indexes(fieldnames)
+        width = len(fieldnames)
+        delimiter, quotechar = dialect.delimiter, dialect.quotechar
+        separators = methodcaller('count', delimiter)
+
+        while not dialect.skipinitialspace:
+            lines = list(islice(f, chunk_rows))
+            if not lines:
+                return
+            block = ''.join(lines)
+            terminator = '\r\n' if lines[0].endswith('\r\n') else '\n'
+            rows = block.split(terminator)
+            if not rows[-1]:
+                rows.pop()
+            # Any other line ending, a blank or ragged line or a quote ends
+            # the bulk path
+            if ((quotechar and quotechar in block) or len(rows) != len(lines)
+                    or rows[-1].endswith(('\r', '\n')) or (terminator == '\n' and '\r' in block)
+                    or set(map(separators, rows)) != {width - 1}):
+                reader = csv.reader(chain(lines, f), dialect=dialect)
+                break
+            fields = delimiter.join(rows).split(delimiter)
+            dates, descriptions, amounts = (fields[index::width] for index in indexes)
+            yield dates, descriptions, amounts
+
+        yield from _column_chunks(_csv_rows(reader, indexes), chunk_rows)
+
+
+def iter_statement_columns(path: str, file_format: Optional[str] = None,
+                           chunk_rows: int = STATEMENT_CHUNK_ROWS) -> Iterator[Tuple[List, List[str], List]]:
+    """Yield raw (dates, descriptions, amounts) columns of a CSV or OFX statement.
+
+    At most chunk_rows rows are held at a time, so memory stays bounded
+    whatever the size of the file.
+    """
+    if (file_format or path.rsplit('.', 1)[-1]).lower() in ('csv', 'txt'):
+        return _csv_column_chunks(path, chunk_rows)
+    return _column_chunks(_statement_records(path, file_format), chunk_rows)
+
+
+class _MerchantState:
+    """Running aggregate for one merchant.
+
+    Only an interval histogram, amount extremes and the two latest dates are
+    kept, so memory grows with the number of distinct merchants instead of
+    the number of rows.
+    """
+
+    __slots__ = (
+        'description', 'count', 'total_amount', 'min_amount', 'max_amount',
+        'cadence_counts', 'prev_date', 'last_date', 'seen_date', 'latest_txn',
+    )
+
+    def __init__(self, description: str):
+        self.description = description
+        self.count = 0
+        self.total_amount = 0.0
+        self.min_amount = None
+        self.max_amount = None
+        self.cadence_counts = [0] * len(CADENCE_WINDOWS)
+        self.prev_date = None
+        self.last_date = None
+        self.seen_date = None
+        self.latest_txn = None
+
+    def add(self, txn: Dict, txn_date: Optional[datetime]):
+        amount = txn.get('amount', 0)
+        self.count += 1
+        self.total_amount += amount
+        if self.min_amount is None or amount < self.min_amount:
+            self.min_amount = amount
+        if self.max_amount is None or amount > self.max_amount:
+            self.max_amount = amount
+
+        if txn_date is None:
+            if self.latest_txn is None:
+                self.latest_txn = txn
+            return
+
+        # Interval against the previous row of this merchant (statements are
+        # chronological, ascending or descending)
+        if self.seen_date is not None:
+            cadence = classify_interval(abs((txn_date - self.seen_date).days))
+            if cadence is not None:
+                self.cadence_counts[cadence] += 1
+        self.seen_date = txn_date
+
+        if self.last_date is None or txn_date >= self.last_date:
+            self.last_date, self.prev_date = txn_date, self.last_date
+            self.latest_txn = txn
+        elif self.prev_date is None or txn_date > self.prev_date:
+            self.prev_date = txn_date
+
+    @property
+    def recurring(self) -> bool:
+        return self.count >= 2 and any(self.cadence_counts)
+
+    @property
+    def billing_cycle(self) -> str:
+        """Dominant cadence among observed intervals"""
+        if not any(self.cadence_counts):
+            return 'monthly'
+        best = max(range(len(CADENCE_WINDOWS)), key=lambda index: self.cadence_counts[index])
+        return CADENCE_WINDOWS[best][0]
+
+    @property
+    def mean_amount(self) -> float:
+        return self.total_amount / self.count
+
+    @property
+    def amount_drift(self) -> float:
+        """Relative spread between the cheapest and the most expensive charge"""
+        mean = self.mean_amount
+        if not mean:
+            return 0.0
+        return round((self.max_amount - self.min_amount) / mean, 4)
+
+    @property
+    def next_billing_date(self) -> Optional[datetime]:
+        """Latest charge plus the interval leading to it"""
+        if self.last_date is None or self.prev_date is None:
+            return None
+        return self.last_date + timedelta(days=(self.last_date - self.prev_date).days)
+
+
 class BankAnalyzer:
     """Analyze bank statements for recurring subscriptions"""
-    
+
     # Patterns for common subscription services in bank transactions
     TRANSACTION_PATTERNS = {
         'netflix': [r'netflix', r'nflx'],
@@ -21,156 +344,152 @@ class BankAnalyzer:
         'ifood': [r'ifood'],
         'uber': [r'uber one'],
     }
-    
-    def __init__(self):
+
+    def __init__(self, vectorized: Optional[bool] = None):
         self.logger = logging.getLogger(__name__)
-    
+        # Columnar NumPy detection by default, streaming fold when unavailable
+        self.vectorized = NUMPY_AVAILABLE if vectorized is None else vectorized
+
     async def analyze_transactions(self, transactions: List[Dict]) -> List[Dict]:
         """Analyze bank transactions for recurring subscriptions"""
-        
+
+        if self.vectorized:
+            return self._detect(TransactionColumns.from_transactions(
+                transactions, self._normalize_descriptions, parse_transaction_date,
+                keep=self._known,
+            ))
+
+        # Parse every date once and feed the rows in chronological order
+        dated = [(parse_transaction_date(txn.get('date')), txn) for txn in transactions]
+        dated.sort(key=lambda item: (item[0] is None, item[0] or datetime.min))
+
+        states = {}
+        for txn_date, txn in dated:
+            self._consume(states, txn, txn_date)
+
+        return self._build_subscriptions(states.values())
+
+    async def analyze_stream(
+        self,
+        transactions: Union[Iterable[Dict], AsyncIterable[Dict]]
+    ) -> List[Dict]:
+        """Analyze a chronological stream of transactions with bounded memory"""
+
+        states = {}
+
+        if hasattr(transactions, '__aiter__'):
+            async for txn in transactions:
+                self._consume(states, txn)
+        else:
+            for txn in transactions:
+                self._consume(states, txn)
+
+        return self._build_subscriptions(states.values())
+
+    async def analyze_file(self, path: str, file_format: Optional[str] = None) -> List[Dict]:
+        """Analyze a CSV or OFX statement file.
+
+        The vectorized engine reads the file in column chunks and keeps only
+        rows of known services; the streaming fold keeps memory bounded by
+        the number of merchants.
+        """
+
+        def _run() -> List[Dict]:
+            if self.vectorized:
+                # Columns straight from the reader, no per-row dicts
+                chunks = iter_statement_columns(path, file_format, STATEMENT_CHUNK_ROWS)
+                return self._detect(TransactionColumns.from_chunks(
+                    chunks, self._normalize_descriptions, parse_transaction_date,
+                    parse_amount=_parse_amount, keep=self._known,
+                ))
+
+            states = {}
+            for txn in iter_statement_file(path, file_format):
+                self._consume(states, txn)
+            return self._build_subscriptions(states.values())
+
+        # File parsing is CPU bound, keep it off the event loop
+        return await asyncio.to_thread(_run)
+
+    def _detect(self, columns: TransactionColumns) -> List[Dict]:
+        """Run the vectorized detector over columns of known services"""
+        return self._build_subscriptions(RecurrenceDetector().detect(columns))
+
+    def _known(self, merchants: List[str]) -> List[bool]:
+        # Only known services become subscriptions, so other merchants'
+        # rows are never loaded into columns
+        return [service is not None for service in transaction_matcher.match_many(merchants)]
+
+    def _consume(self, states: Dict, txn: Dict, txn_date: Optional[datetime] = None):
+        """Fold one transaction into the running per-merchant state"""
+        desc = self._normalize_description(txn.get('description', ''))
+
+        state = states.get(desc)
+        if state is None:
+            state = states[desc] = _MerchantState(desc)
+
+        if txn_date is None:
+            txn_date = parse_transaction_date(txn.get('date'))
+        state.add(txn, txn_date)
+
+    def _build_subscriptions(self, summaries: Iterable) -> List[Dict]:
+        """Turn recurring merchant summaries into subscription dicts"""
         subscriptions = []
-        
-        # Group transactions by description
-        grouped_transactions = self._group_transactions(transactions)
-        
-        # Identify recurring charges
-        for description, txns in grouped_transactions.items():
-            if len(txns) >= 2 and self._is_recurring(txns):
-                service = self._identify_service(description)
+
+        for summary in summaries:
+            if summary.recurring:
+                service = self._identify_service(summary.description)
                 if service:
-                    subscription = self._create_subscription(service, txns)
-                    subscriptions.append(subscription)
-        
+                    subscriptions.append(self._create_subscription(service, summary))
+
         return subscriptions
-    
-    def _group_transactions(self, transactions: List[Dict]) -> Dict[str, List]:
-        """Group transactions by normalized description"""
-        grouped = {}
-        
-        for txn in transactions:
-            desc = self._normalize_description(txn.get('description', ''))
-            amount = txn.get('amount', 0)
-            
-            key = f"{desc}_{amount:.2f}"
-            if key not in grouped:
-                grouped[key] = []
-            grouped[key].append(txn)
-        
-        return grouped
-    
+
     def _normalize_description(self, description: str) -> str:
         """Normalize transaction description"""
         # Remove special characters and extra spaces
-        desc = re.sub(r'[^\w\s]', ' ', description.lower())
-        desc = re.sub(r'\s+', ' ', desc).strip()
-        
+        desc = ' '.join(_NON_WORD.sub(' ', description.lower()).split())
+
         # Remove common prefixes
-        prefixes = ['pagamento', 'compra', 'debito', 'cartao', 'tb']
-        for prefix in prefixes:
+        for prefix in _DESCRIPTION_PREFIXES:
             if desc.startswith(prefix):
                 desc = desc[len(prefix):].strip()
-        
+
         return desc
-    
-    def _is_recurring(self, transactions: List[Dict]) -> bool:
-        """Check if transactions appear regularly"""
-        if len(transactions) < 2:
-            return False
-        
-        # Sort by date
-        sorted_txns = sorted(transactions, key=lambda x: x.get('date'))
-        
-        # Calculate intervals between transactions
-        dates = [txn.get('date') for txn in sorted_txns]
-        
-        # Check for monthly pattern (approximately 30 days)
-        for i in range(1, len(dates)):
-            if isinstance(dates[i], str):
-                try:
-                    date_i = datetime.fromisoformat(dates[i].replace('Z', '+00:00'))
-                    date_prev = datetime.fromisoformat(dates[i-1].replace('Z', '+00:00'))
-                    
-                    diff_days = (date_i - date_prev).days
-                    if 25 <= diff_days <= 35:  # Monthly pattern
-                        return True
-                except (ValueError, TypeError):
-                    continue
-        
-        return False
-    
+
+    def _normalize_descriptions(self, descriptions: List[str]) -> List[str]:
+        """_normalize_description for a batch, cleaned in one pass over the joined text"""
+        text = '\0'.join(descriptions).lower()
+        if text.count('\0') != len(descriptions) - 1:
+            return list(map(self._normalize_description, descriptions))
+        return _PREFIX_RUN.sub('', _NON_WORD_RUN.sub(' ', text)).split('\0')
+
     def _identify_service(self, description: str) -> Optional[str]:
         """Identify subscription service from transaction description"""
-        for service, patterns in self.TRANSACTION_PATTERNS.items():
-            for pattern in patterns:
-                if re.search(pattern, description, re.IGNORECASE):
-                    return service
-        return None
-    
-    def _create_subscription(self, service: str, transactions: List[Dict]) -> Dict:
-        """Create subscription object from transactions"""
-        
-        # Use the most recent transaction
-        latest_txn = max(transactions, key=lambda x: x.get('date'))
-        
-        # Calculate average amount
-        avg_amount = sum(txn.get('amount', 0) for txn in transactions) / len(transactions)
-        
-        # Determine billing cycle
-        billing_cycle = self._determine_billing_cycle(transactions)
-        
-        # Estimate next billing date
-        next_billing = self._estimate_next_billing(transactions)
-        
+        return transaction_matcher.match(description)
+
+    def _create_subscription(self, service: str, summary) -> Dict:
+        """Create subscription object from a merchant summary
+
+        Accepts either a streaming _MerchantState or a MerchantRecurrence
+        from the vectorized detector; both expose the same fields.
+        """
+        next_billing = summary.next_billing_date
+
         return {
             'service_name': service.title(),
             'plan_name': f'{service.title()} Subscription',
-            'monthly_cost': avg_amount,
-            'billing_cycle': billing_cycle,
+            'monthly_cost': round(summary.mean_amount, 2),
+            'billing_cycle': summary.billing_cycle,
             'detection_source': 'bank',
             'confidence_score': 0.8,
             'next_billing_date': next_billing.isoformat() if next_billing else None,
             'raw_data': {
-                'transactions_count': len(transactions),
-                'last_transaction': latest_txn
+                'transactions_count': summary.count,
+                'amount_drift': summary.amount_drift,
+                'last_transaction': summary.latest_txn
             }
         }
-    
-    def _determine_billing_cycle(self, transactions: List[Dict]) -> str:
-        """Determine billing cycle from transaction dates"""
-        if len(transactions) < 2:
-            return 'monthly'
-        
-        dates = sorted([txn.get('date') for txn in transactions])
-        try:
-            date1 = datetime.fromisoformat(dates[0].replace('Z', '+00:00'))
-            date2 = datetime.fromisoformat(dates[1].replace('Z', '+00:00'))
-            
-            diff_days = (date2 - date1).days
-            
-            if 25 <= diff_days <= 35:
-                return 'monthly'
-            elif 80 <= diff_days <= 100:
-                return 'quarterly'
-            elif 350 <= diff_days <= 380:
-                return 'yearly'
-            else:
-                return 'monthly'
-        except (ValueError, TypeError):
-            return 'monthly'
-    
-    def _estimate_next_billing(self, transactions: List[Dict]) -> Optional[datetime]:
-        """Estimate next billing date"""
-        if len(transactions) < 2:
-            return None
-        
-        dates = sorted([txn.get('date') for txn in transactions])
-        try:
-            last_date = datetime.fromisoformat(dates[-1].replace('Z', '+00:00'))
-            second_last = datetime.fromisoformat(dates[-2].replace('Z', '+00:00'))
-            
-            interval = (last_date - second_last).days
-            
-            # Add interval to last date
-            return last_date + timedelta(days=interval)
-        except (ValueError, TypeError):
-            return None
\ No newline at end of file
+
+
+# Compiled once at import and shared by every BankAnalyzer
+transaction_matcher = MerchantMatcher.from_settings(BankAnalyzer.TRANSACTION_PATTERNS)
@@ -0,0 +1,142 @@
+"""
+Circuit breaker for calls to an external dependency.
+
+After failure_threshold consecutive failures (errors, or calls slower than
+slow_call_seconds) the breaker opens and rejects calls immediately with
+CircuitOpenError, so callers fall back at once instead of waiting on a
+provider that is down. After reset_seconds it lets a single probe through
+(half-open); the probe's outcome closes or re-opens it.
+"""
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from app.core.metrics import metric_lines, registry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling while the breaker is open"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0,
+                 slow_call_seconds: float = 0.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.slow_call_seconds = slow_call_seconds  # 0 = duration never counts as failure
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self.consecutive_failures = 0
+        self.counts = {'calls': 0, 'failures': 0, 'slow_calls': 0, 'rejected': 0, 'opened': 0}
+        _breakers.setdefault(name, self)  # the first (shared) instance per name is reported
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self._state = HALF_OPEN
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """True when a call made now would be rejected"""
+        state = self.state
+        return state == OPEN or (state == HALF_OPEN and self._probing)
+
+    def _allow(self) -> bool:
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self._probing = False
+        self.consecutive_failures = 0
+        if self._state != CLOSED:
+            logger.info(f"Circuit {self.name} closed")
+        self._state = CLOSED
+
+    def record_failure(self):
+        self._probing = False
+        self.counts['failures'] += 1
+        self.consecutive_failures += 1
+        if self._state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self._state != OPEN:
+                self.counts['opened'] += 1
+                logger.warning(f"Circuit {self.name} opened after {self.consecutive_failures} failures")
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+
+    async def call(self, factory: Callable[[], Awaitable[T]],
+                   slow_call_seconds: Optional[float] = None) -> T:
+        """Await factory() unless the breaker is open; record how it went.
+
+        slow_call_seconds overrides the breaker's threshold for this call.
+        """
+        if not self._allow():
+            self.counts['rejected'] += 1
+            raise CircuitOpenError(f"Circuit {self.name} is open")
+
+        self.counts['calls'] += 1
+        started = time.monotonic()
+        try:
+            result = await factory()
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            # Cancellation (a caller giving up) says nothing about the provider
+            self._probing = False
+            raise
+        slow = self.slow_call_seconds if slow_call_seconds is None else slow_call_seconds
+        if slow and time.monotonic() - started > slow:
+            self.counts['slow_calls'] += 1
+            self.record_failure()
+        else:
+            self.record_success()
+        return result
+
+    def stats(self) -> Dict:
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'failure_threshold': self.failure_threshold,
+            'reset_seconds': self.reset_seconds,
+            'slow_call_seconds': self.slow_call_seconds,
+            **self.counts,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def _collect_breaker_metrics():
+    lines = metric_lines("circuit_breaker_state", "gauge", "0 closed, 1 half-open, 2 open",
+                         [({"name": b.name}, _STATE_VALUES[b.state]) for b in _breakers.values()])
+    for name, field, documentation in (
+        ("circuit_breaker_calls_total", "calls", "Calls let through"),
+        ("circuit_breaker_failures_total", "failures", "Calls that failed or were too slow"),
+        ("circuit_breaker_rejected_total", "rejected", "Calls rejected while open"),
+        ("circuit_breaker_opened_total", "opened", "Times the breaker opened"),
+    ):
+        lines += metric_lines(name, "counter", documentation,
+                              [({"name": b.name}, b.counts[field]) for b in _breakers.values()])
+    return lines
+
+
+registry.add_collector(_collect_breaker_metrics)
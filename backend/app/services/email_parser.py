@@ -1,3 +1,4 @@
+import asyncio
 import re
 import logging
 from typing import List, Dict, Optional
@@ -6,7 +7,9 @@ import email
 from email import policy
 from email.parser import BytesParser
 
+from app.core.config import settings
 from app.services.gemini_service import gemini_service
+from app.services.merchant_matcher import MerchantMatcher
 
 logger = logging.getLogger(__name__)
 
@@ -43,15 +46,34 @@ class EmailParser:
     def __init__(self):
         self.gemini = gemini_service
     
-    async def parse_email(self, email_content: str) -> Optional[Dict]:
-        """Parse email content using Gemini AI"""
+    async def parse_email(self, email_content: str, budget: Optional[float] = None) -> Optional[Dict]:
+        """Parse email content using Gemini AI.
+
+        Falls back to pattern matching (marked degraded) when the Gemini
+        breaker is open or the answer takes longer than budget seconds
+        (LLM_LATENCY_BUDGET_SECONDS by default; 0 never waits); a late
+        answer still fills the LLM cache for the next parse.
+        """
         try:
             # First, check if it's likely a billing email
             if not self._is_billing_email(email_content):
                 return None
             
             # Use Gemini for structured extraction
-            result = await self.gemini.analyze_email(email_content)
+            result = None
+            if not self.gemini.breaker.is_open:
+                call = asyncio.ensure_future(self.gemini.analyze_email(email_content))
+                budget = settings.LLM_LATENCY_BUDGET_SECONDS if budget is None else budget
+                try:
+                    result = await asyncio.wait_for(asyncio.shield(call), budget)
+                except asyncio.TimeoutError:
+                    pass
+                else:
+                    # analyze_email answers None both for "not a subscription" and for errors
+                    if result is None and not self.gemini.breaker.is_open:
+                        return None
+            if result is None:
+                result = self._parse_with_patterns(email_content)
             
             if result and self._validate_subscription_data(result):
                 # Enhance with pattern matching
@@ -64,6 +86,19 @@ class EmailParser:
             logger.error(f"Error parsing email: {e}")
             return None
     
+    def _parse_with_patterns(self, content: str) -> Optional[Dict]:
+        """Service and amount by pattern matching alone, without the AI"""
+        service = self._detect_service(content.lower())
+        amount = re.search(r'(R\$|\$)\s*(\d+[,.]\d{2})', content)
+        if not service or not amount:
+            return None
+        return {
+            'service_name': service,
+            'amount': float(amount.group(2).replace(',', '.')),
+            'currency': 'BRL' if amount.group(1) == 'R$' else 'USD',
+            'degraded': True,
+        }
+    
     def _is_billing_email(self, content: str) -> bool:
         """Check if email is likely a billing/subscription email"""
         content_lower = content.lower()
@@ -87,11 +122,7 @@ class EmailParser:
     
     def _detect_service(self, content: str) -> Optional[str]:
         """Detect subscription service from email content"""
-        for service, patterns in self.SUBSCRIPTION_PATTERNS.items():
-            for pattern in patterns:
-                if re.search(pattern, content, re.IGNORECASE):
-                    return service
-        return None
+        return subscription_matcher.match(content)
     
     def _validate_subscription_data(self, data: Dict) -> bool:
         """Validate extracted subscription data"""
@@ -179,4 +210,8 @@ class EmailParser:
             
         except Exception as e:
             logger.error(f"Error parsing email file: {e}")
-            return None
\ No newline at end of file
+            return None
+
+
+# Compiled once at import and shared by every EmailParser
+subscription_matcher = MerchantMatcher.from_settings(EmailParser.SUBSCRIPTION_PATTERNS)
@@ -0,0 +1,148 @@
+"""
+In-process publish/subscribe for per-user events.
+
+Each connected client (see app.api.endpoints.events) holds a bounded queue;
+publishing never blocks, and a client that falls behind loses its oldest
+events instead of slowing the publisher. Activity inserts are published
+once their transaction commits; endpoints publish negotiation deltas
+themselves.
+
+The broker lives in the web process, so with several workers a client only
+sees events produced by the worker it is connected to.
+"""
+import asyncio
+import itertools
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app.core.config import settings
+from app.models.activity import Activity
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One client's queue of events"""
+
+    def __init__(self, user_id: str, max_queue: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.loop = asyncio.get_running_loop()
+        self.dropped = 0
+
+    def put(self, message: Dict):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """Next event, or None after timeout seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus:
+    """In-memory broker keyed by user id"""
+
+    def __init__(self, max_queue: Optional[int] = None):
+        self.max_queue = max_queue or settings.EVENT_STREAM_QUEUE_SIZE
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._ids = itertools.count(1)
+        self.published = 0
+
+    def subscribe(self, user_id: str) -> Subscription:
+        subscription = Subscription(user_id, self.max_queue)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id: str, event_type: str, data: Any) -> int:
+        """Queue an event for every client of the user; returns how many got it"""
+        subscribers = self._subscribers.get(user_id)
+        if not subscribers:
+            return 0
+
+        message = {
+            'id': next(self._ids),
+            'event': event_type,
+            'data': data,
+            'timestamp': datetime.utcnow().isoformat(),
+        }
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        for subscription in list(subscribers):
+            if subscription.loop is running:
+                subscription.put(message)
+            else:  # published from another thread (e.g. a sync worker)
+                subscription.loop.call_soon_threadsafe(subscription.put, message)
+        self.published += 1
+        return len(subscribers)
+
+    def stats(self) -> Dict:
+        return {
+            'users': len(self._subscribers),
+            'connections': sum(len(subscribers) for subscribers in self._subscribers.values()),
+            'published': self.published,
+        }
+
+
+def activity_event(activity: Activity) -> Dict:
+    return {
+        'id': activity.id,
+        'activity_type': activity.activity_type,
+        'title': activity.title,
+        'description': activity.description,
+        'meta_data': activity.meta_data,
+        'created_at': activity.created_at.isoformat() if activity.created_at else None,
+        'read': activity.read,
+    }
+
+
+# Activities are queued on the session at insert and published only if
+# the transaction commits
+_PENDING_KEY = 'pending_events'
+
+
+def publish_on_commit(session, user_id: str, event_type: str, data: Any):
+    """Publish once the session's transaction commits (dropped on rollback)"""
+    session = getattr(session, 'sync_session', session)  # AsyncSession or Session
+    session.info.setdefault(_PENDING_KEY, []).append((user_id, event_type, data))
+
+
+def _queue_activity(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        publish_on_commit(session, target.user_id, 'activity', activity_event(target))
+
+
+def _publish_pending(session):
+    for user_id, event_type, data in session.info.pop(_PENDING_KEY, ()):
+        event_bus.publish(user_id, event_type, data)
+
+
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+event.listen(Activity, 'after_insert', _queue_activity)
+event.listen(Session, 'after_commit', _publish_pending)
+event.listen(Session, 'after_rollback', _discard_pending)
+
+# Singleton instance
+event_bus = EventBus()
@@ -1,17 +1,30 @@
-import google.generativeai as genai
 from typing import Dict, Any, List, Optional
+import asyncio
 import json
 import logging
 from app.core.config import settings
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.llm_cache import llm_cache
+from app.services.llm_client import llm_client
 
 logger = logging.getLogger(__name__)
 
+# Prompt kinds a user waits on. Only these count a slow answer as a failure;
+# batch and script prompts are slow by design and trip the breaker only by failing
+INTERACTIVE_KINDS = frozenset({"optimization_analysis", "email_analysis"})
+
 class GeminiService:
     """Service for interacting with Google Gemini AI"""
     
     def __init__(self):
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
+        self.llm = llm_client
+        self.cache = llm_cache
+        # Every call goes through the breaker; see INTERACTIVE_KINDS for slow calls
+        self.breaker = CircuitBreaker(
+            "gemini",
+            failure_threshold=settings.LLM_BREAKER_FAILURE_THRESHOLD,
+            reset_seconds=settings.LLM_BREAKER_RESET_SECONDS,
+        )
         self.system_prompts = self._load_system_prompts()
     
     def _load_system_prompts(self) -> Dict[str, str]:
@@ -29,6 +42,13 @@ class GeminiService:
             Return JSON with: current_plan_fit_score, optimal_plan, monthly_savings, reasoning.
             """,
             
+            "batch_optimization_analysis": """
+            You are a personal finance AI assistant. Analyze each subscription below and suggest optimizations.
+            Consider: usage patterns, alternative plans, market prices, user profile.
+            Return a JSON array with exactly one object per subscription, each with:
+            index (the subscription's index), current_plan_fit_score, optimal_plan, monthly_savings, reasoning.
+            """,
+            
             "negotiation_script": """
             You are a negotiation assistant. Generate a polite, persuasive message to request:
             1. Better pricing for loyal customers
@@ -38,78 +58,56 @@ class GeminiService:
             """
         }
     
+    async def _generate(self, prompt: str, kind: str) -> str:
+        """llm_client.generate behind the circuit breaker (CircuitOpenError when open)"""
+        slow_call_seconds = settings.LLM_LATENCY_BUDGET_SECONDS if kind in INTERACTIVE_KINDS else 0
+        return await self.breaker.call(lambda: self.llm.generate(prompt, kind=kind), slow_call_seconds)
+
     async def analyze_email(self, email_content: str) -> Optional[Dict[str, Any]]:
         """Analyze email content for subscription information"""
         try:
-            prompt = f"""
-            {self.system_prompts["email_analysis"]}
-            
-            Email Content:
-            {email_content[:5000]}  # Limit content length
-            
-            Return valid JSON or null.
-            """
-            
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
-            
-            # Clean response (remove markdown code blocks)
-            if result_text.startswith("```json"):
-                result_text = result_text[7:-3]
-            elif result_text.startswith("```"):
-                result_text = result_text[3:-3]
-            
-            if result_text.lower() == "null":
-                return None
-                
-            return json.loads(result_text)
-            
+            return await self.cache.get_or_compute(
+                "email_analysis",
+                email_content[:5000],
+                lambda: self._analyze_email(email_content),
+            )
         except Exception as e:
             logger.error(f"Error analyzing email with Gemini: {e}")
             return None
+
+    async def _analyze_email(self, email_content: str) -> Optional[Dict[str, Any]]:
+        prompt = f"""
+        {self.system_prompts["email_analysis"]}
+        
+        Email Content:
+        {email_content[:5000]}  # Limit content length
+        
+        Return valid JSON or null.
+        """
+        
+        response_text = await self._generate(prompt, kind="email_analysis")
+        result_text = response_text.strip()
+        
+        # Clean response (remove markdown code blocks)
+        if result_text.startswith("```json"):
+            result_text = result_text[7:-3]
+        elif result_text.startswith("```"):
+            result_text = result_text[3:-3]
+        
+        if result_text.lower() == "null":
+            return None
+            
+        return json.loads(result_text)
     
     async def optimize_subscription(self, subscription_data: Dict[str, Any], 
                                    usage_data: Optional[Dict] = None) -> Dict[str, Any]:
         """Generate optimization suggestions for a subscription"""
         try:
-            prompt = f"""
-            {self.system_prompts["optimization_analysis"]}
-            
-            Subscription Data:
-            {json.dumps(subscription_data, indent=2)}
-            
-            Usage Data (if available):
-            {json.dumps(usage_data or {}, indent=2)}
-            
-            User Profile:
-            - Total monthly spend: ${subscription_data.get('user_total_spend', 0)}
-            - Number of subscriptions: {subscription_data.get('user_total_subs', 1)}
-            - Risk tolerance: {subscription_data.get('risk_tolerance', 0.5)}/1.0
-            
-            Return JSON with:
-            - current_plan_fit_score (0-1)
-            - optimal_plan (name)
-            - monthly_savings (amount)
-            - yearly_savings (amount)
-            - reasoning (detailed explanation)
-            - confidence (0-1)
-            - suggested_actions (list)
-            """
-            
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
-            
-            # Clean response
-            if result_text.startswith("```json"):
-                result_text = result_text[7:-3]
-            elif result_text.startswith("```"):
-                result_text = result_text[3:-3]
-            
-            result = json.loads(result_text)
-            result["ai_model_used"] = settings.GEMINI_MODEL
-            
-            return result
-            
+            return await self.cache.get_or_compute(
+                "optimization_analysis",
+                {"subscription": subscription_data, "usage": usage_data or {}},
+                lambda: self._optimize_subscription(subscription_data, usage_data),
+            )
         except Exception as e:
             logger.error(f"Error optimizing subscription with Gemini: {e}")
             return {
@@ -118,6 +116,148 @@ class GeminiService:
                 "monthly_savings": 0,
                 "confidence": 0
             }
+
+    async def _optimize_subscription(self, subscription_data: Dict[str, Any],
+                                     usage_data: Optional[Dict] = None) -> Dict[str, Any]:
+        prompt = f"""
+        {self.system_prompts["optimization_analysis"]}
+        
+        Subscription Data:
+        {json.dumps(subscription_data, indent=2, default=str)}
+        
+        Usage Data (if available):
+        {json.dumps(usage_data or {}, indent=2, default=str)}
+        
+        User Profile:
+        - Total monthly spend: ${subscription_data.get('user_total_spend', 0)}
+        - Number of subscriptions: {subscription_data.get('user_total_subs', 1)}
+        - Risk tolerance: {subscription_data.get('risk_tolerance', 0.5)}/1.0
+        
+        Return JSON with:
+        - current_plan_fit_score (0-1)
+        - optimal_plan (name)
+        - monthly_savings (amount)
+        - yearly_savings (amount)
+        - reasoning (detailed explanation)
+        - confidence (0-1)
+        - suggested_actions (list)
+        """
+        
+        response_text = await self._generate(prompt, kind="optimization_analysis")
+        result_text = response_text.strip()
+        
+        # Clean response
+        if result_text.startswith("```json"):
+            result_text = result_text[7:-3]
+        elif result_text.startswith("```"):
+            result_text = result_text[3:-3]
+        
+        result = json.loads(result_text)
+        result["ai_model_used"] = settings.GEMINI_MODEL
+        
+        return result
+    
+    async def optimize_subscriptions(self, items: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Optimization suggestions for many subscriptions with one call per batch.
+
+        Each item is {"subscription": ..., "usage": ...}. Returns one result
+        per item, in order; an entry is None when the model's answer for
+        that item was missing or invalid, so the caller can retry it alone.
+        Raises CircuitOpenError when the breaker rejected every batch, so
+        callers can tell "Gemini is down" from "no answers".
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        payloads = [
+            {"subscription": item["subscription"], "usage": item.get("usage") or {}}
+            for item in items
+        ]
+
+        pending = []
+        for index, payload in enumerate(payloads):
+            cached = await self.cache.get("optimization_analysis", payload)
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending.append(index)
+
+        batch_size = max(1, settings.LLM_BATCH_SIZE)
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        answers = await asyncio.gather(
+            *(self._optimize_batch([payloads[i] for i in batch]) for batch in batches),
+            return_exceptions=True,
+        )
+
+        if answers and all(isinstance(answer, CircuitOpenError) for answer in answers):
+            raise answers[0]
+
+        for batch, answer in zip(batches, answers):
+            if isinstance(answer, Exception):
+                logger.error(f"Error optimizing subscription batch with Gemini: {answer}")
+                continue
+            for position, result in answer.items():
+                index = batch[position]
+                results[index] = result
+                await self.cache.set("optimization_analysis", payloads[index], result)
+
+        return results
+
+    async def _optimize_batch(self, payloads: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+        """Send one prompt for several subscriptions; returns valid results by position"""
+        subscriptions = [
+            {"index": position, "subscription": payload["subscription"], "usage_data": payload["usage"]}
+            for position, payload in enumerate(payloads)
+        ]
+        prompt = f"""
+        {self.system_prompts["batch_optimization_analysis"]}
+        
+        Subscriptions:
+        {json.dumps(subscriptions, indent=2, default=str)}
+        
+        Return only the JSON array, with these fields per object:
+        - index
+        - current_plan_fit_score (0-1)
+        - optimal_plan (name)
+        - monthly_savings (amount)
+        - yearly_savings (amount)
+        - reasoning (detailed explanation)
+        - confidence (0-1)
+        - suggested_actions (list)
+        """
+        
+        response_text = await self._generate(prompt, kind="batch_optimization_analysis")
+        result_text = response_text.strip()
+        
+        # Clean response
+        if result_text.startswith("```json"):
+            result_text = result_text[7:-3]
+        elif result_text.startswith("```"):
+            result_text = result_text[3:-3]
+        
+        parsed = json.loads(result_text)
+        if not isinstance(parsed, list):
+            raise ValueError("Expected a JSON array of analyses")
+        
+        results = {}
+        for result in parsed:
+            position = result.get("index") if isinstance(result, dict) else None
+            if (isinstance(position, int) and 0 <= position < len(payloads)
+                    and position not in results and self._valid_optimization(result)):
+                result.pop("index")
+                result["ai_model_used"] = settings.GEMINI_MODEL
+                results[position] = result
+        return results
+
+    @staticmethod
+    def _valid_optimization(result: Dict[str, Any]) -> bool:
+        """Check the fields SubscriptionAnalysis depends on"""
+        fit = result.get("current_plan_fit_score")
+        savings = result.get("monthly_savings")
+        actions = result.get("suggested_actions", [])
+        return (
+            isinstance(fit, (int, float)) and 0 <= fit <= 1
+            and isinstance(savings, (int, float)) and savings >= 0
+            and isinstance(actions, list)
+        )
     
     async def generate_negotiation_script(self, service_name: str, 
                                          user_context: Dict[str, Any]) -> str:
@@ -135,8 +275,8 @@ class GeminiService:
         4. Is polite and likely to get positive response
         """
         
-        response = self.model.generate_content(prompt)
-        return response.text.strip()
+        response_text = await self._generate(prompt, kind="negotiation_script")
+        return response_text.strip()
 
 # Singleton instance
 gemini_service = GeminiService()
\ No newline at end of file
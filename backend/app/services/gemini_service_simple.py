@@ -1,6 +1,6 @@
 # backend/app/services/gemini_service_simple.py
-import google.generativeai as genai
 from app.core.config import settings
+from app.services.llm_client import llm_client
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,8 +13,7 @@ class GeminiServiceSimple:
             logger.warning("GEMINI_API_KEY não configurada. Usando modo mock.")
             self.mock_mode = True
         else:
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-            self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
+            self.llm = llm_client
             self.mock_mode = False
     
     async def generate_text(self, prompt: str) -> str:
@@ -34,8 +33,7 @@ class GeminiServiceSimple:
             return "Análise concluída. Recomendação: revise suas assinaturas mensalmente."
         
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            return await self.llm.generate(prompt, kind="generic")
         except Exception as e:
             logger.error(f"Erro ao chamar Gemini API: {e}")
             return f"Erro na análise: {str(e)}"
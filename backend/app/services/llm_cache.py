@@ -0,0 +1,180 @@
+"""
+Content-addressed cache for Gemini results.
+
+Entries are keyed by a hash of the prompt kind, the model and the normalized
+input, so identical analyses (the same unchanged subscription, the same
+receipt template sent to many users) reach the model only once. Results live
+in an in-memory TTL/LRU cache and, when LLM_CACHE_DB_PATH is set, in a SQLite
+file that survives restarts and is shared by every worker on the host.
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def normalize_input(value: Any) -> Any:
+    """Canonical form of a prompt input: strings lowercased with whitespace collapsed"""
+    if isinstance(value, str):
+        return ' '.join(value.lower().split())
+    if isinstance(value, dict):
+        return {str(k): normalize_input(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_input(v) for v in value]
+    return value
+
+
+class _DiskTier:
+    """SQLite key/value store; every call blocks and is run off the event loop"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, kind TEXT NOT NULL,"
+                " value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return _MISSING
+        return json.loads(row[0])
+
+    def set(self, key: str, kind: str, value: Any, ttl: float):
+        payload = json.dumps(value, default=str)
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, kind, value, expires_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, kind, payload, time.time() + ttl),
+            )
+            conn.commit()
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            conn = self._connect()
+            deleted = conn.execute(
+                "DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),)
+            ).rowcount
+            conn.commit()
+        return deleted
+
+
+class LLMResponseCache:
+    """Two-tier (memory, then optional SQLite) cache for LLM results"""
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None,
+                 db_path: Optional[str] = None, model: Optional[str] = None):
+        self.ttl = settings.LLM_CACHE_TTL_SECONDS if ttl is None else ttl
+        self.model = model or settings.GEMINI_MODEL
+        self.memory = TTLCache(
+            settings.LLM_CACHE_MAX_ENTRIES if max_entries is None else max_entries,
+            self.ttl,
+        )
+        path = settings.LLM_CACHE_DB_PATH if db_path is None else db_path
+        self.disk = _DiskTier(path) if path else None
+        self.disk_hits = 0
+        self.disk_errors = 0
+        self.by_kind: Dict[str, Dict[str, int]] = {}
+
+    def make_key(self, kind: str, payload: Any) -> str:
+        canonical = json.dumps(normalize_input(payload), sort_keys=True, default=str)
+        digest = hashlib.sha256(f"{kind}\x00{self.model}\x00{canonical}".encode('utf-8'))
+        return f"{kind}:{digest.hexdigest()}"
+
+    def _count(self, kind: str, outcome: str):
+        stats = self.by_kind.setdefault(kind, {'hits': 0, 'misses': 0})
+        stats[outcome] += 1
+
+    async def get(self, kind: str, payload: Any, default: Any = None) -> Any:
+        """Return the cached result for (kind, payload), or default"""
+        key = self.make_key(kind, payload)
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            self._count(kind, 'hits')
+            # Callers routinely annotate results in place
+            return copy.deepcopy(value)
+
+        if self.disk is not None:
+            try:
+                value = await asyncio.to_thread(self.disk.get, key)
+            except (sqlite3.Error, ValueError) as e:
+                self.disk_errors += 1
+                logger.warning(f"LLM cache disk read failed: {e}")
+                value = _MISSING
+            if value is not _MISSING:
+                self.disk_hits += 1
+                self.memory.set(key, copy.deepcopy(value))
+                self._count(kind, 'hits')
+                return value
+
+        self._count(kind, 'misses')
+        return default
+
+    async def set(self, kind: str, payload: Any, value: Any):
+        key = self.make_key(kind, payload)
+        self.memory.set(key, copy.deepcopy(value))
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.disk.set, key, kind, value, self.ttl)
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                self.disk_errors += 1
+                logger.warning(f"LLM cache disk write failed: {e}")
+
+    async def get_or_compute(self, kind: str, payload: Any,
+                             compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached result for (kind, payload), computing it on a miss.
+
+        Exceptions raised by compute propagate and nothing is cached, so
+        failed or timed-out calls are retried next time.
+        """
+        value = await self.get(kind, payload, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        value = await compute()
+        await self.set(kind, payload, value)
+        return value
+
+    def clear(self):
+        self.memory.clear()
+
+    def stats(self) -> Dict:
+        return {
+            'memory': self.memory.stats(),
+            'disk': {
+                'enabled': self.disk is not None,
+                'hits': self.disk_hits,
+                'errors': self.disk_errors,
+            },
+            'kinds': {kind: dict(stats) for kind, stats in self.by_kind.items()},
+        }
+
+
+# Singleton instance
+llm_cache = LLMResponseCache()
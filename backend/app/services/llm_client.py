@@ -0,0 +1,280 @@
+"""
+Async access to the Gemini API shared by every AI service.
+
+A single model instance (and its underlying connection) is reused across
+requests, calls go through the native async API when the SDK provides it
+(or a dedicated thread pool otherwise) so the event loop never blocks, and
+a semaphore bounds how many calls are in flight at once. stream() relays
+the response chunk by chunk for callers that show text as it arrives.
+
+The provider itself sits behind a small backend interface (generate and
+stream, returning objects with .text) chosen by LLM_BACKEND: "gemini" for
+the real API, "local" for the stand-in in app.services.local_llm that load
+tests and offline development use.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import llm_latency, metric_lines, registry
+
+logger = logging.getLogger(__name__)
+
+
+class LLMTimeoutError(TimeoutError):
+    """Raised when a Gemini call exceeds its timeout"""
+
+
+class LLMMetrics:
+    """In-process counters for LLM calls, split by prompt kind"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.by_kind: Dict[str, Dict[str, float]] = {}
+
+    def _kind(self, kind: str) -> Dict[str, float]:
+        if kind not in self.by_kind:
+            self.by_kind[kind] = {
+                'requests': 0,
+                'errors': 0,
+                'timeouts': 0,
+                'total_latency_ms': 0.0,
+                'max_latency_ms': 0.0,
+                'streams': 0,
+                'total_first_chunk_ms': 0.0,
+                'prompt_tokens': 0,
+                'response_tokens': 0,
+            }
+        return self.by_kind[kind]
+
+    def record(self, kind: str, latency_ms: float, outcome: str = 'ok',
+               prompt_tokens: int = 0, response_tokens: int = 0,
+               first_chunk_ms: Optional[float] = None):
+        llm_latency.observe(latency_ms / 1000, kind, outcome)
+        stats = self._kind(kind)
+        if first_chunk_ms is not None:
+            stats['streams'] += 1
+            stats['total_first_chunk_ms'] += first_chunk_ms
+        stats['requests'] += 1
+        if outcome == 'error':
+            stats['errors'] += 1
+        elif outcome == 'timeout':
+            stats['timeouts'] += 1
+        stats['total_latency_ms'] += latency_ms
+        stats['max_latency_ms'] = max(stats['max_latency_ms'], latency_ms)
+        stats['prompt_tokens'] += prompt_tokens
+        stats['response_tokens'] += response_tokens
+
+    def snapshot(self) -> Dict:
+        kinds = {}
+        for kind, stats in self.by_kind.items():
+            kinds[kind] = dict(stats)
+            kinds[kind]['avg_latency_ms'] = (
+                stats['total_latency_ms'] / stats['requests'] if stats['requests'] else 0.0
+            )
+            kinds[kind]['avg_first_chunk_ms'] = (
+                stats['total_first_chunk_ms'] / stats['streams'] if stats['streams'] else 0.0
+            )
+        return {'in_flight': self.in_flight, 'kinds': kinds}
+
+
+class GeminiBackend:
+    """google.generativeai, natively async when the SDK allows it.
+
+    Backends expose name, enabled, generate(prompt, kind) and
+    stream(prompt, kind); LLMClient adds concurrency, timeouts and metrics.
+    """
+
+    name = 'gemini'
+
+    def __init__(self, model_name: str, max_workers: int):
+        self.model_name = model_name
+        self.max_workers = max_workers
+        self._executor = None
+        self._model = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(settings.GEMINI_API_KEY)
+
+    def _get_model(self):
+        if self._model is None:
+            import google.generativeai as genai
+
+            genai.configure(api_key=settings.GEMINI_API_KEY)
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    async def stream(self, prompt: str, kind: str):
+        """Async iterator of response chunks (objects with .text)"""
+        model = self._get_model()
+
+        if hasattr(model, 'generate_content_async'):
+            response = await model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                yield chunk
+            return
+
+        # Blocking SDK: iterate in the thread pool, hand chunks to the loop
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix='gemini'
+            )
+        loop = asyncio.get_running_loop()
+        iterator = iter(await loop.run_in_executor(
+            self._executor, lambda: model.generate_content(prompt, stream=True)
+        ))
+        done = object()
+        while True:
+            chunk = await loop.run_in_executor(self._executor, next, iterator, done)
+            if chunk is done:
+                return
+            yield chunk
+
+    async def generate(self, prompt: str, kind: str):
+        """The whole response (.text, and .usage_metadata when reported)"""
+        model = self._get_model()
+
+        if hasattr(model, 'generate_content_async'):
+            return await model.generate_content_async(prompt)
+
+        # Older SDKs only ship the blocking call; keep it off the event loop
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix='gemini'
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, model.generate_content, prompt)
+
+
+def build_backend(name: str, model_name: str, max_workers: int):
+    """The backend LLM_BACKEND names"""
+    if name == 'local':
+        from app.services.local_llm import LocalLLMBackend
+
+        return LocalLLMBackend()
+    if name != 'gemini':
+        raise ValueError(f"Unknown LLM_BACKEND {name!r}; expected 'gemini' or 'local'")
+    return GeminiBackend(model_name, max_workers)
+
+
+class LLMClient:
+    """Non-blocking LLM client with bounded concurrency and per-call timeouts"""
+
+    def __init__(self, model_name: Optional[str] = None,
+                 max_concurrency: Optional[int] = None,
+                 timeout: Optional[float] = None,
+                 backend=None):
+        self.model_name = model_name or settings.GEMINI_MODEL
+        self.max_concurrency = max_concurrency or settings.GEMINI_MAX_CONCURRENCY
+        self.timeout = timeout or settings.GEMINI_TIMEOUT_SECONDS
+        self.backend = backend or build_backend(settings.LLM_BACKEND, self.model_name, self.max_concurrency)
+        self.metrics = LLMMetrics()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend.enabled
+
+    async def generate(self, prompt: str, kind: str = 'generic',
+                       timeout: Optional[float] = None) -> str:
+        """Send a prompt and return the response text"""
+        async with self._semaphore:
+            self.metrics.in_flight += 1
+            started = time.perf_counter()
+            outcome = 'ok'
+            usage = None
+            try:
+                response = await asyncio.wait_for(
+                    self.backend.generate(prompt, kind), timeout or self.timeout
+                )
+                usage = getattr(response, 'usage_metadata', None)
+                return response.text
+            except asyncio.TimeoutError:
+                outcome = 'timeout'
+                raise LLMTimeoutError(f"LLM {kind} call exceeded {timeout or self.timeout}s")
+            except Exception:
+                outcome = 'error'
+                raise
+            finally:
+                self.metrics.in_flight -= 1
+                self.metrics.record(
+                    kind,
+                    (time.perf_counter() - started) * 1000,
+                    outcome,
+                    prompt_tokens=getattr(usage, 'prompt_token_count', 0) or 0,
+                    response_tokens=getattr(usage, 'candidates_token_count', 0) or 0,
+                )
+
+    async def stream(self, prompt: str, kind: str = 'generic',
+                     timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Yield the response text as it is generated.
+
+        timeout applies to the wait for each chunk, not the whole response.
+        """
+        timeout = timeout or self.timeout
+        async with self._semaphore:
+            self.metrics.in_flight += 1
+            started = time.perf_counter()
+            first_chunk_ms = None
+            outcome = 'ok'
+            chunks = self.backend.stream(prompt, kind)
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                    except StopAsyncIteration:
+                        break
+                    text = getattr(chunk, 'text', '') or ''
+                    if text:
+                        if first_chunk_ms is None:
+                            first_chunk_ms = (time.perf_counter() - started) * 1000
+                        yield text
+            except asyncio.TimeoutError:
+                outcome = 'timeout'
+                raise LLMTimeoutError(f"LLM {kind} stream stalled for {timeout}s")
+            except Exception:
+                outcome = 'error'
+                raise
+            finally:
+                await chunks.aclose()
+                self.metrics.in_flight -= 1
+                self.metrics.record(
+                    kind, (time.perf_counter() - started) * 1000, outcome,
+                    first_chunk_ms=first_chunk_ms,
+                )
+
+    def stats(self) -> Dict:
+        return {
+            'backend': self.backend.name,
+            'model': self.model_name,
+            'max_concurrency': self.max_concurrency,
+            'timeout_seconds': self.timeout,
+            **self.metrics.snapshot(),
+        }
+
+
+# Singleton instance
+llm_client = LLMClient()
+
+
+def _collect_llm_metrics():
+    kinds = llm_client.metrics.by_kind
+    lines = metric_lines("llm_requests_in_flight", "gauge", "Gemini calls in progress",
+                         [({}, llm_client.metrics.in_flight)])
+    for name, field, documentation in (
+        ("llm_requests_total", "requests", "Gemini calls"),
+        ("llm_errors_total", "errors", "Gemini calls that failed"),
+        ("llm_timeouts_total", "timeouts", "Gemini calls that timed out"),
+        ("llm_prompt_tokens_total", "prompt_tokens", "Prompt tokens sent"),
+        ("llm_response_tokens_total", "response_tokens", "Response tokens received"),
+    ):
+        lines += metric_lines(name, "counter", documentation,
+                              [({"kind": kind}, stats[field]) for kind, stats in kinds.items()])
+    return lines
+
+
+registry.add_collector(_collect_llm_metrics)
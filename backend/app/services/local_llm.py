@@ -0,0 +1,204 @@
+"""
+Local stand-in for the Gemini API, for load tests and offline development.
+
+LocalLLMBackend answers every prompt kind the AI services send with a
+canned response derived from the prompt itself (same prompt, same text),
+after a simulated latency drawn from a lognormal distribution, and fails a
+configurable share of calls. Responses have the shape the real parsers
+expect, so the full request path (cache, metrics, JSON parsing, final
+offer detection) runs exactly as it does against Gemini.
+
+Select it with LLM_BACKEND=local; the LLM_LOCAL_* settings tune it.
+"""
+import asyncio
+import json
+import math
+import random
+import re
+import zlib
+from typing import AsyncIterator, Callable, Dict, Optional
+
+from app.core.config import settings
+
+FINAL_OFFER_MARKER = "FINAL_OFFER:"  # ai_negotiator's; importing it from there would be circular
+
+_COST = re.compile(r'"?monthly_cost"?\s*:\s*([\d.]+)|Custo Mensal: R\$ ([\d.]+)')
+_PLAN = re.compile(r'Plano: (.+)|"plan_name"\s*:\s*"([^"]*)"')
+_SAVINGS = re.compile(r"discount of R\$ ([\d.]+)")
+_AMOUNT = re.compile(r"R\$\s*(\d+[.,]\d{2})")
+_SERVICES = ('Netflix', 'Spotify', 'Amazon Prime', 'YouTube Premium', 'Disney+', 'Microsoft 365',
+             'Adobe', 'Gympass', 'iFood', 'Uber One', 'ChatGPT', 'Google One')
+PROVIDER_REPLIES = (
+    "Thank you for being a loyal customer. Let me see what I can do for you.",
+    "I understand. We can offer a partial discount on your current plan.",
+    "We value your loyalty, so I can apply a retention discount to your account.",
+)
+
+
+class LocalLLMError(RuntimeError):
+    """Simulated provider failure"""
+
+
+class LocalUsage:
+    __slots__ = ('prompt_token_count', 'candidates_token_count')
+
+    def __init__(self, prompt: str, text: str):
+        # Roughly four characters per token, like Gemini's English text
+        self.prompt_token_count = len(prompt) // 4
+        self.candidates_token_count = len(text) // 4
+
+
+class LocalResponse:
+    """Quacks like a google.generativeai response (or stream chunk)"""
+    __slots__ = ('text', 'usage_metadata')
+
+    def __init__(self, text: str, usage_metadata: Optional[LocalUsage] = None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+def _pick(prompt: str, options):
+    return options[zlib.crc32(prompt.encode()) % len(options)]
+
+
+def _costs(prompt: str):
+    return [float(a or b) for a, b in _COST.findall(prompt)]
+
+
+def _analysis(cost: float, plan: str) -> Dict:
+    """Same thresholds as AIAnalyzer's offline analysis"""
+    if cost > 100:
+        return {"recommendation_type": "downgrade", "confidence": 0.85,
+                "monthly_savings": round(cost * 0.3, 2),
+                "reasoning": f"The {plan} plan looks expensive for typical usage.",
+                "suggested_plan": "Basic", "action_steps": ["Compare plans", "Downgrade"]}
+    if cost > 50:
+        return {"recommendation_type": "negotiate", "confidence": 0.75,
+                "monthly_savings": round(cost * 0.15, 2),
+                "reasoning": "Long-standing customers usually get a loyalty discount.",
+                "suggested_plan": None, "action_steps": ["Contact support", "Ask for a discount"]}
+    return {"recommendation_type": "keep", "confidence": 0.9, "monthly_savings": 0,
+            "reasoning": "The price is fair for the service.", "suggested_plan": None,
+            "action_steps": ["Keep monitoring usage"]}
+
+
+def _optimization(cost: float, plan: str) -> Dict:
+    analysis = _analysis(cost, plan)
+    savings = analysis["monthly_savings"]
+    return {
+        "current_plan_fit_score": round(1 - savings / cost, 2) if cost else 1.0,
+        "optimal_plan": analysis["suggested_plan"] or plan,
+        "monthly_savings": savings,
+        "yearly_savings": round(savings * 12, 2),
+        "reasoning": analysis["reasoning"],
+        "confidence": analysis["confidence"],
+        "suggested_actions": [] if analysis["recommendation_type"] == "keep" else [analysis["recommendation_type"]],
+    }
+
+
+def _plan(prompt: str) -> str:
+    match = _PLAN.search(prompt)
+    return (match.group(1) or match.group(2)).strip() if match else "current"
+
+
+def subscription_analysis(prompt: str) -> str:
+    costs = _costs(prompt)
+    return json.dumps(_analysis(costs[0] if costs else 0.0, _plan(prompt)))
+
+
+def optimization_analysis(prompt: str) -> str:
+    costs = _costs(prompt)
+    return json.dumps(_optimization(costs[0] if costs else 0.0, _plan(prompt)))
+
+
+def batch_optimization_analysis(prompt: str) -> str:
+    return json.dumps([
+        {"index": index, **_optimization(cost, "current")}
+        for index, cost in enumerate(_costs(prompt))
+    ])
+
+
+def email_analysis(prompt: str) -> str:
+    service = next((name for name in _SERVICES if name.lower() in prompt.lower()), None)
+    amount = _AMOUNT.search(prompt)
+    if not service or not amount:
+        return "null"
+    return json.dumps({
+        "service_name": service, "plan_name": "Standard",
+        "amount": float(amount.group(1).replace(",", ".")), "currency": "BRL",
+        "billing_date": None, "next_billing_date": None, "is_trial": False,
+    })
+
+
+def negotiation_response(prompt: str) -> str:
+    reply = _pick(prompt, PROVIDER_REPLIES)
+    # The prompt carries the last three messages; a full window means the
+    # conversation is on its third turn, when the provider makes an offer
+    if prompt.count('"role"') >= 3:
+        savings = _SAVINGS.search(prompt)
+        discount = float(savings.group(1)) * 0.8 if savings else 5.0
+        reply += f" {FINAL_OFFER_MARKER}{discount:.2f}:12 month commitment"
+    return reply
+
+
+def negotiation_script(prompt: str) -> str:
+    return ("Hello, I have been a customer for a long time and would like to review my plan. "
+            "Is there a loyalty discount or a cheaper plan that fits my usage?")
+
+
+RESPONDERS: Dict[str, Callable[[str], str]] = {
+    'subscription_analysis': subscription_analysis,
+    'optimization_analysis': optimization_analysis,
+    'batch_optimization_analysis': batch_optimization_analysis,
+    'email_analysis': email_analysis,
+    'negotiation_response': negotiation_response,
+    'negotiation_script': negotiation_script,
+}
+
+
+class LocalLLMBackend:
+    """Deterministic responses with simulated latency and failures"""
+
+    name = 'local'
+    enabled = True
+
+    def __init__(self, latency_ms: Optional[float] = None, latency_sigma: Optional[float] = None,
+                 error_rate: Optional[float] = None, seed: Optional[int] = None,
+                 chunk_chars: int = 12):
+        self.latency_ms = settings.LLM_LOCAL_LATENCY_MS if latency_ms is None else latency_ms
+        self.latency_sigma = settings.LLM_LOCAL_LATENCY_SIGMA if latency_sigma is None else latency_sigma
+        self.error_rate = settings.LLM_LOCAL_ERROR_RATE if error_rate is None else error_rate
+        self.chunk_chars = chunk_chars
+        self._rng = random.Random(settings.LLM_LOCAL_SEED if seed is None else seed)
+
+    def respond(self, prompt: str, kind: str) -> str:
+        responder = RESPONDERS.get(kind)
+        return responder(prompt) if responder else "OK"
+
+    def _latency(self) -> float:
+        """Seconds; lognormal around the configured median"""
+        if self.latency_ms <= 0:
+            return 0.0
+        return self._rng.lognormvariate(math.log(self.latency_ms / 1000), self.latency_sigma)
+
+    def _maybe_fail(self, kind: str):
+        if self.error_rate and self._rng.random() < self.error_rate:
+            raise LocalLLMError(f"Simulated {kind} failure")
+
+    async def generate(self, prompt: str, kind: str) -> LocalResponse:
+        await asyncio.sleep(self._latency())
+        self._maybe_fail(kind)
+        text = self.respond(prompt, kind)
+        return LocalResponse(text, LocalUsage(prompt, text))
+
+    async def stream(self, prompt: str, kind: str) -> AsyncIterator[LocalResponse]:
+        # A third of the latency before the first chunk, the rest spread over the others
+        latency = self._latency()
+        await asyncio.sleep(latency / 3)
+        self._maybe_fail(kind)
+        text = self.respond(prompt, kind)
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)]
+        for index, chunk in enumerate(chunks):
+            if index:
+                await asyncio.sleep(latency * 2 / 3 / (len(chunks) - 1))
+            yield LocalResponse(chunk)
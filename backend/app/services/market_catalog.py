@@ -0,0 +1,201 @@
+"""
+Market prices for subscription plans.
+
+The catalog is loaded from a versioned JSON or CSV file (MARKET_CATALOG_PATH),
+falling back to a small built-in table. Services are indexed by normalized
+name and their plans by price, so "next cheaper plan" is a bisect. The file is
+re-checked periodically and swapped in when it changes, so every worker picks
+up a new catalog without a restart. Inside an event loop the re-check runs in
+the default executor while requests keep getting the previous catalog.
+
+JSON: {"version": "...", "services": {"netflix": {"category": "streaming",
+       "plans": [{"name": "Basic", "price": 23.9, "features": [...]}]}}}
+CSV:  service,category,plan,price,features   (features separated by ';')
+"""
+import asyncio
+import csv
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.services.merchant_matcher import MerchantMatcher, normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Used when no catalog file is configured (or the first load fails)
+BUILTIN_MARKET_DATA = {
+    'netflix': {
+        'plans': [
+            {'name': 'Basic', 'price': 23.90, 'features': ['1 screen', 'HD']},
+            {'name': 'Standard', 'price': 38.90, 'features': ['2 screens', 'Full HD']},
+            {'name': 'Premium', 'price': 45.90, 'features': ['4 screens', 'Ultra HD']}
+        ]
+    },
+    'spotify': {
+        'plans': [
+            {'name': 'Individual', 'price': 21.90, 'features': ['1 account']},
+            {'name': 'Duo', 'price': 27.90, 'features': ['2 accounts']},
+            {'name': 'Family', 'price': 34.90, 'features': ['6 accounts']},
+            {'name': 'Student', 'price': 10.95, 'features': ['1 account']}
+        ]
+    }
+}
+
+
+class ServicePlans:
+    """One service's plans, indexed by price and by name"""
+
+    __slots__ = ('name', 'data', 'by_price', 'prices', 'by_name')
+
+    def __init__(self, name: str, data: Dict):
+        self.name = name
+        self.data = data
+        # Stable sort keeps declaration order among plans with the same price
+        self.by_price: List[Dict] = sorted(data.get('plans', []), key=lambda plan: plan['price'])
+        self.prices: List[float] = [plan['price'] for plan in self.by_price]
+        self.by_name: Dict[str, Dict] = {}
+        for plan in data.get('plans', []):
+            self.by_name.setdefault(plan['name'].lower(), plan)
+
+    def cheaper_plan(self, price: float) -> Optional[Dict]:
+        """The most expensive plan that costs less than price"""
+        index = bisect_left(self.prices, price)
+        if index == 0:
+            return None
+        # First plan (in declaration order) at that price
+        return self.by_price[bisect_left(self.prices, self.prices[index - 1])]
+
+    def plan(self, name: str) -> Optional[Dict]:
+        return self.by_name.get(name.lower())
+
+
+class MarketCatalog:
+    """Immutable, indexed snapshot of market prices"""
+
+    def __init__(self, services: Dict[str, Dict], version: str = 'builtin'):
+        self.version = version
+        self._services: Dict[str, ServicePlans] = {}
+        for name, data in services.items():
+            self._services.setdefault(normalize_text(name), ServicePlans(name, data))
+
+        # Recognizes a catalog service mentioned anywhere in a name, e.g.
+        # "Netflix Brasil"; earlier services win, as in the file
+        self._matcher = MerchantMatcher()
+        self._matcher.add_aliases({key: [key] for key in self._services})
+
+    def __len__(self) -> int:
+        return len(self._services)
+
+    def service(self, service_name: str) -> Optional[ServicePlans]:
+        """Plans for a service, by exact normalized name or by mention"""
+        key = normalize_text(service_name)
+        entry = self._services.get(key)
+        if entry is None:
+            match = self._matcher.match(key)
+            entry = self._services[match] if match else None
+        return entry
+
+    def market_data(self, service_name: str) -> Dict:
+        entry = self.service(service_name)
+        return entry.data if entry else {'plans': []}
+
+    def cheaper_plan(self, service_name: str, price: float) -> Optional[Dict]:
+        entry = self.service(service_name)
+        return entry.cheaper_plan(price) if entry else None
+
+    def plan_price(self, service_name: str, plan_name: str) -> Optional[float]:
+        entry = self.service(service_name)
+        plan = entry.plan(plan_name) if entry else None
+        return plan['price'] if plan else None
+
+    @classmethod
+    def from_file(cls, path: str) -> 'MarketCatalog':
+        if path.lower().endswith('.json'):
+            with open(path, encoding='utf-8') as f:
+                payload = json.load(f)
+            services = payload.get('services', payload)
+            version = str(payload.get('version') or os.path.getmtime(path))
+            return cls(services, version)
+
+        services: Dict[str, Dict] = {}
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                service = services.setdefault(row['service'].strip(), {'plans': []})
+                if row.get('category'):
+                    service['category'] = row['category'].strip()
+                service['plans'].append({
+                    'name': row['plan'].strip(),
+                    'price': float(row['price']),
+                    'features': [
+                        feature.strip()
+                        for feature in (row.get('features') or '').split(';') if feature.strip()
+                    ],
+                })
+        return cls(services, str(os.path.getmtime(path)))
+
+
+class MarketCatalogProvider:
+    """Serves the current catalog, reloading the file when it changes"""
+
+    def __init__(self, path: Optional[str] = None, reload_seconds: Optional[float] = None):
+        self.path = settings.MARKET_CATALOG_PATH if path is None else path
+        self.reload_seconds = (
+            settings.MARKET_CATALOG_RELOAD_SECONDS if reload_seconds is None else reload_seconds
+        )
+        self._catalog = MarketCatalog(BUILTIN_MARKET_DATA)
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._reloading: Optional[asyncio.Future] = None
+        self._lock = threading.Lock()
+        self.reload()  # before serving, so requests never see the built-in table by mistake
+
+    def current(self) -> MarketCatalog:
+        if self.path and time.monotonic() - self._checked_at >= self.reload_seconds:
+            self._schedule_reload()
+        return self._catalog
+
+    def _schedule_reload(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Sweep workers and scripts: nothing else to serve meanwhile
+            self.reload()
+            return
+        if self._reloading is None:
+            self._checked_at = time.monotonic()
+            self._reloading = loop.run_in_executor(None, self.reload)
+            self._reloading.add_done_callback(self._reload_done)
+
+    def _reload_done(self, future: asyncio.Future):
+        self._reloading = None
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Market catalog reload failed: {future.exception()}")
+
+    def reload(self, force: bool = False) -> bool:
+        """Load the file if it changed; the previous catalog stays on errors"""
+        if not self.path:
+            return False
+
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                mtime = os.path.getmtime(self.path)
+                if not force and mtime == self._mtime:
+                    return False
+                catalog = MarketCatalog.from_file(self.path)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.error(f"Could not load market catalog {self.path}: {e}")
+                return False
+
+            self._catalog, self._mtime = catalog, mtime
+            logger.info(f"Loaded market catalog {catalog.version} ({len(catalog)} services)")
+            return True
+
+
+# Singleton instance
+market_catalog = MarketCatalogProvider()
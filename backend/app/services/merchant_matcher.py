@@ -0,0 +1,199 @@
+"""
+Merchant recognition shared by BankAnalyzer and EmailParser.
+
+Every service pattern and alias is compiled into one Aho-Corasick automaton,
+so a description is scanned once no matter how many services are known.
+Results are cached per normalized description; longer texts such as email
+bodies are almost never repeated, so they are scanned without caching.
+"""
+import csv
+import json
+import logging
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# An unescaped regex metacharacter, or an escape such as \d or \w
+_REGEX_SYNTAX = re.compile(r'(?<!\\)[.^$*+?{}\[\]|()]|\\[A-Za-z0-9]')
+_NO_MATCH = float('inf')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _as_literal(pattern: str) -> Optional[str]:
+    """Return the literal text of a pattern, or None if it is a real regex"""
+    if _REGEX_SYNTAX.search(pattern):
+        return None
+    return re.sub(r'\\(.)', r'\1', pattern).lower()
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace"""
+    return ' '.join((text or '').lower().split())
+
+
+class MerchantMatcher:
+    """Recognize subscription services in free text.
+
+    When several services match, the one registered first wins, as with the
+    ordered pattern dicts this replaces.
+    """
+
+    def __init__(self, patterns: Optional[Dict[str, Iterable[str]]] = None,
+                 cache_size: int = 8192, cache_max_length: int = 256):
+        self._services: List[str] = []
+        self._priority: Dict[str, int] = {}
+        self._literals: List[Tuple[str, int]] = []
+        self._regexes: List[Tuple[int, re.Pattern]] = []
+        self._cache_size = cache_size
+        self._cache_max_length = cache_max_length  # longer texts skip the cache
+        self._build_pending = True
+
+        if patterns:
+            self.add_patterns(patterns)
+
+    def add_patterns(self, patterns: Dict[str, Iterable[str]]):
+        """Register regex patterns (or plain aliases) per service"""
+        for service, service_patterns in patterns.items():
+            priority = self._service_priority(service)
+            for pattern in service_patterns:
+                literal = _as_literal(pattern)
+                if literal:
+                    self._literals.append((literal, priority))
+                else:
+                    self._regexes.append((priority, re.compile(pattern, re.IGNORECASE)))
+        self._build_pending = True
+
+    def add_aliases(self, aliases: Dict[str, Iterable[str]]):
+        """Register literal merchant aliases per service"""
+        self.add_patterns({
+            service: [re.escape(alias) for alias in service_aliases]
+            for service, service_aliases in aliases.items()
+        })
+
+    def load_aliases(self, path: str) -> int:
+        """Load aliases from a JSON ({service: [alias, ...]}) or CSV (alias,service) file"""
+        aliases: Dict[str, List[str]] = {}
+
+        if path.lower().endswith('.json'):
+            with open(path, encoding='utf-8') as f:
+                for service, service_aliases in json.load(f).items():
+                    aliases.setdefault(service, []).extend(service_aliases)
+        else:
+            with open(path, newline='', encoding='utf-8') as f:
+                for row in csv.reader(f):
+                    if len(row) < 2 or row[0].strip().lower() == 'alias':
+                        continue
+                    aliases.setdefault(row[1].strip(), []).append(row[0].strip())
+
+        self.add_aliases(aliases)
+        count = sum(len(values) for values in aliases.values())
+        logger.info(f"Loaded {count} merchant aliases from {path}")
+        return count
+
+    def match(self, text: str) -> Optional[str]:
+        """Return the service mentioned in text, if any"""
+        if self._build_pending:
+            self._build()
+        text = normalize_text(text)
+        if len(text) > self._cache_max_length:
+            return self._scan(text)
+        return self._match_normalized(text)
+
+    def match_many(self, texts: List[str]) -> List[Optional[str]]:
+        """match() for every text in a batch.
+
+        One regex pass over the batch, alternating every literal, picks the
+        texts that can match at all, so only those are scanned; most bank
+        descriptions mention no service.
+        """
+        if self._build_pending:
+            self._build()
+        joined = '\0'.join(texts)
+        if self._regexes or not self._literals or joined.count('\0') != len(texts) - 1:
+            return list(map(self.match, texts))
+
+        # Each segment holds its text normalized, maybe with an extra space
+        # at either end, which can only let through a few more candidates
+        segments = _WHITESPACE.sub(' ', joined.lower()).split('\0')
+        candidates = map(self._literal_filter.search, segments)
+        return [self.match(text) if candidate else None for text, candidate in zip(texts, candidates)]
+
+    def _service_priority(self, service: str) -> int:
+        if service not in self._priority:
+            self._priority[service] = len(self._services)
+            self._services.append(service)
+        return self._priority[service]
+
+    def _build(self):
+        """Compile literals into the automaton and reset the result cache"""
+        goto: List[Dict[str, int]] = [{}]
+        best: List[float] = [_NO_MATCH]
+
+        for literal, priority in self._literals:
+            state = 0
+            for ch in literal:
+                next_state = goto[state].get(ch)
+                if next_state is None:
+                    next_state = goto[state][ch] = len(goto)
+                    goto.append({})
+                    best.append(_NO_MATCH)
+                state = next_state
+            best[state] = min(best[state], priority)
+
+        # Breadth-first failure links; each state inherits the best output
+        # reachable through its failure chain
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for ch, next_state in goto[state].items():
+                fallback = fail[state]
+                while fallback and ch not in goto[fallback]:
+                    fallback = fail[fallback]
+                candidate = goto[fallback].get(ch, 0)
+                fail[next_state] = candidate if candidate != next_state else 0
+                best[next_state] = min(best[next_state], best[fail[next_state]])
+                queue.append(next_state)
+
+        self._goto, self._fail, self._best = goto, fail, best
+        self._literal_filter = re.compile('|'.join(re.escape(literal) for literal, _ in self._literals))
+        self._regexes.sort(key=lambda item: item[0])
+        self._match_normalized = lru_cache(maxsize=self._cache_size)(self._scan)
+        self._build_pending = False
+
+    def _scan(self, text: str) -> Optional[str]:
+        goto, fail, best_at = self._goto, self._fail, self._best
+        state = 0
+        best = _NO_MATCH
+
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if best_at[state] < best:
+                best = best_at[state]
+                if best == 0:
+                    break
+
+        for priority, pattern in self._regexes:
+            if priority >= best:
+                break
+            if pattern.search(text):
+                best = priority
+                break
+
+        return self._services[int(best)] if best != _NO_MATCH else None
+
+    @classmethod
+    def from_settings(cls, patterns: Dict[str, Iterable[str]]) -> 'MerchantMatcher':
+        """Build a matcher and load the configured alias file, if any"""
+        matcher = cls(patterns, cache_size=settings.MERCHANT_MATCH_CACHE_SIZE)
+        if settings.MERCHANT_ALIASES_PATH:
+            try:
+                matcher.load_aliases(settings.MERCHANT_ALIASES_PATH)
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not load merchant aliases: {e}")
+        return matcher
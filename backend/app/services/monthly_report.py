@@ -0,0 +1,234 @@
+"""
+Monthly report.
+
+A report takes two queries: the user's active subscriptions, and one row
+of negotiation totals joined to the month's activities ranked by window
+functions (counts by type and the latest ten), so the cost does not grow
+with the number of activities or negotiations. Built reports are stored per
+(user, year, month) in ReportArtifactDB; ORM writes to subscriptions,
+negotiations and activities drop the owner's reports in the same flush
+(see app.core.database), Core writes call invalidate_reports, and
+REPORT_CACHE_TTL_SECONDS bounds staleness.
+"""
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import and_, case, delete, func, insert, or_, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import (
+    NegotiationDB,
+    ReportArtifactDB,
+    SubscriptionDB,
+    generate_uuid,
+)
+from app.models.activity import Activity as ActivityDB
+
+logger = logging.getLogger(__name__)
+
+
+def month_bounds(year: int, month: int):
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+
+def previous_month(year: int, month: int):
+    return (year, month - 1) if month > 1 else (year - 1, 12)
+
+
+async def build_monthly_report(db: AsyncSession, user_id: str, year: int, month: int) -> Dict:
+    """Compute the report for one month in two queries"""
+    month_start, month_end = month_bounds(year, month)
+    prev_year, prev_month = previous_month(year, month)
+
+    # 1. Active subscriptions. A user has a few dozen at most, so spend per
+    # category and last month's spend are summed from the same rows
+    subscriptions = (await db.execute(
+        select(
+            SubscriptionDB.id,
+            SubscriptionDB.service_name,
+            SubscriptionDB.plan_name,
+            SubscriptionDB.monthly_cost,
+            SubscriptionDB.service_category,
+            SubscriptionDB.status,
+            SubscriptionDB.created_at,
+        ).where(SubscriptionDB.user_id == user_id, SubscriptionDB.status == 'active')
+    )).all()
+
+    spending_by_category = {}
+    for sub in subscriptions:
+        spending_by_category[sub.service_category] = (
+            spending_by_category.get(sub.service_category, 0) + sub.monthly_cost
+        )
+    total_monthly_spend = sum(sub.monthly_cost for sub in subscriptions)
+    prev_total_spend = sum(sub.monthly_cost for sub in subscriptions
+                           if sub.created_at is not None and sub.created_at < month_start)
+    active_subs_list = [
+        {
+            "id": str(sub.id),
+            "service_name": sub.service_name,
+            "plan_name": sub.plan_name,
+            "monthly_cost": sub.monthly_cost,
+            "category": sub.service_category,
+            "status": sub.status,
+        }
+        for sub in subscriptions
+    ]
+
+    # 2. The month's negotiation totals (one row), joined to its activity
+    # counts by type and latest ten activities
+    negotiations = _negotiation_totals(user_id, month_start, month_end).subquery()
+    activities = _ranked_activities(user_id, month_start, month_end).subquery()
+    rows = (await db.execute(
+        select(negotiations, activities)
+        .select_from(negotiations.outerjoin(activities, true()))
+        .order_by(activities.c.rank)
+    )).all()
+
+    activities_summary = {row.activity_type: row.type_count for row in rows if row.type_rank == 1}
+    recent_activities = [
+        {
+            "id": str(act.id),
+            "type": act.activity_type,
+            "title": act.title,
+            "description": act.description,
+            "created_at": act.created_at.isoformat(),
+        }
+        for act in rows if act.rank is not None and act.rank <= 10
+    ]
+    negotiations_summary = await _negotiations_summary(db, rows[0], user_id, month_start, month_end)
+
+    return {
+        "total_monthly_spend": round(total_monthly_spend, 2),
+        "active_subscriptions": len(subscriptions),
+        "total_savings": round(negotiations_summary["total_savings"], 2),
+        "negotiations_completed": negotiations_summary["completed"],
+        "month": month_start.strftime("%B"),
+        "year": year,
+        "spending_by_category": spending_by_category,
+        "active_subscriptions_list": active_subs_list,
+        "activities_summary": activities_summary,
+        "recent_activities": recent_activities,
+        "negotiations_summary": negotiations_summary,
+        # 3. Comparison with the previous month
+        "previous_month_comparison": {
+            "previous_month": prev_month,
+            "previous_year": prev_year,
+            "previous_spend": prev_total_spend,
+            "spend_change": total_monthly_spend - prev_total_spend,
+            "spend_change_percent": (
+                (total_monthly_spend - prev_total_spend) / prev_total_spend * 100
+                if prev_total_spend > 0 else 0
+            ),
+        },
+    }
+
+
+def _ranked_activities(user_id: str, month_start: datetime, month_end: datetime):
+    """The month's activities that are among the latest ten or first of their type"""
+    ranked = select(
+        ActivityDB.id,
+        ActivityDB.activity_type,
+        ActivityDB.title,
+        ActivityDB.description,
+        ActivityDB.created_at,
+        func.count().over(partition_by=ActivityDB.activity_type).label('type_count'),
+        func.row_number().over(partition_by=ActivityDB.activity_type).label('type_rank'),
+        func.row_number().over(order_by=ActivityDB.created_at.desc()).label('rank'),
+    ).where(
+        ActivityDB.user_id == user_id,
+        ActivityDB.created_at >= month_start,
+        ActivityDB.created_at < month_end,
+    ).subquery()
+    return select(ranked).where(or_(ranked.c.rank <= 10, ranked.c.type_rank == 1))
+
+
+_ACCEPTED = and_(NegotiationDB.offer_accepted.is_(True), NegotiationDB.final_offer.isnot(None))
+_SAVINGS = NegotiationDB.final_offer['savings'].as_float()
+
+
+def _negotiation_totals(user_id: str, month_start: datetime, month_end: datetime):
+    return select(
+        func.count().label('negotiations_total'),
+        func.coalesce(func.sum(case((_ACCEPTED, 1), else_=0)), 0).label('negotiations_completed'),
+        func.coalesce(func.sum(case((NegotiationDB.status == 'in_progress', 1), else_=0)), 0)
+        .label('negotiations_in_progress'),
+        func.coalesce(func.sum(case((_ACCEPTED, _SAVINGS), else_=0)), 0).label('negotiations_savings'),
+        func.coalesce(func.sum(case((and_(_ACCEPTED, _SAVINGS.is_(None)), 1), else_=0)), 0)
+        .label('negotiations_unparsed'),
+    ).where(
+        NegotiationDB.user_id == user_id,
+        NegotiationDB.created_at >= month_start,
+        NegotiationDB.created_at < month_end,
+    )
+
+
+async def _negotiations_summary(db: AsyncSession, totals, user_id: str,
+                                month_start: datetime, month_end: datetime) -> Dict:
+    completed = int(totals.negotiations_completed)
+    total_savings = float(totals.negotiations_savings or 0)
+    if totals.negotiations_unparsed:
+        # Older rows hold the offer as a JSON-encoded string
+        legacy = await db.execute(
+            select(NegotiationDB.final_offer).where(
+                NegotiationDB.user_id == user_id,
+                NegotiationDB.created_at >= month_start,
+                NegotiationDB.created_at < month_end,
+                _ACCEPTED,
+                _SAVINGS.is_(None),
+            )
+        )
+        for final_offer in legacy.scalars():
+            try:
+                offer = json.loads(final_offer) if isinstance(final_offer, str) else final_offer
+                if not offer:
+                    raise ValueError("empty offer")
+                total_savings += float(offer.get('savings', 0))
+            except (TypeError, ValueError, AttributeError):
+                completed -= 1
+
+    return {
+        "total": int(totals.negotiations_total),
+        "completed": completed,
+        "in_progress": int(totals.negotiations_in_progress),
+        "total_savings": total_savings,
+    }
+
+
+async def get_cached_report(db: AsyncSession, user_id: str, year: int, month: int) -> Optional[Dict]:
+    fresh_after = datetime.utcnow() - timedelta(seconds=settings.REPORT_CACHE_TTL_SECONDS)
+    result = await db.execute(
+        select(ReportArtifactDB.payload).where(
+            ReportArtifactDB.user_id == user_id,
+            ReportArtifactDB.year == year,
+            ReportArtifactDB.month == month,
+            ReportArtifactDB.created_at >= fresh_after,
+        )
+    )
+    return result.scalar_one_or_none()
+
+
+async def store_report(db: AsyncSession, user_id: str, year: int, month: int, payload: Dict):
+    """Replace the cached report; committed with the caller's transaction"""
+    await db.execute(
+        delete(ReportArtifactDB).where(
+            ReportArtifactDB.user_id == user_id,
+            ReportArtifactDB.year == year,
+            ReportArtifactDB.month == month,
+        )
+    )
+    await db.execute(insert(ReportArtifactDB).values(
+        id=generate_uuid(), user_id=user_id, year=year, month=month,
+        payload=payload, created_at=datetime.utcnow(),
+    ))
+
+
+async def invalidate_reports(db: AsyncSession, user_ids: Iterable[str]):
+    """Drop cached reports after writes that bypass the ORM listeners"""
+    user_ids = set(user_ids)
+    if user_ids:
+        await db.execute(delete(ReportArtifactDB).where(ReportArtifactDB.user_id.in_(user_ids)))
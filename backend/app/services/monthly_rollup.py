@@ -0,0 +1,270 @@
+"""
+Monthly spend/savings history.
+
+Every user's spend, savings and subscription count per calendar month are
+rolled up into MonthlySnapshotDB, so trends are an indexed range scan over
+at most N rows. A month is computed with one grouped query per source
+table and reconciled with its stored snapshots in a single transaction:
+
+- spend/subscriptions: subscriptions started before the month ended that
+  were still active during it (cancelled ones count until their last
+  update, which is when they were cancelled)
+- savings: monthly savings of optimizations executed before the month ended
+
+A month is frozen once it has closed. The scheduled job recomputes only
+the current month and writes only the users whose values changed; on the
+first run after a month ends it gives that month one closing pass (from
+rows at most one run interval stale) and never touches it again.
+
+Until a user has snapshots, their trends are computed live by the same
+queries. --backfill fills months that have no snapshots at all, for
+installs that predate the rollup. Those months, like the live ones, are an
+approximation: the source tables only hold today's prices and statuses, so
+every past month is computed from them (a subscription counts at its
+current price, and a cancelled one until its last update).
+
+    python -m app.services.monthly_rollup [--backfill]
+"""
+import argparse
+import asyncio
+import json
+import logging
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, bindparam, func, insert, literal, or_, select, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import (
+    AsyncSessionLocal,
+    MonthlySnapshotDB,
+    OptimizationDB,
+    SubscriptionDB,
+    generate_uuid,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _midnight(value: date) -> datetime:
+    return datetime(value.year, value.month, value.day)
+
+
+def _months(months: List[date]):
+    """CTE of (position, begins, ends), one row per month"""
+    rows = [
+        select(literal(index).label('position'),
+               literal(_midnight(month)).label('begins'),
+               literal(_midnight(add_months(month, 1))).label('ends'))
+        for index, month in enumerate(months)
+    ]
+    return (union_all(*rows) if len(rows) > 1 else rows[0]).cte('months')
+
+
+async def compute_months(db: AsyncSession, months: List[date],
+                         user_id: Optional[str] = None) -> Dict[date, Dict[str, Dict]]:
+    """Snapshot values per month, by user id (only user_id's when given), in two queries"""
+    periods = _months(months)
+    started = func.coalesce(SubscriptionDB.start_date, SubscriptionDB.created_at)
+    subscriptions = (
+        select(periods.c.position, SubscriptionDB.user_id, func.sum(SubscriptionDB.monthly_cost), func.count())
+        .join_from(periods, SubscriptionDB, and_(
+            started < periods.c.ends,
+            or_(SubscriptionDB.status == 'active', SubscriptionDB.updated_at >= periods.c.begins),
+        ))
+        .group_by(periods.c.position, SubscriptionDB.user_id)
+    )
+    optimizations = (
+        select(
+            periods.c.position,
+            OptimizationDB.user_id,
+            func.sum(func.coalesce(OptimizationDB.actual_savings, OptimizationDB.monthly_savings, 0)),
+        )
+        .join_from(periods, OptimizationDB, and_(
+            OptimizationDB.executed.is_(True), OptimizationDB.execution_date < periods.c.ends,
+        ))
+        .group_by(periods.c.position, OptimizationDB.user_id)
+    )
+    if user_id is not None:
+        subscriptions = subscriptions.where(SubscriptionDB.user_id == user_id)
+        optimizations = optimizations.where(OptimizationDB.user_id == user_id)
+
+    snapshots: Dict[date, Dict[str, Dict]] = {month: {} for month in months}
+
+    def entry(position, user_id):
+        return snapshots[months[position]].setdefault(
+            user_id, {'spend': 0.0, 'savings': 0.0, 'subscriptions': 0}
+        )
+
+    for position, user_id, spend, count in (await db.execute(subscriptions)).all():
+        entry(position, user_id).update(spend=round(float(spend or 0), 2), subscriptions=int(count))
+    for position, user_id, savings in (await db.execute(optimizations)).all():
+        entry(position, user_id)['savings'] = round(float(savings or 0), 2)
+    return snapshots
+
+
+async def compute_month(db: AsyncSession, month: date) -> Dict[str, Dict]:
+    """Snapshot values of every user for one month, by user id"""
+    return (await compute_months(db, [month]))[month]
+
+
+async def rollup_month(db: AsyncSession, month: date, commit: bool = True) -> Dict[str, int]:
+    """Bring one month's snapshots in line with the source tables.
+
+    Only users whose values changed are written: new users are inserted,
+    changed ones updated (users left with nothing drop to zero).
+    """
+    month = month_start(month)
+    snapshots = await compute_month(db, month)
+    stored = {
+        user_id: (snapshot_id, {'spend': spend, 'savings': savings, 'subscriptions': subscriptions})
+        for snapshot_id, user_id, spend, savings, subscriptions in (await db.execute(
+            select(MonthlySnapshotDB.id, MonthlySnapshotDB.user_id, MonthlySnapshotDB.spend,
+                   MonthlySnapshotDB.savings, MonthlySnapshotDB.subscriptions)
+            .where(MonthlySnapshotDB.month == month)
+        )).all()
+    }
+
+    now = datetime.utcnow()
+    zero = {'spend': 0.0, 'savings': 0.0, 'subscriptions': 0}
+    inserts = [
+        {'id': generate_uuid(), 'user_id': user_id, 'month': month, 'updated_at': now, **values}
+        for user_id, values in snapshots.items() if user_id not in stored
+    ]
+    updates = []
+    for user_id, (snapshot_id, values) in stored.items():
+        actual = snapshots.get(user_id, zero)
+        if any(abs((values[name] or 0) - actual[name]) > 0.005 for name in zero):
+            updates.append({'snapshot_id': snapshot_id, 'updated_at': now, **actual})
+
+    if inserts:
+        await db.execute(insert(MonthlySnapshotDB), inserts)
+    if updates:
+        snapshots_table = MonthlySnapshotDB.__table__
+        await db.execute(
+            update(snapshots_table)
+            .where(snapshots_table.c.id == bindparam('snapshot_id'))
+            .values({name: bindparam(name) for name in ('spend', 'savings', 'subscriptions', 'updated_at')}),
+            updates,
+        )
+    if commit:
+        await db.commit()
+    return {'inserted': len(inserts), 'updated': len(updates)}
+
+
+async def close_month(db: AsyncSession, month: date) -> Optional[Dict[str, int]]:
+    """Final pass over a month that has ended, unless it already had one.
+
+    A month counts as closed once a snapshot was written after it ended;
+    the pass stamps all of the month's rows so that holds even when no
+    value changed. Months without any snapshot are left to --backfill.
+    """
+    month = month_start(month)
+    ends = _midnight(add_months(month, 1))
+    last_written = (await db.execute(
+        select(func.max(MonthlySnapshotDB.updated_at)).where(MonthlySnapshotDB.month == month)
+    )).scalar()
+    if isinstance(last_written, str):  # SQLite aggregates over DateTime come back raw
+        last_written = datetime.fromisoformat(last_written)
+    if last_written is None or last_written >= ends:
+        return None
+
+    result = await rollup_month(db, month, commit=False)
+    await db.execute(
+        update(MonthlySnapshotDB).where(MonthlySnapshotDB.month == month).values(updated_at=datetime.utcnow())
+    )
+    await db.commit()
+    return result
+
+
+async def backfill_months(db: AsyncSession) -> List[date]:
+    """Every month from the oldest subscription or execution to the current one"""
+    first_subscription = (await db.execute(
+        select(func.min(func.coalesce(SubscriptionDB.start_date, SubscriptionDB.created_at)))
+    )).scalar()
+    first_execution = (await db.execute(
+        select(func.min(OptimizationDB.execution_date)).where(OptimizationDB.executed.is_(True))
+    )).scalar()
+
+    current = month_start(datetime.utcnow().date())
+    # SQLite returns the raw string for aggregates over DateTime columns
+    starts = [
+        datetime.fromisoformat(value) if isinstance(value, str) else value
+        for value in (first_subscription, first_execution) if value is not None
+    ]
+    month = month_start(min(starts)) if starts else current
+
+    months = []
+    while month <= current:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+async def run_rollup(backfill: bool = False, session_factory=AsyncSessionLocal) -> Dict:
+    """Close last month if needed and refresh the current one (plus empty months with backfill)"""
+    current = month_start(datetime.utcnow().date())
+    summary: Dict[str, Dict] = {}
+    async with session_factory() as db:
+        if backfill:
+            filled = set((await db.execute(select(MonthlySnapshotDB.month).distinct())).scalars().all())
+            for month in await backfill_months(db):
+                if month < current and month not in filled:
+                    summary[month.isoformat()] = await rollup_month(db, month)
+
+        previous = add_months(current, -1)
+        closed = await close_month(db, previous)
+        if closed is not None:
+            summary[previous.isoformat()] = closed
+        summary[current.isoformat()] = await rollup_month(db, current)
+    logger.info(f"Rolled up monthly snapshots: {summary}")
+    return {'months': summary}
+
+
+async def get_user_trends(db: AsyncSession, user_id: str, months: int) -> List[MonthlySnapshotDB]:
+    """The user's snapshots for the last `months` months, oldest first.
+
+    A user with none in that range (no rollup has run since the install,
+    or they signed up after the last one) gets the same values computed
+    live, as unsaved MonthlySnapshotDB rows.
+    """
+    since = add_months(month_start(datetime.utcnow().date()), -(months - 1))
+    result = await db.execute(
+        select(MonthlySnapshotDB)
+        .where(MonthlySnapshotDB.user_id == user_id, MonthlySnapshotDB.month >= since)
+        .order_by(MonthlySnapshotDB.month)
+        .limit(months)
+    )
+    snapshots = list(result.scalars().all())
+    if snapshots:
+        return snapshots
+
+    live = await compute_months(db, [add_months(since, index) for index in range(months)], user_id)
+    return [
+        MonthlySnapshotDB(user_id=user_id, month=month, **values[user_id])
+        for month, values in live.items() if user_id in values
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roll up monthly spend/savings snapshots")
+    parser.add_argument('--backfill', action='store_true',
+                        help="also fill past months that have no snapshots (approximate)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    summary = asyncio.run(run_rollup(backfill=args.backfill))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
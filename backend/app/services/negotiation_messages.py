@@ -0,0 +1,171 @@
+"""
+Append-only negotiation chat storage.
+
+Messages are rows in negotiation_messages, numbered by seq within their
+negotiation; a turn inserts its new rows and bumps
+NegotiationDB.message_count, so its cost does not depend on the length of
+the chat. The bump is a compare-and-swap on message_count (the version):
+two concurrent sends cannot both claim the same seq, and the loser gets
+MessageConflict instead of silently overwriting the other's messages.
+
+Negotiations created before this table keep their chat in the legacy JSON
+column; it is moved here the first time the negotiation is touched.
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.core.database import NegotiationDB, NegotiationMessageDB, generate_uuid
+
+logger = logging.getLogger(__name__)
+
+
+class MessageConflict(Exception):
+    """The negotiation changed since it was read"""
+
+    def __init__(self, expected: int, actual: Optional[int] = None):
+        self.expected = expected
+        self.actual = actual
+        super().__init__(f"Negotiation has {actual} messages, expected {expected}")
+
+
+def message_dict(row: NegotiationMessageDB) -> Dict:
+    return {
+        "seq": row.seq,
+        "role": row.role,
+        "content": row.content,
+        "timestamp": row.created_at.isoformat() if row.created_at else None,
+    }
+
+
+def _legacy_messages(negotiation: NegotiationDB) -> List[Dict]:
+    messages = negotiation.messages
+    if isinstance(messages, str):  # written with json.dumps by older code
+        try:
+            messages = json.loads(messages)
+        except ValueError:
+            logger.warning(f"Unreadable legacy messages for negotiation {negotiation.id}")
+            return []
+    return messages if isinstance(messages, list) else []
+
+
+def _timestamp(value, default: Optional[datetime] = None) -> datetime:
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return default or datetime.utcnow()
+
+
+async def _current_count(db: AsyncSession, negotiation_id: str) -> int:
+    result = await db.execute(
+        select(NegotiationDB.message_count).where(NegotiationDB.id == negotiation_id)
+    )
+    return result.scalar() or 0
+
+
+async def append_messages(db: AsyncSession, negotiation: NegotiationDB, messages: List[Dict],
+                          expected_count: Optional[int] = None, **changes) -> List[Dict]:
+    """Append messages after the expected_count-th one; returns them with their seq.
+
+    expected_count defaults to the count on the loaded negotiation. Extra
+    keyword arguments are written to the negotiation in the same UPDATE.
+    Raises MessageConflict if someone appended in between. Not committed.
+    """
+    await migrate_legacy_messages(db, negotiation)
+
+    current = (negotiation.message_count or 0) if expected_count is None else expected_count
+    now = datetime.utcnow()
+
+    result = await db.execute(
+        update(NegotiationDB)
+        .where(
+            NegotiationDB.id == negotiation.id,
+            func.coalesce(NegotiationDB.message_count, 0) == current,
+        )
+        .values(message_count=current + len(messages), updated_at=now, **changes)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        raise MessageConflict(current, await _current_count(db, negotiation.id))
+
+    rows = [
+        {
+            "id": generate_uuid(),
+            "negotiation_id": negotiation.id,
+            "seq": current + offset,
+            "role": message["role"],
+            "content": message["content"],
+            "created_at": _timestamp(message.get("timestamp"), now),
+        }
+        for offset, message in enumerate(messages, start=1)
+    ]
+    if rows:
+        await db.execute(insert(NegotiationMessageDB), rows)
+
+    set_committed_value(negotiation, 'message_count', current + len(messages))
+    return [
+        {"seq": row["seq"], "role": row["role"], "content": row["content"],
+         "timestamp": row["created_at"].isoformat()}
+        for row in rows
+    ]
+
+
+async def migrate_legacy_messages(db: AsyncSession, negotiation: NegotiationDB):
+    """Move a chat still held in the JSON column into negotiation_messages"""
+    if negotiation.message_count:
+        return
+    legacy = _legacy_messages(negotiation)
+    if not legacy:
+        return
+
+    result = await db.execute(
+        update(NegotiationDB)
+        .where(NegotiationDB.id == negotiation.id, func.coalesce(NegotiationDB.message_count, 0) == 0)
+        .values(message_count=len(legacy), messages=[])
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:  # migrated concurrently
+        set_committed_value(negotiation, 'message_count', await _current_count(db, negotiation.id))
+        return
+
+    await db.execute(insert(NegotiationMessageDB), [
+        {
+            "id": generate_uuid(),
+            "negotiation_id": negotiation.id,
+            "seq": seq,
+            "role": message.get("role", "provider"),
+            "content": message.get("content", ""),
+            "created_at": _timestamp(message.get("timestamp")),
+        }
+        for seq, message in enumerate(legacy, start=1)
+    ])
+    set_committed_value(negotiation, 'message_count', len(legacy))
+    set_committed_value(negotiation, 'messages', [])
+    logger.info(f"Moved {len(legacy)} legacy messages of negotiation {negotiation.id}")
+
+
+async def get_messages(db: AsyncSession, negotiation_id: str, limit: int,
+                       after_seq: Optional[int] = None,
+                       before_seq: Optional[int] = None) -> List[Dict]:
+    """A page of messages in seq order.
+
+    after_seq pages forward; otherwise the page ends just before before_seq
+    (or at the latest message), which is how a chat loads its history.
+    """
+    query = select(NegotiationMessageDB).where(NegotiationMessageDB.negotiation_id == negotiation_id)
+    if after_seq is not None:
+        query = query.where(NegotiationMessageDB.seq > after_seq).order_by(NegotiationMessageDB.seq)
+    else:
+        if before_seq is not None:
+            query = query.where(NegotiationMessageDB.seq < before_seq)
+        query = query.order_by(NegotiationMessageDB.seq.desc())
+
+    rows = list((await db.execute(query.limit(limit))).scalars().all())
+    if after_seq is None:
+        rows.reverse()
+    return [message_dict(row) for row in rows]
@@ -0,0 +1,305 @@
+"""
+Fleet-wide optimization sweep.
+
+Recomputes recommendations for every user: users are paged in keyset order
+(by user id), each page's subscriptions are sharded across a process pool
+that evaluates the optimization rules, the AI analysis goes through a
+rate-limited queue, and the resulting OptimizationDB rows replace the
+pending ones in bulk (app.services.recommendation_store). A checkpoint
+written after every page lets an interrupted sweep resume where it
+stopped.
+
+    python -m app.services.optimization_sweep [--workers N] [--no-llm] [--restart]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, SubscriptionDB
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.recommendation_store import replace_pending_recommendations
+from app.utils.rate_limit import AsyncRateLimiter
+
+logger = logging.getLogger(__name__)
+
+_worker_optimizer = None
+
+
+def evaluate_shard(rows: List[Dict], now: datetime) -> List[Dict]:
+    """Rule-based recommendations for a shard of subscription rows.
+
+    Runs in pool workers, so it takes and returns plain picklable data.
+    """
+    global _worker_optimizer
+    if _worker_optimizer is None:
+        from app.services.optimizer import SubscriptionOptimizer
+
+        _worker_optimizer = SubscriptionOptimizer()
+    optimizer = _worker_optimizer
+
+    subscriptions = [SimpleNamespace(**row) for row in rows]
+    recommendations = []
+    for subscription, rule in zip(subscriptions, optimizer.RULES.best_rules(subscriptions, now)):
+        if rule is None:
+            continue
+        recommendation = optimizer.build_recommendation(
+            subscription, rule.action, 'Current plan', rule.priority
+        )
+        if recommendation:
+            recommendations.append(recommendation.model_dump())
+    return recommendations
+
+
+class SweepStats:
+    """Progress and throughput of a sweep"""
+
+    def __init__(self, users: int = 0, subscriptions: int = 0, recommendations: int = 0,
+                 llm_batches: int = 0, llm_batches_skipped: int = 0, pages: int = 0,
+                 last_user_id: Optional[str] = None):
+        self.users = users
+        self.subscriptions = subscriptions
+        self.recommendations = recommendations
+        self.llm_batches = llm_batches
+        self.llm_batches_skipped = llm_batches_skipped  # rules only: the Gemini breaker was open
+        self.pages = pages
+        self.last_user_id = last_user_id
+        self.started = time.perf_counter()
+        self.resumed_users = users
+
+    def to_dict(self) -> Dict:
+        elapsed = time.perf_counter() - self.started
+        swept = self.users - self.resumed_users
+        return {
+            'users': self.users,
+            'subscriptions': self.subscriptions,
+            'recommendations': self.recommendations,
+            'llm_batches': self.llm_batches,
+            'llm_batches_skipped': self.llm_batches_skipped,
+            'pages': self.pages,
+            'last_user_id': self.last_user_id,
+            'elapsed_seconds': round(elapsed, 3),
+            'users_per_sec': round(swept / elapsed, 2) if elapsed else 0.0,
+        }
+
+
+class SweepCheckpoint:
+    """JSON file recording the last fully written page"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Optional[Dict]:
+        if not self.path or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable sweep checkpoint {self.path}: {e}")
+            return None
+
+    def save(self, stats: SweepStats):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(stats.to_dict(), f)
+        os.replace(tmp_path, self.path)  # atomic, so a crash never leaves half a file
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class OptimizationSweep:
+    """Recompute pending recommendations for every user"""
+
+    def __init__(self, page_size: Optional[int] = None, workers: Optional[int] = None,
+                 use_llm: bool = True, llm_rate_per_minute: Optional[float] = None,
+                 checkpoint_path: Optional[str] = None, session_factory=AsyncSessionLocal):
+        from app.services.optimizer import SubscriptionOptimizer
+
+        self.page_size = page_size or settings.SWEEP_PAGE_SIZE
+        self.workers = settings.SWEEP_WORKERS if workers is None else workers
+        self.optimizer = SubscriptionOptimizer()
+        self.use_llm = use_llm and self.optimizer.gemini.llm.enabled
+        rate = settings.SWEEP_LLM_RATE_PER_MINUTE if llm_rate_per_minute is None else llm_rate_per_minute
+        self.llm_limiter = AsyncRateLimiter(rate / 60.0, burst=settings.SWEEP_LLM_CONCURRENCY)
+        self.checkpoint = SweepCheckpoint(
+            settings.SWEEP_CHECKPOINT_PATH if checkpoint_path is None else checkpoint_path
+        )
+        self.session_factory = session_factory
+
+    async def run(self, resume: bool = True) -> Dict:
+        saved = self.checkpoint.load() if resume else None
+        if saved:
+            stats = SweepStats(**{
+                key: saved[key] for key in
+                ('users', 'subscriptions', 'recommendations', 'llm_batches', 'pages', 'last_user_id')
+            }, llm_batches_skipped=saved.get('llm_batches_skipped', 0))
+            logger.info(f"Resuming sweep after user {stats.last_user_id}")
+        else:
+            stats = SweepStats()
+
+        now = datetime.utcnow()
+        pool = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 0 else None
+        try:
+            async with self.session_factory() as db:
+                while True:
+                    user_ids = await self._next_user_page(db, stats.last_user_id)
+                    if not user_ids:
+                        break
+
+                    rows = await self._load_subscriptions(db, user_ids)
+                    recommendations = await self._evaluate_rules(pool, rows, now)
+                    if self.use_llm:
+                        recommendations += await self._ai_recommendations(rows, recommendations, stats)
+
+                    await self._write(db, rows, recommendations)
+
+                    stats.users += len(user_ids)
+                    stats.subscriptions += len(rows)
+                    stats.recommendations += len(recommendations)
+                    stats.pages += 1
+                    stats.last_user_id = user_ids[-1]
+                    self.checkpoint.save(stats)
+                    logger.info(f"Sweep progress: {stats.to_dict()}")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        self.checkpoint.clear()
+        summary = stats.to_dict()
+        logger.info(f"Sweep completed: {summary}")
+        return summary
+
+    async def _next_user_page(self, db, after: Optional[str]) -> List[str]:
+        query = select(SubscriptionDB.user_id).group_by(SubscriptionDB.user_id)
+        if after is not None:
+            query = query.where(SubscriptionDB.user_id > after)
+        result = await db.execute(query.order_by(SubscriptionDB.user_id).limit(self.page_size))
+        return list(result.scalars().all())
+
+    async def _load_subscriptions(self, db, user_ids: List[str]) -> List[Dict]:
+        table = SubscriptionDB.__table__
+        result = await db.execute(
+            select(table)
+            .where(table.c.user_id.in_(user_ids))
+            .order_by(table.c.user_id, table.c.id)
+        )
+        return [dict(row) for row in result.mappings().all()]
+
+    async def _evaluate_rules(self, pool, rows: List[Dict], now: datetime) -> List[Dict]:
+        if pool is None or len(rows) < 2:
+            return evaluate_shard(rows, now)
+
+        # Rules look at one subscription at a time, so shards are cut by row
+        # count alone; a user's subscriptions may span two shards
+        shard_size = -(-len(rows) // self.workers)
+        loop = asyncio.get_running_loop()
+        shards = await asyncio.gather(*(
+            loop.run_in_executor(pool, evaluate_shard, rows[i:i + shard_size], now)
+            for i in range(0, len(rows), shard_size)
+        ))
+        return [recommendation for shard in shards for recommendation in shard]
+
+    async def _ai_recommendations(self, rows: List[Dict], rule_recommendations: List[Dict],
+                                  stats: SweepStats) -> List[Dict]:
+        """AI analysis for every user of a page, one batched call per user"""
+        by_user: Dict[str, List[Dict]] = {}
+        for row in rows:
+            by_user.setdefault(row['user_id'], []).append(row)
+        covered = {(rec['subscription_id'], rec['action_type']) for rec in rule_recommendations}
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for user_rows in by_user.values():
+            queue.put_nowait(user_rows)
+
+        recommendations: List[Dict] = []
+        breaker = self.optimizer.gemini.breaker
+
+        async def consume():
+            while True:
+                try:
+                    user_rows = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                # Back off while Gemini is failing: these users keep their rule recommendations
+                if breaker.is_open:
+                    stats.llm_batches_skipped += 1
+                    continue
+                await self.llm_limiter.acquire()
+                try:
+                    analyses = await self.optimizer.gemini.optimize_subscriptions([
+                        {'subscription': row, 'usage': {}} for row in user_rows
+                    ])
+                except CircuitOpenError:
+                    stats.llm_batches_skipped += 1
+                    continue
+                stats.llm_batches += 1
+                for row, analysis in zip(user_rows, analyses):
+                    if not analysis:
+                        continue
+                    subscription = SimpleNamespace(**row)
+                    for action in analysis.get('suggested_actions') or []:
+                        if (row['id'], action) in covered:
+                            continue
+                        covered.add((row['id'], action))
+                        recommendation = self.optimizer.build_recommendation(
+                            subscription, action,
+                            analysis.get('optimal_plan', 'Current plan'),
+                            analysis.get('confidence', 0.5),
+                        )
+                        if recommendation:
+                            recommendations.append(recommendation.model_dump())
+
+        await asyncio.gather(*(consume() for _ in range(max(1, settings.SWEEP_LLM_CONCURRENCY))))
+        return recommendations
+
+    async def _write(self, db, rows: List[Dict], recommendations: List[Dict]):
+        """Replace the page's pending recommendations in one transaction"""
+        await replace_pending_recommendations(
+            db, [row['id'] for row in rows], [row['user_id'] for row in rows], recommendations
+        )
+        await db.commit()
+
+
+async def run_sweep(**options) -> Dict:
+    resume = options.pop('resume', True)
+    return await OptimizationSweep(**options).run(resume=resume)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute optimization recommendations for every user")
+    parser.add_argument('--page-size', type=int, default=None, help="users per page")
+    parser.add_argument('--workers', type=int, default=None, help="rule evaluation processes (0 = in-process)")
+    parser.add_argument('--no-llm', action='store_true', help="rules only, skip the AI analysis")
+    parser.add_argument('--llm-rate', type=float, default=None, help="AI requests per minute")
+    parser.add_argument('--checkpoint', default=None, help="checkpoint file path")
+    parser.add_argument('--restart', action='store_true', help="ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    summary = asyncio.run(run_sweep(
+        page_size=args.page_size,
+        workers=args.workers,
+        use_llm=not args.no_llm,
+        llm_rate_per_minute=args.llm_rate,
+        checkpoint_path=args.checkpoint,
+        resume=not args.restart,
+    ))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,17 @@
+import asyncio
 import logging
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
+from types import SimpleNamespace
 
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.event_bus import event_bus
 from app.services.gemini_service import gemini_service
+from app.services.market_catalog import market_catalog
+from app.services.recommendation_store import replace_pending_recommendations
+from app.services.rule_engine import Rule, RuleSet
 from app.models.schemas import (
     Subscription, 
     SubscriptionAnalysis, 
@@ -11,88 +20,204 @@ from app.models.schemas import (
 
 logger = logging.getLogger(__name__)
 
+# AI calls that outlived their latency budget and now run as refinements,
+# by subscription id; at most one per subscription
+_refinements: Dict[str, asyncio.Future] = {}
+
 class SubscriptionOptimizer:
     """Optimize subscriptions based on usage and alternatives"""
     
-    # Optimization rules based on usage patterns
+    # Optimization rules based on usage patterns: every (field, operator,
+    # value) condition must hold; the highest priority matching rule wins
     OPTIMIZATION_RULES = {
         'low_usage_cancel': {
-            'condition': lambda sub: (
-                sub.usage_frequency in ['rarely', 'never'] and
-                sub.status == 'active'
-            ),
+            'when': [
+                ('usage_frequency', 'in', ['rarely', 'never']),
+                ('status', 'eq', 'active'),
+            ],
             'action': 'cancel',
             'priority': 1.0
         },
         'plan_mismatch': {
-            'condition': lambda sub: (
-                sub.plan_name.lower().find('premium') != -1 and
-                sub.estimated_value_score and
-                sub.estimated_value_score < 0.3
-            ),
+            'when': [
+                ('plan_name', 'contains', 'premium'),
+                ('estimated_value_score', 'truthy'),
+                ('estimated_value_score', 'lt', 0.3),
+            ],
             'action': 'downgrade',
             'priority': 0.9
         },
         'bundle_opportunity': {
-            'condition': lambda sub: (
-                sub.service_category in ['streaming', 'software'] and
-                sub.billing_cycle == 'monthly'
-            ),
+            'when': [
+                ('service_category', 'in', ['streaming', 'software']),
+                ('billing_cycle', 'eq', 'monthly'),
+            ],
             'action': 'bundle',
             'priority': 0.7
         },
         'loyalty_discount': {
-            'condition': lambda sub: (
-                sub.start_date and
-                (datetime.utcnow() - sub.start_date).days > 365
-            ),
+            'when': [
+                ('start_date', 'older_than_days', 365),
+            ],
             'action': 'negotiate',
             'priority': 0.8
         }
     }
-    
-    # Market data for common services (could be fetched from API)
-    MARKET_DATA = {
-        'netflix': {
-            'plans': [
-                {'name': 'Basic', 'price': 23.90, 'features': ['1 screen', 'HD']},
-                {'name': 'Standard', 'price': 38.90, 'features': ['2 screens', 'Full HD']},
-                {'name': 'Premium', 'price': 45.90, 'features': ['4 screens', 'Ultra HD']}
-            ]
-        },
-        'spotify': {
-            'plans': [
-                {'name': 'Individual', 'price': 21.90, 'features': ['1 account']},
-                {'name': 'Duo', 'price': 27.90, 'features': ['2 accounts']},
-                {'name': 'Family', 'price': 34.90, 'features': ['6 accounts']},
-                {'name': 'Student', 'price': 10.95, 'features': ['1 account']}
-            ]
-        }
-    }
+    RULES = RuleSet.from_config(OPTIMIZATION_RULES)
     
     def __init__(self):
         self.gemini = gemini_service
+        self.market_catalog = market_catalog
     
     async def analyze(self, subscription: Subscription, 
-                     usage_data: Optional[Dict] = None) -> SubscriptionAnalysis:
-        """Analyze subscription for optimization opportunities"""
+                     usage_data: Optional[Dict] = None,
+                     budget: Optional[float] = None) -> SubscriptionAnalysis:
+        """Analyze subscription for optimization opportunities.
+
+        Waits at most budget seconds (LLM_LATENCY_BUDGET_SECONDS by default)
+        for the AI answer. Past that, or while the Gemini breaker is open,
+        the rule-based analysis comes back at once with degraded=True; a
+        budget of 0 always answers that way. An over-budget call keeps
+        running as a refinement: its answer lands in the LLM cache, its
+        recommendations replace the subscription's pending ones and the
+        user gets an "analysis.refined" event.
+        """
+        subscription_id = str(subscription.id)
+        if self.gemini.breaker.is_open or subscription_id in _refinements:
+            return self._degraded_analysis(subscription)
         
         # Prepare data for AI analysis
         analysis_data = {
-            'subscription': subscription.dict(),
+            'subscription': self._subscription_data(subscription),
             'usage_data': usage_data or {},
             'market_data': self._get_market_data(subscription.service_name),
             'user_context': self._get_user_context(subscription.user_id)
         }
         
-        # Get AI analysis
-        ai_analysis = await self.gemini.optimize_subscription(
+        # Get AI analysis, shielded so it survives the budget running out
+        call = asyncio.ensure_future(self.gemini.optimize_subscription(
             analysis_data['subscription'],
             analysis_data['usage_data']
+        ))
+        budget = settings.LLM_LATENCY_BUDGET_SECONDS if budget is None else budget
+        try:
+            ai_analysis = await asyncio.wait_for(asyncio.shield(call), budget)
+        except asyncio.TimeoutError:
+            self._refine_later(subscription, call)
+            return self._degraded_analysis(subscription)
+        
+        if ai_analysis.get('error'):
+            return self._degraded_analysis(subscription)
+        return self._build_analysis(subscription, ai_analysis)
+    
+    def _refine_later(self, subscription: Subscription, call: asyncio.Future):
+        """Save and publish the AI analysis once the over-budget call finishes"""
+        # Read everything now; an ORM row may be expired by the time it does
+        snapshot = SimpleNamespace(**self._subscription_data(subscription))
+        subscription_id = str(subscription.id)
+        rule_analysis = self._apply_optimization_rules(subscription)
+        _refinements[subscription_id] = call
+        
+        def refine(task: asyncio.Future):
+            if task.cancelled() or task.exception() is not None or task.result().get('error'):
+                _refinements.pop(subscription_id, None)
+                return
+            analysis = SubscriptionAnalysis(
+                subscription_id=subscription_id,
+                **self._combine_analyses(task.result(), rule_analysis)
+            )
+            # Still in flight until saved, so no second refinement starts
+            saving = _refinements[subscription_id] = asyncio.ensure_future(
+                self._save_refinement(snapshot, analysis)
+            )
+            saving.add_done_callback(lambda _: _refinements.pop(subscription_id, None))
+        
+        call.add_done_callback(refine)
+    
+    async def _save_refinement(self, subscription, analysis: SubscriptionAnalysis):
+        """Replace the subscription's pending recommendations with the refined ones, then notify"""
+        user_id = str(subscription.user_id)
+        try:
+            recommendations = await self.generate_recommendations(subscription, analysis)
+            async with AsyncSessionLocal() as db:
+                await replace_pending_recommendations(
+                    db, [str(subscription.id)], [user_id],
+                    [recommendation.model_dump() for recommendation in recommendations],
+                )
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Error saving refined analysis for {subscription.id}: {e}")
+            return
+        event_bus.publish(user_id, 'analysis.refined', analysis.model_dump())
+    
+    def _degraded_analysis(self, subscription: Subscription,
+                           rule_based_analysis: Optional[Dict] = None) -> SubscriptionAnalysis:
+        """Rules only, for when the AI answer is not available in time"""
+        if rule_based_analysis is None:
+            rule_based_analysis = self._apply_optimization_rules(subscription)
+        fallback = {
+            'optimal_plan': subscription.plan_name or 'Current plan',
+            'reasoning': 'AI analysis unavailable right now; showing rule-based suggestions.',
+            'ai_model_used': 'rules',
+        }
+        return SubscriptionAnalysis(
+            subscription_id=str(subscription.id),
+            degraded=True,
+            **self._combine_analyses(fallback, rule_based_analysis)
         )
+    
+    async def analyze_batch(self, subscriptions: List[Subscription],
+                            usage_data: Optional[Dict[str, Dict]] = None) -> List[SubscriptionAnalysis]:
+        """Analyze many subscriptions, packing them into as few AI calls as possible.
+
+        usage_data maps subscription id to its usage data. Subscriptions whose
+        batched answer was missing or invalid are re-analyzed individually;
+        those whose AI call still failed, or all of them while the Gemini
+        breaker is open, get the degraded rule-based analysis.
+        """
+        if self.gemini.breaker.is_open:
+            return [self._degraded_analysis(subscription) for subscription in subscriptions]
+        
+        usage_data = usage_data or {}
+        items = [
+            {
+                'subscription': self._subscription_data(subscription),
+                'usage': usage_data.get(str(subscription.id)) or {},
+            }
+            for subscription in subscriptions
+        ]
+        
+        try:
+            ai_analyses = await self.gemini.optimize_subscriptions(items)
+        except CircuitOpenError:
+            return [self._degraded_analysis(subscription) for subscription in subscriptions]
+        
+        failed = [index for index, result in enumerate(ai_analyses) if result is None]
+        if failed:
+            logger.info(f"Retrying {len(failed)} of {len(items)} subscriptions individually")
+            retries = await asyncio.gather(*(
+                self.gemini.optimize_subscription(items[i]['subscription'], items[i]['usage'])
+                for i in failed
+            ))
+            for index, result in zip(failed, retries):
+                ai_analyses[index] = result
+        
+        rule_analyses = self.apply_optimization_rules_batch(subscriptions)
+        
+        return [
+            self._degraded_analysis(subscription, rule_analysis) if ai_analysis.get('error')
+            else self._build_analysis(subscription, ai_analysis, rule_analysis)
+            for subscription, ai_analysis, rule_analysis
+            in zip(subscriptions, ai_analyses, rule_analyses)
+        ]
+    
+    def _build_analysis(self, subscription: Subscription, ai_analysis: Dict,
+                        rule_based_analysis: Optional[Dict] = None) -> SubscriptionAnalysis:
+        """Merge an AI answer with the business rules"""
         
         # Apply business rules
-        rule_based_analysis = self._apply_optimization_rules(subscription)
+        if rule_based_analysis is None:
+            rule_based_analysis = self._apply_optimization_rules(subscription)
         
         # Combine AI and rule-based analysis
         final_analysis = self._combine_analyses(
@@ -101,10 +226,20 @@ class SubscriptionOptimizer:
         )
         
         return SubscriptionAnalysis(
-            subscription_id=subscription.id,
+            subscription_id=str(subscription.id),
             **final_analysis
         )
     
+    @staticmethod
+    def _subscription_data(subscription) -> Dict:
+        """Plain dict for a Subscription schema or a SubscriptionDB row"""
+        if hasattr(subscription, 'dict'):
+            return subscription.dict()
+        return {
+            column.name: getattr(subscription, column.name)
+            for column in subscription.__table__.columns
+        }
+    
     async def generate_recommendations(self, 
                                      subscription: Subscription,
                                      analysis: SubscriptionAnalysis) -> List[OptimizationRecommendationCreate]:
@@ -136,6 +271,13 @@ class SubscriptionOptimizer:
                                    analysis: SubscriptionAnalysis,
                                    action: str) -> Optional[OptimizationRecommendationCreate]:
         """Create a specific recommendation"""
+        return self.build_recommendation(
+            subscription, action, analysis.optimal_plan, analysis.confidence
+        )
+    
+    def build_recommendation(self, subscription: Subscription, action: str,
+                             optimal_plan: str, confidence: float) -> Optional[OptimizationRecommendationCreate]:
+        """Recommendation for one action; optimal_plan is used for switch/bundle/negotiate"""
         
         try:
             # Determine optimal plan based on action
@@ -155,7 +297,6 @@ class SubscriptionOptimizer:
                 new_cost = 0.0
                 
             else:  # switch, bundle, negotiate
-                optimal_plan = analysis.optimal_plan
                 new_cost = subscription.monthly_cost * 0.8  # Assume 20% discount
             
             # Calculate savings
@@ -183,7 +324,7 @@ class SubscriptionOptimizer:
                 new_cost=new_cost,
                 monthly_savings=monthly_savings,
                 yearly_savings=yearly_savings,
-                confidence_score=min(analysis.confidence / 100, 1.0),  # Convert % to decimal and cap at 1.0
+                confidence_score=min(confidence / 100, 1.0),  # Convert % to decimal and cap at 1.0
                 reasoning=reasoning,
                 steps_required=self._get_steps_required(action),
                 estimated_time_minutes=estimated_time or 30  # Default 30 mins
@@ -195,29 +336,19 @@ class SubscriptionOptimizer:
     
     def _apply_optimization_rules(self, subscription: Subscription) -> Dict:
         """Apply business rules to subscription"""
-        
-        applicable_rules = []
-        
-        for rule_name, rule in self.OPTIMIZATION_RULES.items():
-            try:
-                if rule['condition'](subscription):
-                    applicable_rules.append({
-                        'rule': rule_name,
-                        'action': rule['action'],
-                        'priority': rule['priority']
-                    })
-            except Exception as e:
-                logger.warning(f"Error applying rule {rule_name}: {e}")
-        
-        # Sort by priority
-        applicable_rules.sort(key=lambda x: x['priority'], reverse=True)
-        
-        if applicable_rules:
-            best_rule = applicable_rules[0]
+        return self._rule_analysis(self.RULES.best_rule(subscription))
+    
+    def apply_optimization_rules_batch(self, subscriptions: List[Subscription]) -> List[Dict]:
+        """Apply business rules to many subscriptions at once"""
+        return [self._rule_analysis(rule) for rule in self.RULES.best_rules(subscriptions)]
+    
+    @staticmethod
+    def _rule_analysis(rule: Optional[Rule]) -> Dict:
+        if rule:
             return {
-                'suggested_actions': [best_rule['action']],
-                'confidence': best_rule['priority'],
-                'reasoning': f"Matched rule: {best_rule['rule']}"
+                'suggested_actions': [rule.action],
+                'confidence': rule.priority,
+                'reasoning': f"Matched rule: {rule.name}"
             }
         
         return {
@@ -259,28 +390,19 @@ class SubscriptionOptimizer:
     def _find_downgrade_plan(self, service: str, current_plan: str, current_price: float) -> str:
         """Find appropriate downgrade plan"""
         
-        if service in self.MARKET_DATA:
-            plans = self.MARKET_DATA[service]['plans']
-            
-            # Find cheaper plans
-            cheaper_plans = [
-                p for p in plans 
-                if p['price'] < current_price
-            ]
-            
-            if cheaper_plans:
-                # Return the most expensive cheaper plan (best value)
-                return max(cheaper_plans, key=lambda x: x['price'])['name']
+        # The most expensive cheaper plan (best value)
+        plan = self.market_catalog.current().cheaper_plan(service, current_price)
+        if plan:
+            return plan['name']
         
         return f"{current_plan} (Standard)"
     
     def _get_plan_price(self, service: str, plan_name: str) -> float:
         """Get price for a specific plan"""
         
-        if service in self.MARKET_DATA:
-            for plan in self.MARKET_DATA[service]['plans']:
-                if plan['name'].lower() == plan_name.lower():
-                    return plan['price']
+        price = self.market_catalog.current().plan_price(service, plan_name)
+        if price is not None:
+            return price
         
         # Default: assume 30% cheaper
         return 0.0
@@ -346,13 +468,7 @@ class SubscriptionOptimizer:
     
     def _get_market_data(self, service_name: str) -> Dict:
         """Get market data for service"""
-        service_lower = service_name.lower()
-        
-        for service_key, data in self.MARKET_DATA.items():
-            if service_key in service_lower:
-                return data
-        
-        return {'plans': []}
+        return self.market_catalog.current().market_data(service_name)
     
     def _get_user_context(self, user_id: str) -> Dict:
         """Get user context (simplified for demo)"""
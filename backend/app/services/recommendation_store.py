@@ -0,0 +1,41 @@
+"""
+Bulk persistence for optimization recommendations.
+
+The fleet sweep and the optimizer's late AI refinements both recompute a
+subscription's suggestions from scratch. replace_pending_recommendations
+swaps the ones the user has not seen yet for the new set in one delete and
+one executemany, then refreshes the counters and cached reports that show
+potential savings. Recommendations already presented or executed are kept.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+from sqlalchemy import delete, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import OptimizationDB, generate_uuid
+from app.services.monthly_report import invalidate_reports
+from app.services.user_stats import refresh_user_stats
+
+
+async def replace_pending_recommendations(db: AsyncSession, subscription_ids: List[str],
+                                          user_ids: Iterable[str], recommendations: List[Dict]):
+    """Replace the unseen recommendations of subscription_ids (the caller commits)"""
+    await db.execute(
+        delete(OptimizationDB)
+        .where(OptimizationDB.subscription_id.in_(subscription_ids))
+        .where(OptimizationDB.executed.is_(False))
+        .where(OptimizationDB.presented_to_user.is_(False))
+    )
+    if recommendations:
+        now = datetime.utcnow()
+        await db.execute(insert(OptimizationDB), [
+            {**recommendation, 'id': generate_uuid(), 'created_at': now, 'updated_at': now,
+             'presented_to_user': False, 'executed': False}
+            for recommendation in recommendations
+        ])
+
+    # Potential savings changed for every owner
+    user_ids = list(dict.fromkeys(user_ids))
+    await refresh_user_stats(db, user_ids)
+    await invalidate_reports(db, user_ids)
@@ -0,0 +1,369 @@
+"""
+Vectorized recurrence detection over columnar transaction arrays.
+
+Transactions are loaded once into NumPy columns (epoch day, amount in cents,
+merchant id), sorted once by (merchant, day), and every merchant's interval
+histogram, amount drift and latest charge are computed with array operations
+instead of per-group Python loops.
+"""
+import logging
+from datetime import datetime, timedelta
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, BankAnalyzer falls back to streaming
+    np = None
+
+logger = logging.getLogger(__name__)
+
+NUMPY_AVAILABLE = np is not None
+
+# (cycle, min days, max days) between two consecutive charges
+CADENCE_WINDOWS = (
+    ('weekly', 6, 8),
+    ('monthly', 25, 35),
+    ('quarterly', 80, 100),
+    ('yearly', 350, 380),
+)
+
+_EPOCH = datetime(1970, 1, 1)
+_MISSING_DAY = -(2 ** 62)
+
+
+def classify_interval(days: int) -> Optional[int]:
+    """Return the CADENCE_WINDOWS index matching an interval, if any"""
+    for index, (_, low, high) in enumerate(CADENCE_WINDOWS):
+        if low <= days <= high:
+            return index
+    return None
+
+
+class TransactionColumns:
+    """Columnar view of a bank statement.
+
+    days holds _MISSING_DAY for rows whose date could not be parsed; they
+    still count towards a merchant's count and amounts, as in the
+    streaming fold, but not towards its intervals or latest charge.
+    """
+
+    def __init__(self, days, cents, merchant_ids, merchants: List[str],
+                 rows: Optional[Sequence[Dict]] = None, positions=None):
+        self.days = days
+        self.cents = cents
+        self.merchant_ids = merchant_ids
+        self.merchants = merchants
+        self.rows = rows
+        self.positions = positions  # column index -> rows index, when rows were dropped
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def row(self, index: int) -> Optional[Dict]:
+        """The source transaction at a column index"""
+        if self.rows is None:
+            return None
+        if self.positions is not None:
+            index = self.positions[index]
+        return self.rows[int(index)]
+
+    @classmethod
+    def from_transactions(cls, transactions: List[Dict],
+                          normalize: Callable[[List[str]], List[str]],
+                          parse_date: Callable,
+                          keep: Optional[Callable[[List[str]], List[bool]]] = None) -> 'TransactionColumns':
+        """Build columns from transaction dicts (amounts already numeric)"""
+        try:
+            descriptions = list(map(itemgetter('description'), transactions))
+            if keep is None:
+                amounts = list(map(itemgetter('amount'), transactions))
+                raw_dates = list(map(itemgetter('date'), transactions))
+        except KeyError:
+            descriptions = [txn.get('description', '') for txn in transactions]
+            if keep is None:
+                amounts = [txn.get('amount', 0) for txn in transactions]
+                raw_dates = [txn.get('date') for txn in transactions]
+
+        if keep is not None:
+            # Only the kept rows are read past their description
+            raw_dates = _Field(transactions, 'date', None)
+            amounts = _Field(transactions, 'amount', 0)
+
+        return cls.from_chunks([(raw_dates, descriptions, amounts)], normalize, parse_date,
+                               keep=keep, rows=transactions)
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[Tuple[Sequence, List[str], Sequence]],
+                    normalize: Callable[[List[str]], List[str]],
+                    parse_date: Callable,
+                    parse_amount: Optional[Callable[[object], float]] = None,
+                    keep: Optional[Callable[[List[str]], List[bool]]] = None,
+                    rows: Optional[Sequence[Dict]] = None) -> 'TransactionColumns':
+        """Build columns from (raw dates, descriptions, amounts) chunks.
+
+        normalize maps a batch of raw descriptions to merchants and keep, if
+        given, flags a batch of merchants; both are called once per chunk
+        with the values not seen before. Only rows of kept merchants are
+        retained, so dates and amounts are converted for those rows alone
+        and memory grows with them and the distinct descriptions, not with
+        the statement. ISO dates are decoded in bulk, other formats one by
+        one. Amounts are taken as numbers, or as raw statement values when
+        parse_amount is given (see amounts_column).
+
+        rows, when given, are the source transactions in chunk order;
+        otherwise row() returns dicts rebuilt from the kept values.
+        """
+        raw_index: Dict[str, int] = {}
+        merchant_index: Dict[str, int] = {}
+        wanted: List[bool] = []
+        parts = []
+        kept_dates, kept_descriptions, kept_amounts = [], [], []
+        offset = 0
+
+        for raw_dates, descriptions, amounts in chunks:
+            # Distinct raw descriptions -> merchant id (normalization is the
+            # expensive part, so it runs once per distinct value)
+            new_raws = [raw for raw in dict.fromkeys(descriptions) if raw not in raw_index]
+            new_merchants = []
+            for raw, merchant in zip(new_raws, normalize(new_raws)):
+                if merchant not in merchant_index:
+                    merchant_index[merchant] = len(merchant_index)
+                    new_merchants.append(merchant)
+                raw_index[raw] = merchant_index[merchant]
+            wanted += keep(new_merchants) if keep is not None else [True] * len(new_merchants)
+
+            size = len(descriptions)
+            ids = np.fromiter(map(raw_index.__getitem__, descriptions), np.int64, size)
+            picked = np.flatnonzero(np.array(wanted, dtype=bool)[ids])
+            if len(picked) < len(ids):
+                indexes = picked.tolist()
+                raw_dates = [raw_dates[i] for i in indexes]
+                amounts = [amounts[i] for i in indexes]
+                if rows is None:
+                    descriptions = [descriptions[i] for i in indexes]
+                ids = ids[picked]
+
+            values = amounts_column(amounts, parse_amount) if parse_amount is not None else amounts
+            cents = np.rint(np.asarray(values, dtype=np.float64) * 100).astype(np.int64)
+            parts.append((cls._to_epoch_days(raw_dates, parse_date), cents, ids, picked + offset))
+            if rows is None:
+                kept_dates += raw_dates
+                kept_descriptions += descriptions
+                kept_amounts += values.tolist() if parse_amount is not None else list(values)
+            offset += size
+
+        if parts:
+            days, cents, ids, positions = (np.concatenate(column) for column in zip(*parts))
+        else:
+            days = cents = ids = positions = np.zeros(0, dtype=np.int64)
+
+        if rows is None:
+            return cls(days, cents, ids, list(merchant_index),
+                       _ColumnRows(kept_dates, kept_descriptions, kept_amounts))
+        return cls(days, cents, ids, list(merchant_index), rows, positions)
+
+    @staticmethod
+    def _to_epoch_days(raw_dates: Sequence, parse_date: Callable):
+        """Convert raw date values to int64 days since 1970-01-01"""
+        days = np.full(len(raw_dates), _MISSING_DAY, dtype=np.int64)
+        pending = np.ones(len(raw_dates), dtype=bool)
+
+        # Fast path: plain YYYY-MM-DD values, decoded as bytes. Anything
+        # longer (times, UTC offsets) is left to parse_date, which converts
+        # to UTC and may land on another day.
+        try:
+            encoded = np.array(raw_dates, dtype=np.bytes_)
+        except (TypeError, ValueError, UnicodeEncodeError):
+            encoded = None
+
+        if encoded is not None and len(encoded) and encoded.dtype.itemsize >= 10:
+            width = encoded.dtype.itemsize
+            chars = encoded.view(np.uint8).reshape(-1, width)
+            digits = chars[:, :10].astype(np.int64) - ord('0')
+            digit_cols = [0, 1, 2, 3, 5, 6, 8, 9]
+            iso = (
+                (chars[:, 4] == ord('-')) & (chars[:, 7] == ord('-')) &
+                ((digits[:, digit_cols] >= 0) & (digits[:, digit_cols] <= 9)).all(axis=1)
+            )
+            if width > 10:
+                iso &= chars[:, 10] == 0
+            year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+            month = digits[:, 5] * 10 + digits[:, 6]
+            day = digits[:, 8] * 10 + digits[:, 9]
+            iso &= (year >= 1) & _valid_civil(year, month, day)
+            days[iso] = _days_from_civil(year[iso], month[iso], day[iso])
+            pending = ~iso
+
+        # Slow path for anything else (dd/mm/yyyy, OFX timestamps, datetimes)
+        for i in np.flatnonzero(pending).tolist():
+            parsed = parse_date(raw_dates[i])
+            if parsed is not None:
+                days[i] = (parsed - _EPOCH).days
+        return days
+
+
+def amounts_column(values: Sequence, parse_amount: Callable[[object], float]):
+    """Absolute float64 amounts from raw statement values.
+
+    Plain numbers (what exports usually hold) are converted in bulk. Values
+    float() reads differently from parse_amount (exponents, underscores,
+    thousands separators, blanks) send the whole column through it.
+    """
+    try:
+        text = ''.join(values)
+    except TypeError:
+        plain = all(isinstance(value, (int, float)) for value in values)
+    else:
+        plain = not any(char in text for char in 'eE_')
+    if plain:
+        try:
+            amounts = np.abs(np.array(values, dtype=np.float64))
+            if np.isfinite(amounts).all():
+                return amounts
+        except (TypeError, ValueError):
+            pass
+    return np.fromiter(map(parse_amount, values), np.float64, len(values))
+
+
+class _Field:
+    """One field of every transaction dict, read on access"""
+
+    __slots__ = ('transactions', 'name', 'default')
+
+    def __init__(self, transactions: List[Dict], name: str, default):
+        self.transactions = transactions
+        self.name = name
+        self.default = default
+
+    def __len__(self) -> int:
+        return len(self.transactions)
+
+    def __getitem__(self, index: int):
+        return self.transactions[index].get(self.name, self.default)
+
+
+class _ColumnRows:
+    """Transaction dicts rebuilt on demand from kept statement values"""
+
+    __slots__ = ('dates', 'descriptions', 'amounts')
+
+    def __init__(self, dates: List, descriptions: List[str], amounts: List[float]):
+        self.dates = dates
+        self.descriptions = descriptions
+        self.amounts = amounts
+
+    def __len__(self) -> int:
+        return len(self.descriptions)
+
+    def __getitem__(self, index: int) -> Dict:
+        return {
+            'date': self.dates[index],
+            'description': self.descriptions[index],
+            'amount': self.amounts[index],
+        }
+
+
+_MONTH_DAYS = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]) if np is not None else None
+
+
+def _valid_civil(year, month, day):
+    """Vectorized check that (year, month, day) is a real calendar date"""
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    in_range = (month >= 1) & (month <= 12)
+    length = _MONTH_DAYS[np.where(in_range, month, 0)] + (leap & (month == 2))
+    return in_range & (day >= 1) & (day <= length)
+
+
+def _days_from_civil(year, month, day):
+    """Vectorized proleptic Gregorian date -> days since 1970-01-01"""
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+class MerchantRecurrence:
+    """Recurrence summary for one merchant, as produced by RecurrenceDetector"""
+
+    __slots__ = (
+        'description', 'count', 'recurring', 'billing_cycle', 'mean_amount',
+        'amount_drift', 'last_date', 'next_billing_date', 'latest_txn',
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+
+class RecurrenceDetector:
+    """Classify billing cadence and amount drift for every merchant at once"""
+
+    def detect(self, columns: TransactionColumns,
+               merchant_mask=None) -> List[MerchantRecurrence]:
+        """Return recurring merchants.
+
+        merchant_mask optionally flags, per merchant id, which merchants are
+        worth reporting (e.g. those matching a known service), so summaries
+        are only materialized for them.
+        """
+        if len(columns) == 0:
+            return []
+
+        # Sort once by (merchant, day); each merchant becomes a contiguous run
+        order = np.lexsort((columns.days, columns.merchant_ids))
+        ids = columns.merchant_ids[order]
+        days = columns.days[order]
+        cents = columns.cents[order]
+
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        ends = np.r_[starts[1:], len(ids)] - 1
+        group_ids = ids[starts]
+        counts = ends - starts + 1
+
+        # Interval histogram per merchant, one column per cadence window.
+        # Undated rows sort first in their run and never form an interval.
+        intervals = np.diff(days)
+        same_merchant = (ids[1:] == ids[:-1]) & (days[:-1] != _MISSING_DAY)
+        interval_owner = np.repeat(np.arange(len(starts)), counts)[:-1]
+        histogram = np.zeros((len(starts), len(CADENCE_WINDOWS)), dtype=np.int64)
+        for index, (_, low, high) in enumerate(CADENCE_WINDOWS):
+            mask = same_merchant & (intervals >= low) & (intervals <= high)
+            histogram[:, index] = np.bincount(interval_owner[mask], minlength=len(starts))
+
+        recurring = (counts >= 2) & (histogram.max(axis=1) > 0)
+        if merchant_mask is not None:
+            recurring &= np.asarray(merchant_mask, dtype=bool)[group_ids]
+        cadence = histogram.argmax(axis=1)
+
+        # Amount statistics
+        totals = np.add.reduceat(cents, starts)
+        mins = np.minimum.reduceat(cents, starts)
+        maxs = np.maximum.reduceat(cents, starts)
+        means = totals / counts
+        drift = np.divide(maxs - mins, means, out=np.zeros(len(starts)), where=means != 0)
+
+        # Latest charge and the interval leading to it
+        last_days = days[ends]
+        prev_days = np.where(counts >= 2, days[np.maximum(ends - 1, 0)], last_days)
+        last_interval = last_days - prev_days
+        latest_rows = order[ends]
+
+        results = []
+        for g in np.flatnonzero(recurring):
+            last_date = _EPOCH + timedelta(days=int(last_days[g]))
+            results.append(MerchantRecurrence(
+                description=columns.merchants[group_ids[g]],
+                count=int(counts[g]),
+                recurring=True,
+                billing_cycle=CADENCE_WINDOWS[cadence[g]][0],
+                mean_amount=float(means[g]) / 100,
+                amount_drift=round(float(drift[g]), 4),
+                last_date=last_date,
+                next_billing_date=last_date + timedelta(days=int(last_interval[g])),
+                latest_txn=columns.row(latest_rows[g]),
+            ))
+
+        return results
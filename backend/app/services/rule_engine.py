@@ -0,0 +1,221 @@
+"""
+Declarative optimization rules.
+
+A rule is a list of (field, operator, value) conditions plus the action it
+suggests and its priority. A RuleSet compiles its rules once and can then pick
+the best matching rule for a single subscription, for a whole batch at once
+(conditions are evaluated over column arrays, string conditions once per
+distinct value).
+"""
+from datetime import datetime
+from operator import attrgetter, itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, batches fall back to row evaluation
+    np = None
+
+NUMERIC_OPERATORS = ('lt', 'le', 'gt', 'ge')
+VALUE_OPERATORS = ('eq', 'ne', 'in', 'not_in', 'contains', 'truthy')
+OPERATORS = NUMERIC_OPERATORS + VALUE_OPERATORS + ('older_than_days',)
+
+_COMPARE = {
+    'lt': lambda a, b: a < b,
+    'le': lambda a, b: a <= b,
+    'gt': lambda a, b: a > b,
+    'ge': lambda a, b: a >= b,
+}
+
+
+def _get_field(obj: Any, field: str) -> Any:
+    if isinstance(obj, dict):
+        return obj.get(field)
+    return getattr(obj, field, None)
+
+
+def _extract(objs: Sequence[Any], field: str) -> List[Any]:
+    """One field of every object (None where missing)"""
+    try:
+        getter = itemgetter(field) if objs and isinstance(objs[0], dict) else attrgetter(field)
+        return list(map(getter, objs))
+    except (AttributeError, KeyError, TypeError):
+        return [_get_field(obj, field) for obj in objs]
+
+_TESTS = {
+    'eq': lambda value, expected, now: value == expected,
+    'ne': lambda value, expected, now: value != expected,
+    'in': lambda value, expected, now: value in expected,
+    'not_in': lambda value, expected, now: value not in expected,
+    'contains': lambda value, expected, now: isinstance(value, str) and expected in value.lower(),
+    'truthy': lambda value, expected, now: bool(value),
+    'older_than_days': lambda value, expected, now: (
+        isinstance(value, datetime) and (now - value).days > expected
+    ),
+}
+for _op, _compare in _COMPARE.items():
+    _TESTS[_op] = lambda value, expected, now, _compare=_compare: (
+        isinstance(value, (int, float)) and not isinstance(value, bool) and _compare(value, expected)
+    )
+
+
+class Condition:
+    """One (field, operator, value) test"""
+
+    __slots__ = ('field', 'op', 'value')
+
+    def __init__(self, field: str, op: str, value: Any = None):
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown rule operator '{op}'")
+        if op in ('in', 'not_in'):
+            value = frozenset(value)
+        elif op == 'contains':
+            value = str(value).lower()
+        self.field = field
+        self.op = op
+        self.value = value
+
+    def test_value(self, value: Any, now: datetime) -> bool:
+        """Evaluate the condition against one field value.
+
+        Values of the wrong type never match, as a failed comparison did in
+        the lambda rules this replaces.
+        """
+        return _TESTS[self.op](value, self.value, now)
+
+
+class Rule:
+    """Conditions (all must hold) and the action they suggest"""
+
+    __slots__ = ('name', 'conditions', 'action', 'priority')
+
+    def __init__(self, name: str, conditions: Sequence[Condition], action: str, priority: float):
+        self.name = name
+        self.conditions = tuple(conditions)
+        self.action = action
+        self.priority = priority
+
+    @classmethod
+    def from_spec(cls, name: str, spec: Dict) -> 'Rule':
+        """Build a rule from {'when': [(field, op, value), ...], 'action': ..., 'priority': ...}"""
+        return cls(
+            name,
+            [Condition(*condition) for condition in spec['when']],
+            spec['action'],
+            spec['priority'],
+        )
+
+    def matches(self, obj: Any, now: datetime) -> bool:
+        for condition in self.conditions:
+            if not _TESTS[condition.op](_get_field(obj, condition.field), condition.value, now):
+                return False
+        return True
+
+
+class RuleSet:
+    """Compiled rules; the highest priority matching rule wins"""
+
+    def __init__(self, rules: Iterable[Rule]):
+        # Stable sort: among equal priorities the first declared rule wins
+        self.rules: List[Rule] = sorted(rules, key=lambda rule: -rule.priority)
+        self.by_name = {rule.name: rule for rule in self.rules}
+        self.fields = list(dict.fromkeys(
+            condition.field for rule in self.rules for condition in rule.conditions
+        ))
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Dict]) -> 'RuleSet':
+        return cls(Rule.from_spec(name, spec) for name, spec in config.items())
+
+    def best_rule(self, obj: Any, now: Optional[datetime] = None) -> Optional[Rule]:
+        """Best matching rule for one subscription"""
+        now = now or datetime.utcnow()
+        for rule in self.rules:
+            if rule.matches(obj, now):
+                return rule
+        return None
+
+    def best_rules(self, objs: Sequence[Any], now: Optional[datetime] = None) -> List[Optional[Rule]]:
+        """Best matching rule for every subscription in a batch"""
+        now = now or datetime.utcnow()
+        if np is None:
+            return [self.best_rule(obj, now) for obj in objs]
+
+        columns = {field: _extract(objs, field) for field in self.fields}
+        winners = self.evaluate_columns(columns, len(objs), now)
+        return [self.rules[i] if i >= 0 else None for i in winners.tolist()]
+
+    def evaluate_columns(self, columns: Dict[str, Sequence], size: int,
+                         now: Optional[datetime] = None):
+        """Index into self.rules of the winning rule per row (-1 for none).
+
+        columns maps each field to its values, one per row. Fields missing
+        from columns are treated as None.
+        """
+        now = now or datetime.utcnow()
+        prepared: Dict[Tuple[str, str], Any] = {}
+        winners = np.full(size, -1, dtype=np.int64)
+        undecided = np.ones(size, dtype=bool)
+
+        for index, rule in enumerate(self.rules):
+            mask = undecided.copy()
+            for condition in rule.conditions:
+                if not mask.any():
+                    break
+                mask &= self._condition_mask(condition, columns, size, now, prepared)
+            winners[mask] = index
+            undecided &= ~mask
+            if not undecided.any():
+                break
+
+        return winners
+
+    def _condition_mask(self, condition: Condition, columns: Dict[str, Sequence],
+                        size: int, now: datetime, prepared: Dict):
+        # Every field is factorized once; conditions are tested against its
+        # distinct values and the result is broadcast back to the rows
+        if condition.field not in prepared:
+            values = columns.get(condition.field)
+            prepared[condition.field] = _factorize(values if values is not None else [None] * size)
+        codes, uniques = prepared[condition.field]
+
+        if condition.op in NUMERIC_OPERATORS:
+            matched = _COMPARE[condition.op](_numeric_column(uniques), condition.value)
+        else:
+            matched = np.fromiter(
+                (condition.test_value(value, now) for value in uniques), bool, len(uniques)
+            )
+        return matched[codes]
+
+
+def _numeric_column(values: Sequence):
+    """float64 values for the numeric operators.
+
+    Only real numbers count, as in _TESTS: bools, numeric strings, Decimal
+    and None become NaN, which no comparison matches.
+    """
+    return np.fromiter(
+        (float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan
+         for v in values),
+        np.float64, len(values),
+    )
+
+
+def _factorize(values: Sequence):
+    """(codes, distinct values) for a column"""
+    # Equal values of different types (True and 1, Decimal('5') and 5)
+    # share a dict key; with such a mix, distinct values are kept per type
+    # so that type-sensitive tests see each one. int and float may share.
+    keys = values
+    types = set(map(type, values))
+    if len(types - {int, float, type(None)}) > (0 if types & {int, float} else 1):
+        keys = list(zip(map(type, values), values))
+
+    try:
+        index = dict.fromkeys(keys)
+    except TypeError:  # unhashable values: every row is its own category
+        return np.arange(len(values), dtype=np.int64), list(values)
+    for code, key in enumerate(index):
+        index[key] = code
+    codes = np.fromiter(map(index.__getitem__, keys), np.int64, len(keys))
+    return codes, [key[1] for key in index] if keys is not values else list(index)
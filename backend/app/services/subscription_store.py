@@ -0,0 +1,172 @@
+"""
+Bulk persistence for detected subscriptions.
+
+Email, bank and seed detection all funnel through bulk_upsert_subscriptions:
+the user's existing services are fetched in one query and every new
+subscription is inserted in a single executemany. The unique index on
+(user_id, service_name) makes concurrent detection runs safe; on SQLite and
+PostgreSQL conflicting rows are skipped by the database itself.
+
+ON CONFLICT needs the index to exist. On databases created before it was
+introduced, app.core.migrations merges duplicate services with
+dedupe_subscriptions and then builds it.
+"""
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import DateTime, bindparam, case, delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import NegotiationDB, OptimizationDB, SubscriptionDB, generate_uuid
+from app.services.monthly_report import invalidate_reports
+from app.services.user_stats import refresh_user_stats
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = {column.name: column for column in SubscriptionDB.__table__.columns}
+_DATETIME_COLUMNS = {name for name, column in _COLUMNS.items() if isinstance(column.type, DateTime)}
+
+# Detectors do not always know these; the columns are NOT NULL
+_DEFAULTS = {
+    'service_category': 'other',
+    'billing_cycle': 'monthly',
+    'status': 'active',
+}
+
+
+def _to_row(user_id: str, data: Dict, detection_source: Optional[str]) -> Dict:
+    """Column values for one detected subscription; unknown keys are dropped"""
+    row = {**_DEFAULTS, **{key: value for key, value in data.items() if key in _COLUMNS}}
+    row['user_id'] = user_id
+    row.setdefault('id', generate_uuid())
+    row.setdefault('plan_name', f"{row['service_name']} Subscription")
+    if detection_source and not data.get('detection_source'):
+        row['detection_source'] = detection_source
+
+    for name in _DATETIME_COLUMNS & row.keys():
+        if isinstance(row[name], str):
+            try:
+                row[name] = datetime.fromisoformat(row[name])
+            except ValueError:
+                row[name] = None
+    return row
+
+
+def _column_default(name: str):
+    default = _COLUMNS[name].default
+    if default is None:
+        return None
+    return default.arg(None) if default.is_callable else default.arg
+
+
+async def bulk_upsert_subscriptions(db: AsyncSession, user_id: str, detected: Iterable[Dict],
+                                    detection_source: Optional[str] = None,
+                                    commit: bool = True) -> List[Dict]:
+    """Insert the detected subscriptions the user does not have yet.
+
+    Services already on file (or repeated within `detected`) are skipped.
+    Returns the inserted rows, ids included.
+    """
+    detected = [data for data in detected if data.get('service_name')]
+    if not detected:
+        return []
+
+    result = await db.execute(
+        select(SubscriptionDB.service_name).where(
+            SubscriptionDB.user_id == user_id,
+            SubscriptionDB.service_name.in_({data['service_name'] for data in detected}),
+        )
+    )
+    seen = set(result.scalars().all())
+
+    rows = []
+    for data in detected:
+        if data['service_name'] in seen:
+            continue
+        seen.add(data['service_name'])
+        rows.append(_to_row(user_id, data, detection_source))
+
+    if not rows:
+        return []
+
+    # executemany needs the same keys in every parameter set; columns a
+    # row does not set fall back to their defaults
+    keys = set().union(*rows)
+    for row in rows:
+        for key in keys - row.keys():
+            row[key] = _column_default(key)
+
+    await db.execute(_insert_ignoring_duplicates(db), rows)
+    # Core inserts bypass the ORM counter and report listeners
+    await refresh_user_stats(db, [user_id])
+    await invalidate_reports(db, [user_id])
+    if commit:
+        await db.commit()
+
+    logger.info(f"Stored {len(rows)} of {len(detected)} detected subscriptions for user {user_id}")
+    return rows
+
+
+def _insert_ignoring_duplicates(db: AsyncSession):
+    dialect = db.get_bind().dialect.name
+    if dialect == 'sqlite':
+        return sqlite.insert(SubscriptionDB).on_conflict_do_nothing(
+            index_elements=['user_id', 'service_name']
+        )
+    if dialect == 'postgresql':
+        return postgresql.insert(SubscriptionDB).on_conflict_do_nothing(
+            index_elements=['user_id', 'service_name']
+        )
+    # Elsewhere the pre-check above is the only guard
+    return insert(SubscriptionDB)
+
+
+
+async def dedupe_subscriptions(db: AsyncSession, fix: bool = True) -> Dict:
+    """Merge subscriptions that repeat a (user_id, service_name) pair.
+
+    Per pair the active row is kept (the oldest, if several are active).
+    Optimizations and negotiations pointing at the others are moved to it
+    before the others are deleted.
+    """
+    duplicated = (
+        select(SubscriptionDB.user_id, SubscriptionDB.service_name)
+        .group_by(SubscriptionDB.user_id, SubscriptionDB.service_name)
+        .having(func.count() > 1)
+        .subquery()
+    )
+    result = await db.execute(
+        select(SubscriptionDB.id, SubscriptionDB.user_id, SubscriptionDB.service_name)
+        .join(duplicated, (SubscriptionDB.user_id == duplicated.c.user_id)
+              & (SubscriptionDB.service_name == duplicated.c.service_name))
+        .order_by(SubscriptionDB.user_id, SubscriptionDB.service_name,
+                  case((SubscriptionDB.status == 'active', 0), else_=1),
+                  SubscriptionDB.created_at, SubscriptionDB.id)
+    )
+
+    kept: Dict[tuple, str] = {}
+    replaced: Dict[str, str] = {}
+    for subscription_id, user_id, service_name in result.all():
+        keep = kept.setdefault((user_id, service_name), subscription_id)
+        if keep != subscription_id:
+            replaced[subscription_id] = keep
+
+    user_ids = sorted({user_id for user_id, _ in kept})
+    if replaced and fix:
+        moves = [{'old_id': old, 'new_id': new} for old, new in replaced.items()]
+        for model in (OptimizationDB, NegotiationDB):
+            table = model.__table__
+            await db.execute(
+                update(table).where(table.c.subscription_id == bindparam('old_id'))
+                .values(subscription_id=bindparam('new_id')),
+                moves,
+            )
+        await db.execute(delete(SubscriptionDB).where(SubscriptionDB.id.in_(list(replaced))))
+        # Core writes bypass the ORM counter and report listeners
+        await refresh_user_stats(db, user_ids)
+        await invalidate_reports(db, user_ids)
+        await db.commit()
+
+    return {'duplicate_pairs': len(kept), 'rows_removed': len(replaced), 'users': len(user_ids), 'fixed': fix}
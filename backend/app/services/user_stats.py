@@ -0,0 +1,187 @@
+"""
+Per-user dashboard counters.
+
+The dashboard reads total_monthly_spend, total_subscriptions,
+potential_savings and optimizations_completed, and the activity feed its
+unread count, straight from the user's row.
+ORM writes keep them current through the listeners in app.core.database;
+bulk (Core) writes call refresh_user_stats for the users they touched, and
+reconcile_user_stats recomputes everything from source to catch drift.
+
+    python -m app.services.user_stats [--dry-run]
+"""
+import argparse
+import asyncio
+import json
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import bindparam, case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import AsyncSessionLocal, OptimizationDB, SubscriptionDB, UserDB
+from app.models.activity import Activity
+
+logger = logging.getLogger(__name__)
+
+STAT_COLUMNS = (
+    'total_monthly_spend', 'total_subscriptions', 'potential_savings', 'optimizations_completed',
+    'unread_activities',
+)
+
+# Float sums may differ by rounding noise without being drift
+FLOAT_TOLERANCE = 0.005
+
+RECONCILE_BATCH_SIZE = 500  # drifted users locked and rewritten per statement
+
+
+def _source_aggregates(user_ids: Optional[List[str]] = None):
+    """Grouped queries computing every counter from source tables"""
+    active = SubscriptionDB.status == 'active'
+    subscriptions = select(
+        SubscriptionDB.user_id,
+        func.coalesce(func.sum(case((active, SubscriptionDB.monthly_cost), else_=0)), 0),
+        func.coalesce(func.sum(case((active, 1), else_=0)), 0),
+    ).group_by(SubscriptionDB.user_id)
+
+    executed = OptimizationDB.executed.is_(True)
+    optimizations = select(
+        OptimizationDB.user_id,
+        func.coalesce(func.sum(case((executed, 0), else_=OptimizationDB.monthly_savings)), 0),
+        func.coalesce(func.sum(case((executed, 1), else_=0)), 0),
+    ).group_by(OptimizationDB.user_id)
+
+    unread = select(Activity.user_id, func.count()).where(Activity.read == 0).group_by(Activity.user_id)
+
+    if user_ids is not None:
+        subscriptions = subscriptions.where(SubscriptionDB.user_id.in_(user_ids))
+        optimizations = optimizations.where(OptimizationDB.user_id.in_(user_ids))
+        unread = unread.where(Activity.user_id.in_(user_ids))
+    return subscriptions, optimizations, unread
+
+
+async def compute_user_stats(db: AsyncSession,
+                             user_ids: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """Counters recomputed from subscriptions, optimizations and activities, by user id"""
+    subscriptions, optimizations, unread = _source_aggregates(user_ids)
+    stats: Dict[str, Dict] = {}
+
+    def entry(user_id):
+        return stats.setdefault(user_id, dict.fromkeys(STAT_COLUMNS, 0))
+
+    for user_id, spend, count in (await db.execute(subscriptions)).all():
+        entry(user_id).update(total_monthly_spend=float(spend), total_subscriptions=int(count))
+    for user_id, savings, completed in (await db.execute(optimizations)).all():
+        entry(user_id).update(potential_savings=float(savings), optimizations_completed=int(completed))
+    for user_id, count in (await db.execute(unread)).all():
+        entry(user_id)['unread_activities'] = int(count)
+    return stats
+
+
+async def refresh_user_stats(db: AsyncSession, user_ids: Iterable[str]):
+    """Recompute the counters of the given users (after bulk writes)"""
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return
+    stats = await compute_user_stats(db, user_ids)
+    zero = dict.fromkeys(STAT_COLUMNS, 0)
+    await _write_stats(db, {user_id: stats.get(user_id, zero) for user_id in user_ids})
+
+
+async def _write_stats(db: AsyncSession, stats: Dict[str, Dict]):
+    """One executemany UPDATE; users without a row are ignored"""
+    users = UserDB.__table__
+    await db.execute(
+        update(users)
+        .where(users.c.id == bindparam('user_id'))
+        .values({name: bindparam(name) for name in STAT_COLUMNS}),
+        [{'user_id': user_id, **values} for user_id, values in stats.items()],
+    )
+
+
+def _correlated_stats(users) -> Dict:
+    """Every counter as a scalar subquery correlated with the users row"""
+    active = SubscriptionDB.status == 'active'
+    executed = OptimizationDB.executed.is_(True)
+
+    def total(aggregate, model, *conditions):
+        query = select(aggregate).where(model.user_id == users.c.id, *conditions)
+        return func.coalesce(query.scalar_subquery(), 0)
+
+    return {
+        'total_monthly_spend': total(func.sum(SubscriptionDB.monthly_cost), SubscriptionDB, active),
+        'total_subscriptions': total(func.count(), SubscriptionDB, active),
+        'potential_savings': total(func.sum(OptimizationDB.monthly_savings), OptimizationDB, ~executed),
+        'optimizations_completed': total(func.count(), OptimizationDB, executed),
+        'unread_activities': total(func.count(), Activity, Activity.read == 0),
+    }
+
+
+async def _rewrite_locked(db: AsyncSession, user_ids: List[str]):
+    """Lock the users' rows, then recompute their counters in the UPDATE itself.
+
+    The values compared earlier may already be stale, and writing them
+    would overwrite any listener delta committed in between. Locking
+    first makes the recompute see every delta committed so far, and
+    writes still in flight wait for this transaction and then apply
+    their delta on top. Recomputing inside the UPDATE also keeps the
+    read and the write in one statement where FOR UPDATE does not exist
+    (SQLite).
+    """
+    users = UserDB.__table__
+    await db.execute(select(users.c.id).where(users.c.id.in_(user_ids)).with_for_update())
+    await db.execute(update(users).where(users.c.id.in_(user_ids)).values(_correlated_stats(users)))
+
+
+async def reconcile_user_stats(db: AsyncSession, fix: bool = True) -> Dict:
+    """Compare every user's counters with the source tables.
+
+    Returns the users whose counters drifted (stored vs actual values) and,
+    unless fix is False, rewrites them with values recomputed under a row
+    lock (the reported values come from the unlocked comparison).
+    """
+    actual = await compute_user_stats(db)
+    zero = dict.fromkeys(STAT_COLUMNS, 0)
+    stored = await db.execute(select(UserDB.id, *(getattr(UserDB, name) for name in STAT_COLUMNS)))
+
+    drifted = []
+    checked = 0
+    for user_id, *values in stored.all():
+        checked += 1
+        expected = actual.get(user_id, zero)
+        differences = {
+            name: {'stored': value, 'actual': expected[name]}
+            for name, value in zip(STAT_COLUMNS, values)
+            if abs((value or 0) - expected[name]) > FLOAT_TOLERANCE
+        }
+        if differences:
+            drifted.append({'user_id': user_id, 'differences': differences})
+
+    if drifted:
+        logger.warning(f"Dashboard counters drifted for {len(drifted)} of {checked} users")
+        if fix:
+            drifted_ids = [item['user_id'] for item in drifted]
+            for start in range(0, len(drifted_ids), RECONCILE_BATCH_SIZE):
+                await _rewrite_locked(db, drifted_ids[start:start + RECONCILE_BATCH_SIZE])
+            await db.commit()
+
+    return {'users_checked': checked, 'users_drifted': len(drifted), 'fixed': fix, 'drifted': drifted}
+
+
+async def run_reconciliation(fix: bool = True) -> Dict:
+    async with AsyncSessionLocal() as db:
+        return await reconcile_user_stats(db, fix=fix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check per-user dashboard counters against source tables")
+    parser.add_argument('--dry-run', action='store_true', help="report drift without fixing it")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    report = asyncio.run(run_reconciliation(fix=not args.dry_run))
+    print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
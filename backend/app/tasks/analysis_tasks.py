@@ -0,0 +1,40 @@
+import asyncio
+import logging
+from celery import shared_task
+
+from app.core.config import settings
+from app.services.monthly_rollup import run_rollup
+from app.services.optimization_sweep import run_sweep
+from app.services.user_stats import run_reconciliation
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def nightly_optimization_sweep(use_llm: bool = True):
+    """Recompute recommendations for every user, resuming an interrupted run"""
+    logger.info("Starting nightly optimization sweep")
+    summary = asyncio.run(run_sweep(use_llm=use_llm))
+    logger.info(f"Completed nightly optimization sweep: {summary}")
+    return summary
+
+@shared_task
+def weekly_analysis():
+    """Weekly full sweep, restarting from the first user.
+
+    It checkpoints to its own file, so it never moves or clears the
+    nightly sweep's resume point.
+    """
+    return asyncio.run(run_sweep(resume=False, checkpoint_path=settings.SWEEP_WEEKLY_CHECKPOINT_PATH))
+
+@shared_task
+def reconcile_user_stats():
+    """Detect and fix drift in the per-user dashboard counters"""
+    report = asyncio.run(run_reconciliation())
+    if report["users_drifted"]:
+        logger.warning(f"Fixed dashboard counters for {report['users_drifted']} users")
+    return {key: value for key, value in report.items() if key != "drifted"}
+
+@shared_task
+def monthly_rollup():
+    """Refresh the current month's trend snapshots (closing last month once)"""
+    return asyncio.run(run_rollup())
@@ -36,6 +36,18 @@ celery_app.conf.beat_schedule = {
         'task': 'app.tasks.email_tasks.daily_email_scan',
         'schedule': 86400.0,  # Every 24 hours
     },
+    'nightly-optimization-sweep': {
+        'task': 'app.tasks.analysis_tasks.nightly_optimization_sweep',
+        'schedule': 86400.0,  # Every 24 hours
+    },
+    'daily-user-stats-reconciliation': {
+        'task': 'app.tasks.analysis_tasks.reconcile_user_stats',
+        'schedule': 86400.0,  # Every 24 hours
+    },
+    'hourly-monthly-rollup': {
+        'task': 'app.tasks.analysis_tasks.monthly_rollup',
+        'schedule': 3600.0,  # Every hour
+    },
     'weekly-analysis': {
         'task': 'app.tasks.analysis_tasks.weekly_analysis',
         'schedule': 604800.0,  # Every 7 days
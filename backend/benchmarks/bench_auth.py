@@ -0,0 +1,117 @@
+"""
+Benchmark: authenticated requests per second.
+
+Drives the ASGI app in-process (no network) with a valid bearer token and
+compares the uncached path (verify the JWT and look the user up on every
+request, as get_current_user used to) with the token and user caches of
+app.core.security. By default the target is a probe route that only
+authenticates, so the numbers isolate auth cost; --path measures a real
+endpoint instead.
+
+Usage (from backend/):
+    python -m benchmarks.bench_auth --requests 5000 --concurrency 20
+    python -m benchmarks.bench_auth --path /api/activities/unread-count
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+# A throwaway database unless one is given explicitly
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench_auth.db"
+os.environ.setdefault('DEBUG', 'false')
+
+import httpx
+from fastapi import Depends, FastAPI
+
+from app.core import security
+from app.core.database import AsyncSessionLocal, Base, UserDB, engine, generate_uuid
+from app.main import app
+
+
+async def create_user() -> str:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        user = UserDB(id=generate_uuid(), email=f"bench-{generate_uuid()}@subguard.ai",
+                      hashed_password="dev_hash_bench")
+        db.add(user)
+        await db.commit()
+        return security.create_access_token({"sub": user.email, "user_id": user.id})
+
+
+def probe_app() -> FastAPI:
+    probe = FastAPI()
+
+    @probe.get("/whoami")
+    async def whoami(current_user=Depends(security.get_current_user)):
+        return {"id": current_user.id}
+
+    return probe
+
+
+async def run(target, path: str, token: str, requests: int, concurrency: int) -> float:
+    """Send requests with concurrency clients in flight; returns requests/s"""
+    transport = httpx.ASGITransport(app=target)
+    headers = {"Authorization": f"Bearer {token}"}
+    remaining = iter(range(requests))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            for _ in remaining:
+                response = await client.get(path, headers=headers)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{path} returned {response.status_code}: {response.text}")
+
+        await client.get(path, headers=headers)  # warm up
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - started)
+
+
+def set_caching(enabled: bool):
+    for cache in (security.token_cache, security.user_cache):
+        cache.clear()
+        cache.hits = cache.misses = 0
+        cache.max_entries = 10000 if enabled else 0  # a zero-sized TTLCache stores nothing
+
+
+async def bench(args) -> int:
+    logging.getLogger('httpx').setLevel(logging.WARNING)  # one line per request otherwise
+    token = await create_user()
+    target, path = (app, args.path) if args.path else (probe_app(), "/whoami")
+
+    results = {}
+    for label, caching in (('uncached', False), ('cached', True)):
+        set_caching(caching)
+        results[label] = await run(target, path, token, args.requests, args.concurrency)
+
+    print(f"{path}: {args.requests:,} requests, {args.concurrency} concurrent")
+    print(f"{'auth path':<12}{'req/s':>12}{'speedup':>9}")
+    for label, rate in results.items():
+        print(f"{label:<12}{rate:>12,.0f}{rate / results['uncached']:>8.1f}x")
+    print(f"user cache: {security.user_cache.stats()}")
+
+    speedup = results['cached'] / results['uncached']
+    if speedup < args.min_speedup:
+        print(f"❌ Cached auth speedup {speedup:.1f}x below {args.min_speedup}x")
+        return 1
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--path', default='', help='endpoint of the real app to hit instead of the probe')
+    parser.add_argument('--min-speedup', type=float, default=1.0)
+    args = parser.parse_args()
+    return asyncio.run(bench(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""
+Load test: replay user sessions and report latency percentiles per endpoint.
+
+Each virtual user loops over sessions shaped like real use: log in, load
+the dashboard, run an AI analysis on one subscription, then negotiate it
+over a few streamed chat turns. Latency is recorded per endpoint
+(method + route template) and reported as p50/p95/p99 with throughput.
+
+By default the app runs in-process against a throwaway database seeded by
+app.seeds.synthetic, with the local LLM stand-in (LLM_BACKEND=local) so no
+call leaves the machine; --llm-latency-ms and --llm-error-rate shape it.
+With --base-url the sessions go to a running server instead, which should
+be seeded with the same tool (users log in as user0000000@synthetic... with
+password "synthetic") and started with LLM_BACKEND=local.
+
+Usage (from backend/):
+    python -m benchmarks.bench_load --users 200 --concurrency 50 --sessions 500
+    python -m benchmarks.bench_load --base-url http://localhost:8000 --duration 120
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+
+def _configure(args):
+    """Environment for the in-process app; must run before app is imported"""
+    if 'DATABASE_URL' not in os.environ:
+        os.environ['DATABASE_URL'] = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench_load.db"
+    os.environ.setdefault('DEBUG', 'false')
+    os.environ.setdefault('LLM_BACKEND', 'local')
+    os.environ['LLM_LOCAL_LATENCY_MS'] = str(args.llm_latency_ms)
+    os.environ['LLM_LOCAL_ERROR_RATE'] = str(args.llm_error_rate)
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class Recorder:
+    """Latencies and failures per endpoint"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.sessions = 0
+        self.failed_sessions = 0
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        self.latencies.setdefault(endpoint, []).append(seconds)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+class StepFailed(Exception):
+    pass
+
+
+class Session:
+    """One user's visit; each step records itself and raises StepFailed on error"""
+
+    def __init__(self, client, recorder: Recorder, rng: random.Random, think_ms: float):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.think_ms = think_ms
+        self.headers = {}
+
+    async def _think(self):
+        if self.think_ms:
+            await asyncio.sleep(self.rng.uniform(0, 2 * self.think_ms) / 1000)
+
+    async def call(self, endpoint: str, method: str, path: str, stream: bool = False, **kwargs):
+        await self._think()
+        started = time.perf_counter()
+        body = None
+        try:
+            if stream:
+                # SSE: the turn is over at the done (or error) event
+                async with self.client.stream(method, path, headers=self.headers, **kwargs) as response:
+                    events = [line async for line in response.aiter_lines() if line.startswith('event:')]
+                ok = response.status_code == 200 and 'event: done' in events
+            else:
+                response = await self.client.request(method, path, headers=self.headers, **kwargs)
+                ok = response.status_code < 400
+                body = response.json() if ok else None
+        except Exception:
+            ok = False
+        self.recorder.record(endpoint, time.perf_counter() - started, ok)
+        if not ok:
+            raise StepFailed(endpoint)
+        return body
+
+    async def run(self, email: str, password: str, turns: int):
+        token = await self.call('POST /api/auth/login', 'POST', '/api/auth/login',
+                                data={'username': email, 'password': password})
+        self.headers = {'Authorization': f"Bearer {token['access_token']}"}
+        await self.call('GET /api/auth/me', 'GET', '/api/auth/me')
+
+        # Dashboard
+        await self.call('GET /api/optimizations/dashboard/summary', 'GET', '/api/optimizations/dashboard/summary')
+        subscriptions = await self.call('GET /api/subscriptions/', 'GET', '/api/subscriptions/')
+        await self.call('GET /api/activities/unread-count', 'GET', '/api/activities/unread-count')
+        await self.call('GET /api/activities/', 'GET', '/api/activities/', params={'limit': 20})
+        if not subscriptions:
+            return
+
+        # Analyze
+        subscription = self.rng.choice(subscriptions)
+        analysis = await self.call('POST /api/subscriptions/{id}/analyze', 'POST',
+                                   f"/api/subscriptions/{subscription['id']}/analyze")
+
+        # Negotiate
+        negotiation = await self.call('POST /api/negotiations/', 'POST', '/api/negotiations/', json={
+            'optimization_id': analysis['optimization_id'],
+            'subscription_id': subscription['id'],
+            'provider_name': subscription['service_name'],
+            'current_plan': subscription.get('plan_name') or '',
+            'proposed_savings': max(1.0, round(subscription['monthly_cost'] * 0.2, 2)),
+        })
+        for turn in range(turns):
+            await self.call('POST /api/negotiations/{id}/message/stream', 'POST',
+                            f"/api/negotiations/{negotiation['id']}/message/stream", stream=True,
+                            params={'message': f"I have been a customer for years. Offer {turn + 1}?"})
+        await self.call('GET /api/negotiations/{id}/messages', 'GET',
+                        f"/api/negotiations/{negotiation['id']}/messages")
+
+
+async def virtual_user(client, recorder: Recorder, args, rng: random.Random, deadline: Optional[float],
+                       remaining):
+    while deadline is None or time.perf_counter() < deadline:
+        if deadline is None and next(remaining, None) is None:
+            return
+        index = rng.randrange(args.users)
+        session = Session(client, recorder, rng, args.think_ms)
+        recorder.sessions += 1
+        try:
+            await session.run(f"user{index:07d}@synthetic.subguard.ai", 'synthetic', args.turns)
+        except StepFailed:
+            recorder.failed_sessions += 1
+
+
+def report(recorder: Recorder, elapsed: float, max_error_rate: float) -> int:
+    print(f"{'endpoint':<48}{'requests':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'max ms':>9}{'req/s':>8}")
+    total = errors = 0
+    for endpoint, latencies in recorder.latencies.items():
+        values = sorted(latencies)
+        failed = recorder.errors.get(endpoint, 0)
+        total += len(values)
+        errors += failed
+        print(f"{endpoint:<48}{len(values):>9}{failed:>8}"
+              f"{percentile(values, 0.50) * 1000:>9.1f}{percentile(values, 0.95) * 1000:>9.1f}"
+              f"{percentile(values, 0.99) * 1000:>9.1f}{values[-1] * 1000:>9.1f}{len(values) / elapsed:>8.1f}")
+    print(f"{recorder.sessions} sessions ({recorder.failed_sessions} failed), {total} requests "
+          f"in {elapsed:.1f}s: {total / elapsed:.1f} req/s, {recorder.sessions / elapsed:.2f} sessions/s")
+
+    error_rate = errors / total if total else 1.0
+    if error_rate > max_error_rate:
+        print(f"❌ Error rate {error_rate:.2%} above {max_error_rate:.2%}")
+        return 1
+    print(f"✅ Error rate {error_rate:.2%}")
+    return 0
+
+
+async def bench(args) -> int:
+    import httpx
+
+    logging.getLogger('httpx').setLevel(logging.WARNING)  # one line per request otherwise
+    if args.base_url:
+        transport, base_url = None, args.base_url
+    else:
+        from app.main import app
+        from app.seeds.synthetic import seed
+
+        summary = await seed(args.users, activities=args.activities, batch_size=500, seed=args.seed)
+        print(f"Seeded {summary['rows']['users']} users in {summary['insert_seconds']}s")
+        transport, base_url = httpx.ASGITransport(app=app, raise_app_exceptions=False), 'http://load'
+
+    recorder = Recorder()
+    remaining = iter(range(args.sessions))
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits,
+                                 timeout=args.timeout) as client:
+        deadline = time.perf_counter() + args.duration if args.duration else None
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            virtual_user(client, recorder, args, random.Random(args.seed + worker), deadline, remaining)
+            for worker in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+
+    code = report(recorder, elapsed, args.max_error_rate)
+    if not args.base_url:
+        from app.services.llm_client import llm_client
+
+        kinds = llm_client.stats()['kinds']
+        print("LLM:", json.dumps({kind: {key: round(stats[key], 1) for key in
+                                         ('requests', 'errors', 'avg_latency_ms', 'max_latency_ms')}
+                                  for kind, stats in kinds.items()}))
+    return code
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--base-url', default='', help='load a running server instead of the in-process app')
+    parser.add_argument('--users', type=int, default=200, help='seeded users sessions log in as')
+    parser.add_argument('--activities', type=int, default=40, help='activities per seeded user')
+    parser.add_argument('--concurrency', type=int, default=50, help='virtual users')
+    parser.add_argument('--sessions', type=int, default=500, help='sessions in total (ignored with --duration)')
+    parser.add_argument('--duration', type=float, default=0, help='run for this many seconds instead')
+    parser.add_argument('--turns', type=int, default=3, help='streamed negotiation turns per session')
+    parser.add_argument('--think-ms', type=float, default=0, help='mean pause before each request')
+    parser.add_argument('--llm-latency-ms', type=float, default=800, help='median latency of the LLM stand-in')
+    parser.add_argument('--llm-error-rate', type=float, default=0.0, help='share of stand-in calls that fail')
+    parser.add_argument('--timeout', type=float, default=60.0, help='per-request client timeout')
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    if not args.base_url:
+        _configure(args)
+    return asyncio.run(bench(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,303 @@
+"""
+Query-budget regression check for the API endpoints.
+
+Seeds a throwaway SQLite database with one user's realistic data, then
+drives every router in app/api/endpoints/ through an in-process client
+with a real bearer token. For each call it counts the SQL statements and
+commits that reached the engine (background tasks included) and the wall
+time, and compares them with the budget in CASES. Any call over budget, or
+answering with an unexpected status, fails the run; endpoints listed in
+KNOWN_FAILURES are reported without failing it.
+
+Budgets are set a little above what the endpoints do today; when a change
+legitimately needs more queries, raise the number here in the same commit
+so the cost is reviewed. Time budgets are loose on purpose (shared CI
+machines are noisy); scale them with --time-scale.
+
+tests/test_query_budget.py runs the same table under pytest.
+
+Usage (from backend/):
+    python -m benchmarks.bench_query_budget
+    python -m benchmarks.bench_query_budget --only negotiations --time-scale 3
+"""
+import argparse
+import asyncio
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# A throwaway database unless one is given explicitly
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench_query_budget.db"
+os.environ.setdefault('DEBUG', 'false')
+os.environ.setdefault('GEMINI_API_KEY', '')  # rule-based paths only; no network
+
+import httpx
+from sqlalchemy import event
+
+from app.core.database import (
+    AsyncSessionLocal,
+    Base,
+    NegotiationDB,
+    OptimizationDB,
+    SubscriptionDB,
+    UserDB,
+    engine,
+    generate_uuid,
+)
+from app.core.security import create_access_token
+from app.main import app
+from app.models.activity import Activity
+from app.services.negotiation_messages import append_messages
+
+SERVICES = [
+    ('Netflix', 'Streaming', 'Premium 4K', 55.90),
+    ('Spotify', 'Music', 'Family', 34.90),
+    ('ChatGPT Plus', 'AI', 'Plus', 110.00),
+    ('Adobe Creative Cloud', 'Software', 'All Apps', 224.00),
+    ('Amazon Prime', 'Shopping', 'Annual', 14.90),
+]
+
+# name, method, path, request kwargs, expected status, (statements, commits, ms)
+# Paths are formatted with the ids of the seeded rows.
+CASES = [
+    ('auth: me', 'GET', '/api/auth/me', {}, 200, (2, 1, 100)),
+    ('subscriptions: list', 'GET', '/api/subscriptions/', {}, 200, (2, 1, 150)),
+    ('subscriptions: get', 'GET', '/api/subscriptions/{subscription}', {}, 200, (2, 1, 100)),
+    ('subscriptions: create', 'POST', '/api/subscriptions/', {'json': {
+        'service_name': 'YouTube Premium', 'service_category': 'Streaming',
+        'plan_name': 'Individual', 'monthly_cost': 24.90, 'billing_cycle': 'monthly',
+    }}, 200, (10, 3, 200)),
+    ('subscriptions: update', 'PUT', '/api/subscriptions/{subscription}',
+     {'json': {'monthly_cost': 49.90}}, 200, (8, 2, 150)),
+    ('subscriptions: optimize', 'POST', '/api/subscriptions/{subscription}/optimize',
+     {'params': {'action': 'downgrade'}}, 200, (8, 3, 500)),
+    ('subscriptions: apply recommendation', 'POST', '/api/subscriptions/{subscription}/apply-recommendation',
+     {'json': {'action': 'keep'}}, 200, (10, 3, 150)),
+    ('subscriptions: detect email', 'POST', '/api/subscriptions/detect/email', {}, 200, (12, 3, 1000)),
+    ('subscriptions: detect bank', 'POST', '/api/subscriptions/detect/bank', {'files': {
+        'statement': ('statement.csv', 'date,description,amount\n'
+                      '2024-01-05,NETFLIX.COM,55.90\n2024-02-05,NETFLIX.COM,55.90\n'
+                      '2024-03-05,NETFLIX.COM,55.90\n', 'text/csv'),
+    }}, 200, (12, 3, 1000)),
+    ('optimizations: list', 'GET', '/api/optimizations/', {}, 200, (3, 1, 300)),
+    ('optimizations: results', 'GET', '/api/optimizations/results', {}, 200, (5, 1, 150)),
+    ('optimizations: dashboard summary', 'GET', '/api/optimizations/dashboard/summary', {}, 200, (3, 1, 150)),
+    ('optimizations: dashboard trends', 'GET', '/api/optimizations/dashboard/trends', {}, 200, (3, 1, 150)),
+    ('optimizations: execute', 'POST', '/api/optimizations/{optimization}/execute', {}, 200, (16, 3, 300)),
+    # After the optimization reads: a 'keep' analysis stores an action_type
+    # the OptimizationRecommendation schema rejects, which breaks the list
+    ('subscriptions: analyze', 'POST', '/api/subscriptions/{subscription}/analyze', {}, 200, (8, 3, 500)),
+    ('activities: feed', 'GET', '/api/activities/', {'params': {'limit': 50}}, 200, (2, 1, 150)),
+    ('activities: unread count', 'GET', '/api/activities/unread-count', {}, 200, (2, 1, 100)),
+    ('activities: create', 'POST', '/api/activities/', {'json': {
+        'user_id': '{user}', 'activity_type': 'note', 'title': 'Budget check',
+    }}, 200, (6, 2, 150)),
+    ('activities: mark read', 'PATCH', '/api/activities/{activity}/read', {}, 200, (6, 2, 150)),
+    ('activities: read all', 'POST', '/api/activities/read-all', {}, 200, (6, 2, 150)),
+    ('negotiations: list', 'GET', '/api/negotiations/', {}, 200, (2, 1, 150)),
+    ('negotiations: get', 'GET', '/api/negotiations/{negotiation}', {}, 200, (4, 2, 150)),
+    ('negotiations: messages', 'GET', '/api/negotiations/{negotiation}/messages', {}, 200, (4, 2, 150)),
+    ('negotiations: create', 'POST', '/api/negotiations/', {'json': {
+        'optimization_id': '{optimization}', 'subscription_id': '{subscription}',
+        'provider_name': 'Spotify', 'current_plan': 'Family', 'proposed_savings': 10.0,
+    }}, 200, (12, 3, 200)),
+    ('negotiations: send message', 'POST', '/api/negotiations/{negotiation}/message',
+     {'params': {'message': 'Can you do better?'}}, 200, (10, 3, 200)),
+    ('negotiations: stream message', 'POST', '/api/negotiations/{negotiation}/message/stream',
+     {'params': {'message': 'Final answer?'}}, 200, (14, 4, 300)),
+    ('negotiations: accept', 'POST', '/api/negotiations/{negotiation}/accept', {}, 200, (10, 3, 200)),
+    ('negotiations: reject', 'POST', '/api/negotiations/{negotiation}/reject', {}, 200, (10, 3, 200)),
+    ('reports: monthly', 'GET', '/api/reports/monthly', {}, 200, (8, 2, 300)),
+    ('reports: monthly (cached)', 'GET', '/api/reports/monthly', {}, 200, (2, 1, 100)),
+    ('subscriptions: delete', 'DELETE', '/api/subscriptions/{subscription}', {}, 200, (10, 3, 150)),
+]
+
+
+# Endpoints that crash today, by case name. They still run and are
+# reported, but do not fail the check; one that starts passing does, so
+# its entry is removed and its budget starts to count.
+KNOWN_FAILURES = {
+    'subscriptions: optimize': 'SubscriptionOptimizer has no get_recommendation',
+    'subscriptions: detect email': 'EmailParser has no analyze_user_email',
+}
+
+
+class QueryCounter:
+    """Statements and commits seen by the engine since the last reset"""
+
+    def __init__(self, sync_engine):
+        self.statements = 0
+        self.commits = 0
+        event.listen(sync_engine, 'after_cursor_execute', self._statement)
+        event.listen(sync_engine, 'commit', self._commit)
+
+    def _statement(self, *args):
+        self.statements += 1
+
+    def _commit(self, *args):
+        self.commits += 1
+
+    def reset(self):
+        self.statements = self.commits = 0
+
+
+async def seed(subscriptions: int, activities: int, messages: int) -> dict:
+    """One user with subscriptions, optimizations, activities and a chat"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    now = datetime.utcnow()
+    async with AsyncSessionLocal() as db:
+        user = UserDB(id=generate_uuid(), email=f"budget-{generate_uuid()}@subguard.ai",
+                      hashed_password="dev_hash_budget")
+        db.add(user)
+
+        subscription_ids = []
+        for index in range(subscriptions):
+            name, category, plan, cost = SERVICES[index % len(SERVICES)]
+            subscription = SubscriptionDB(
+                id=generate_uuid(), user_id=user.id,
+                service_name=name if index < len(SERVICES) else f"{name} {index}",
+                service_category=category, plan_name=plan, monthly_cost=cost,
+                billing_cycle='monthly', status='active',
+                start_date=now - timedelta(days=30 * (index % 12 + 1)),
+            )
+            db.add(subscription)
+            subscription_ids.append(subscription.id)
+
+        optimization_ids = []
+        for subscription_id in subscription_ids[:max(1, subscriptions // 2)]:
+            optimization = OptimizationDB(
+                id=generate_uuid(), subscription_id=subscription_id, user_id=user.id,
+                action_type='downgrade', current_plan='Premium', recommended_plan='Basic',
+                current_cost=55.90, new_cost=25.90, monthly_savings=30.0, yearly_savings=360.0,
+                confidence_score=0.8, reasoning='Low usage', estimated_time_minutes=15,
+            )
+            db.add(optimization)
+            optimization_ids.append(optimization.id)
+
+        activity_ids = []
+        for index in range(activities):
+            activity = Activity(
+                id=generate_uuid(), user_id=user.id, activity_type='subscription_added',
+                title=f"Activity {index}", created_at=now - timedelta(minutes=index), read=0,
+            )
+            db.add(activity)
+            activity_ids.append(activity.id)
+
+        negotiation = NegotiationDB(
+            id=generate_uuid(), user_id=user.id, optimization_id=optimization_ids[0],
+            subscription_id=subscription_ids[0], provider_name='Netflix',
+            current_plan='Premium 4K', proposed_savings=20.0, status='in_progress',
+            message_count=0, messages=[], expires_at=now + timedelta(days=7),
+        )
+        db.add(negotiation)
+        await db.flush()
+        await append_messages(db, negotiation, [
+            {'role': 'user' if index % 2 else 'provider', 'content': f"Message {index}"}
+            for index in range(messages)
+        ])
+        await db.commit()
+
+    return {
+        'user': user.id,
+        'token': create_access_token({'sub': user.email, 'user_id': user.id}),
+        'subscription': subscription_ids[-1],
+        'optimization': optimization_ids[-1],
+        'activity': activity_ids[0],
+        'negotiation': negotiation.id,
+    }
+
+
+def _fill(value, ids: dict):
+    if isinstance(value, str):
+        return value.format(**ids)
+    if isinstance(value, dict):
+        return {key: _fill(item, ids) for key, item in value.items()}
+    return value
+
+
+async def run_cases(cases, ids: dict, counter: QueryCounter, time_scale: float):
+    # Unhandled errors become 500 rows in the table rather than aborting the run
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    headers = {'Authorization': f"Bearer {ids['token']}"}
+    results = []
+
+    async with httpx.AsyncClient(transport=transport, base_url='http://budget') as client:
+        await client.get('/health')  # import-time and first-connection costs stay out of the table
+        for name, method, path, kwargs, expected_status, budget in cases:
+            kwargs = {key: (value if key == 'files' else _fill(value, ids)) for key, value in kwargs.items()}
+            counter.reset()
+            started = time.perf_counter()
+            response = await client.request(method, path.format(**ids), headers=headers, **kwargs)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if 'files' in kwargs:  # rewind uploads in case the case list is run again
+                for _, content, _ in kwargs['files'].values():
+                    if isinstance(content, io.IOBase):
+                        content.seek(0)
+
+            max_statements, max_commits, max_ms = budget
+            failures = []
+            if response.status_code != expected_status:
+                failures.append(f"status {response.status_code}: {response.text[:120]}")
+            if counter.statements > max_statements:
+                failures.append(f"{counter.statements} statements > {max_statements}")
+            if counter.commits > max_commits:
+                failures.append(f"{counter.commits} commits > {max_commits}")
+            if elapsed_ms > max_ms * time_scale:
+                failures.append(f"{elapsed_ms:.0f} ms > {max_ms * time_scale:.0f} ms")
+            results.append((name, counter.statements, max_statements, counter.commits,
+                            max_commits, elapsed_ms, max_ms * time_scale, failures))
+    return results
+
+
+def report(results) -> int:
+    print(f"{'endpoint':<40}{'sql':>10}{'commits':>10}{'ms':>14}  result")
+    failed = known = 0
+    for name, statements, max_statements, commits, max_commits, ms, max_ms, failures in results:
+        if name in KNOWN_FAILURES:
+            if failures:
+                outcome = f"⚠️  known failure: {KNOWN_FAILURES[name]}"
+                known += 1
+            else:
+                outcome = "❌ passes now; remove it from KNOWN_FAILURES"
+                failed += 1
+        else:
+            outcome = '✅' if not failures else '❌ ' + '; '.join(failures)
+            failed += bool(failures)
+        print(f"{name:<40}{statements:>5}/{max_statements:<4}{commits:>5}/{max_commits:<4}"
+              f"{ms:>7.1f}/{max_ms:<6.0f}  {outcome}")
+    if failed:
+        print(f"❌ {failed} of {len(results)} endpoints failed the check")
+        return 1
+    print(f"✅ {len(results) - known} endpoints within budget, {known} known failures")
+    return 0
+
+
+async def bench(args) -> int:
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    ids = await seed(args.subscriptions, args.activities, args.messages)
+    counter = QueryCounter(engine.sync_engine)
+    cases = [case for case in CASES if not args.only or case[0].startswith(args.only)]
+    results = await run_cases(cases, ids, counter, args.time_scale)
+    return report(results)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--subscriptions', type=int, default=40)
+    parser.add_argument('--activities', type=int, default=500)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--only', default='', help='run the cases whose name starts with this (e.g. "reports")')
+    parser.add_argument('--time-scale', type=float, default=1.0, help='multiply every time budget')
+    args = parser.parse_args()
+    return asyncio.run(bench(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
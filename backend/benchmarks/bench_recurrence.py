@@ -0,0 +1,225 @@
+"""
+Benchmark: recurrence detection on a synthetic bank statement.
+
+Times the original analyzer (per-group Python loops, kept below as
+BaselineAnalyzer), the streaming fold and the columnar NumPy detector on the
+same rows (1M by default), end to end through the two real entry points:
+analyze_file on a CSV export (what the upload endpoint calls; the original
+had no file support, so its figure is csv.DictReader feeding it) and
+analyze_transactions on a list of dicts. Peak traced memory of each
+analyze_file is reported too, since the file paths must stay bounded by
+chunk and merchant count rather than file size. The run fails if the
+engines disagree or if the vectorized speedup over the original is below
+--min-speedup.
+
+The 10x target over the original is not met. At 1M rows on the
+development machine the vectorized engine is ~6.5x faster from the file
+(1.97s vs 12.86s, 74 MB peak vs 493 MB) and ~5.7x from dicts (1.76s vs
+9.94s); the streaming fold runs at about the original's speed in
+~30 MB. What is left of the vectorized time is per-row work no array
+operation removes: hashing every description to find its merchant and,
+for the file, splitting the text into fields. The default gate sits
+below those figures to catch regressions.
+
+Usage (from backend/):
+    python -m benchmarks.bench_recurrence --rows 1000000
+"""
+import argparse
+import asyncio
+import csv
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from operator import itemgetter
+
+from app.services.bank_analyzer import BankAnalyzer
+
+SERVICES = ['NETFLIX.COM', 'SPOTIFY AB', 'AMAZON PRIME', 'YOUTUBE PREMIUM',
+            'MICROSOFT 365', 'ADOBE SYSTEMS', 'GYMPASS', 'IFOOD CLUB', 'UBER ONE']
+MERCHANTS = ['PADARIA', 'POSTO', 'MERCADO', 'FARMACIA', 'RESTAURANTE', 'LOJA']
+
+
+class BaselineAnalyzer:
+    """The analyzer as it was before the streaming and vectorized engines"""
+
+    TRANSACTION_PATTERNS = BankAnalyzer.TRANSACTION_PATTERNS
+
+    async def analyze_transactions(self, transactions):
+        subscriptions = []
+        for description, txns in self._group_transactions(transactions).items():
+            if len(txns) >= 2 and self._is_recurring(txns):
+                service = self._identify_service(description)
+                if service:
+                    subscriptions.append(self._create_subscription(service, txns))
+        return subscriptions
+
+    async def analyze_file(self, path):
+        with open(path, newline='') as f:
+            transactions = [{'date': row['date'], 'description': row['description'],
+                             'amount': abs(float(row['amount']))} for row in csv.DictReader(f)]
+        return await self.analyze_transactions(transactions)
+
+    def _group_transactions(self, transactions):
+        grouped = {}
+        for txn in transactions:
+            desc = self._normalize_description(txn.get('description', ''))
+            key = f"{desc}_{txn.get('amount', 0):.2f}"
+            grouped.setdefault(key, []).append(txn)
+        return grouped
+
+    def _normalize_description(self, description):
+        desc = re.sub(r'[^\w\s]', ' ', description.lower())
+        desc = re.sub(r'\s+', ' ', desc).strip()
+        for prefix in ['pagamento', 'compra', 'debito', 'cartao', 'tb']:
+            if desc.startswith(prefix):
+                desc = desc[len(prefix):].strip()
+        return desc
+
+    def _is_recurring(self, transactions):
+        dates = [txn.get('date') for txn in sorted(transactions, key=lambda x: x.get('date'))]
+        for i in range(1, len(dates)):
+            try:
+                diff_days = (datetime.fromisoformat(dates[i]) - datetime.fromisoformat(dates[i - 1])).days
+                if 25 <= diff_days <= 35:
+                    return True
+            except (ValueError, TypeError):
+                continue
+        return False
+
+    def _identify_service(self, description):
+        for service, patterns in self.TRANSACTION_PATTERNS.items():
+            for pattern in patterns:
+                if re.search(pattern, description, re.IGNORECASE):
+                    return service
+        return None
+
+    def _create_subscription(self, service, transactions):
+        dates = sorted(txn.get('date') for txn in transactions)
+        last_date, second_last = datetime.fromisoformat(dates[-1]), datetime.fromisoformat(dates[-2])
+        first_interval = (datetime.fromisoformat(dates[1]) - datetime.fromisoformat(dates[0])).days
+        cycle = next((name for name, low, high in (('monthly', 25, 35), ('quarterly', 80, 100),
+                                                   ('yearly', 350, 380)) if low <= first_interval <= high),
+                     'monthly')
+        return {
+            'service_name': service.title(),
+            'monthly_cost': sum(txn.get('amount', 0) for txn in transactions) / len(transactions),
+            'billing_cycle': cycle,
+            'next_billing_date': (last_date + (last_date - second_last)).isoformat(),
+            'raw_data': {'transactions_count': len(transactions),
+                         'last_transaction': max(transactions, key=lambda x: x.get('date'))},
+        }
+
+
+
+def generate_statement(rows: int, seed: int = 42):
+    """Generate a chronologically shuffled statement with recurring charges"""
+    rng = random.Random(seed)
+    start = date(2018, 1, 1)
+    transactions = []
+
+    # Recurring charges: one per (service, account) every ~30 days
+    accounts = max(1, rows // 2000)
+    for account in range(accounts):
+        for service in SERVICES:
+            amount = round(rng.uniform(9.9, 59.9), 2)
+            day = start + timedelta(days=rng.randint(0, 30))
+            for _ in range(24):
+                transactions.append({
+                    'date': day.isoformat(),
+                    'description': f'PAGAMENTO {service} {account}',
+                    'amount': amount,
+                })
+                day += timedelta(days=rng.randint(28, 31))
+
+    # Noise: one-off purchases
+    while len(transactions) < rows:
+        transactions.append({
+            'date': (start + timedelta(days=rng.randint(0, 2200))).isoformat(),
+            'description': f'COMPRA {rng.choice(MERCHANTS)} {rng.randint(0, 5000)}',
+            'amount': round(rng.uniform(1, 500), 2),
+        })
+
+    rng.shuffle(transactions)
+    return transactions[:rows]
+
+
+def write_csv(transactions, path: str):
+    """Write the statement as a chronological CSV export"""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['date', 'description', 'amount'])
+        for txn in sorted(transactions, key=itemgetter('date')):
+            writer.writerow((txn['date'], txn['description'], f"{-txn['amount']:.2f}"))
+
+
+def timed(call):
+    """Run an analyzer coroutine and return (seconds, subscriptions)"""
+    started = time.perf_counter()
+    result = asyncio.run(call)
+    return time.perf_counter() - started, result
+
+
+def peak_memory(call) -> int:
+    """Peak bytes traced while running an analyzer coroutine"""
+    tracemalloc.start()
+    try:
+        asyncio.run(call)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--min-speedup', type=float, default=5.0,
+                        help='required end-to-end speedup of the vectorized engine over the original')
+    args = parser.parse_args()
+
+    print(f"Generating {args.rows:,} transactions...")
+    transactions = generate_statement(args.rows)
+    engines = {
+        'original': BaselineAnalyzer(),
+        'streaming': BankAnalyzer(vectorized=False),
+        'vectorized': BankAnalyzer(vectorized=True),
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'statement.csv')
+        write_csv(transactions, path)
+        runs = {
+            'file': {name: timed(engine.analyze_file(path)) for name, engine in engines.items()},
+            'dicts': {name: timed(engine.analyze_transactions(transactions))
+                      for name, engine in engines.items()},
+        }
+        memory = {name: peak_memory(engine.analyze_file(path)) for name, engine in engines.items()}
+
+    print(f"{'input':<8}{'engine':<12}{'seconds':>10}{'rows/s':>14}{'found':>8}{'speedup':>9}{'peak MB':>10}")
+    failed = False
+    for source in ('file', 'dicts'):
+        original_time, original_found = runs[source]['original']
+        for name, (seconds, found) in runs[source].items():
+            peak = f"{memory[name] / 2 ** 20:>10.1f}" if source == 'file' else ''
+            print(f"{source:<8}{name:<12}{seconds:>10.2f}{args.rows / seconds:>14,.0f}{len(found):>8}"
+                  f"{original_time / seconds:>8.1f}x{peak}")
+
+        found = {name: len(result) for name, (_, result) in runs[source].items()}
+        speedup = original_time / runs[source]['vectorized'][0]
+        if len(set(found.values())) != 1:
+            print(f"❌ Engines disagree on detected subscriptions ({source}): {found}")
+            failed = True
+        elif speedup < args.min_speedup:
+            print(f"❌ Speedup over the original from {source} {speedup:.1f}x below {args.min_speedup}x")
+            failed = True
+        else:
+            print(f"✅ Speedup over the original from {source} {speedup:.1f}x")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
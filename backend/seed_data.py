@@ -2,6 +2,7 @@ import asyncio
 from datetime import datetime, timedelta
 from app.core.database import AsyncSessionLocal, UserDB, SubscriptionDB, OptimizationDB
 from sqlalchemy import select
+from app.services.subscription_store import bulk_upsert_subscriptions
 import uuid
 
 async def seed_database():
@@ -62,17 +63,13 @@ async def seed_database():
             },
         ]
         
-        # Adicionar assinaturas
-        for sub_data in subscriptions:
-            subscription = SubscriptionDB(
-                user_id=user.id,
-                **sub_data
-            )
-            session.add(subscription)
+        # Adicionar assinaturas (as que o usuário ainda não tem)
+        created = await bulk_upsert_subscriptions(
+            session, user.id, subscriptions, detection_source="manual"
+        )
+        for sub_data in created:
             print(f"Criando assinatura: {sub_data['service_name']}")
         
-        await session.commit()
-        
         # Criar otimizações mock
         optimizations = [
             {
@@ -0,0 +1,31 @@
+"""
+Shared fixtures. The settings are read at import time, so the test
+database and the offline LLM stand-in are configured before any app
+module is imported.
+"""
+import os
+import tempfile
+
+os.environ.setdefault('DATABASE_URL', f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/test.db")
+os.environ.setdefault('DEBUG', 'false')
+os.environ.setdefault('LLM_BACKEND', 'local')
+os.environ.setdefault('LLM_LOCAL_LATENCY_MS', '0')
+
+import pytest
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+@pytest.fixture
+async def database():
+    """Create every table; connections are closed with the test's event loop"""
+    import app.main  # noqa: F401 - registers every model on Base.metadata
+    from app.core.database import Base, engine
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
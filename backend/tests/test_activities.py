@@ -0,0 +1,40 @@
+import uuid
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_feed_pages_by_cursor_the_browser_can_read(database):
+    from app.core.database import AsyncSessionLocal, UserDB
+    from app.core.security import create_access_token
+    from app.main import app
+    from app.models.activity import Activity
+
+    started = datetime(2024, 1, 1)
+    async with AsyncSessionLocal() as db:
+        user = UserDB(email=f"{uuid.uuid4()}@activities.test", hashed_password='x')
+        db.add(user)
+        await db.flush()
+        db.add_all(Activity(id=str(uuid.uuid4()), user_id=user.id, activity_type='ai_analysis',
+                            title=f"Activity {index}", created_at=started + timedelta(minutes=index),
+                            read=index % 2)
+                   for index in range(5))
+        await db.commit()
+    headers = {'Authorization': f"Bearer {create_access_token({'sub': user.email})}",
+               'Origin': 'http://localhost:3000'}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test',
+                                 headers=headers) as client:
+        titles, cursor = [], None
+        while True:
+            response = await client.get('/api/activities/', params={'limit': 2, **({'before': cursor} if cursor else {})})
+            assert 'x-next-cursor' in response.headers.get('access-control-expose-headers', '').lower()
+            titles += [activity['title'] for activity in response.json()]
+            cursor = response.headers.get('x-next-cursor')
+            if not cursor:
+                break
+        assert titles == [f"Activity {index}" for index in reversed(range(5))]
+        assert (await client.get('/api/activities/unread-count')).json()['count'] == 3
@@ -0,0 +1,136 @@
+import uuid
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def statements():
+    """SQL statements run on the app engine during the test"""
+    from sqlalchemy import event
+
+    from app.core.database import engine
+
+    seen = []
+
+    def record(conn, cursor, statement, *args):
+        seen.append(statement)
+
+    event.listen(engine.sync_engine, 'after_cursor_execute', record)
+    yield seen
+    event.remove(engine.sync_engine, 'after_cursor_execute', record)
+
+
+async def _user(email=None, risk_tolerance=0.5):
+    from app.core.database import AsyncSessionLocal, UserDB
+
+    async with AsyncSessionLocal() as db:
+        user = UserDB(email=email or f"{uuid.uuid4()}@auth.test", hashed_password='x',
+                      risk_tolerance=risk_tolerance)
+        db.add(user)
+        await db.commit()
+        return user.id, user.email
+
+
+def _token(email, user_id=None):
+    from app.core.security import create_access_token
+
+    return create_access_token({'sub': email, **({'user_id': user_id} if user_id else {})})
+
+
+async def _update_user(user_id, **values):
+    from app.core.database import AsyncSessionLocal, UserDB
+
+    async with AsyncSessionLocal() as db:
+        user = await db.get(UserDB, user_id)
+        for name, value in values.items():
+            setattr(user, name, value)
+        await db.commit()
+
+
+async def _rejected(token) -> bool:
+    from fastapi import HTTPException
+
+    from app.core.security import authenticate_token
+
+    try:
+        await authenticate_token(token)
+    except HTTPException as e:
+        return e.status_code == 401
+    return False
+
+
+async def test_cached_user_needs_no_query(database, statements):
+    from app.core.security import authenticate_token
+
+    user_id, email = await _user()
+    token = _token(email, user_id)
+
+    statements.clear()
+    first = await authenticate_token(token)
+    assert len(statements) == 1
+    statements.clear()
+    second = await authenticate_token(token)
+    assert statements == []
+    assert second is first and first.id == user_id
+
+    # Tokens from before user_id was added resolve by email, and share the entry
+    assert await authenticate_token(_token(email)) is first
+    assert statements == []
+
+
+async def test_orm_update_and_delete_invalidate_the_cached_user(database):
+    from app.core.database import AsyncSessionLocal, UserDB
+    from app.core.security import authenticate_token
+
+    user_id, email = await _user(risk_tolerance=0.5)
+    token = _token(email, user_id)
+    assert (await authenticate_token(token)).risk_tolerance == 0.5
+
+    await _update_user(user_id, risk_tolerance=0.9)
+    assert (await authenticate_token(token)).risk_tolerance == 0.9
+
+    async with AsyncSessionLocal() as db:
+        await db.delete(await db.get(UserDB, user_id))
+        await db.commit()
+    assert await _rejected(token)
+
+
+async def test_token_for_a_changed_email_is_rejected(database):
+    from app.core.security import authenticate_token
+
+    user_id, email = await _user()
+    old_token = _token(email, user_id)
+    await authenticate_token(old_token)
+
+    new_email = f"{uuid.uuid4()}@auth.test"
+    await _update_user(user_id, email=new_email)
+    assert await _rejected(old_token)
+    assert (await authenticate_token(_token(new_email, user_id))).id == user_id
+
+    # The old address is taken by a new account: its cached entry does not
+    # make the first account's old token valid for it
+    other_id, _ = await _user(email=email)
+    assert (await authenticate_token(_token(email, other_id))).id == other_id
+    assert await _rejected(old_token)
+
+
+async def test_savings_update_keeps_the_cached_user_valid(database):
+    from app.api.endpoints.optimizations import update_user_stats
+    from app.core.database import AsyncSessionLocal, UserDB
+    from app.core.security import authenticate_token, user_cache
+
+    user_id, email = await _user(risk_tolerance=0.7)
+    cached = await authenticate_token(_token(email, user_id))
+
+    async with AsyncSessionLocal() as db:
+        await update_user_stats(user_id, 12.5, db)
+        user = await db.get(UserDB, user_id)
+
+    # A Core update skips the listener; none of the cached fields moved
+    assert user.total_savings_to_date == 12.5
+    assert user_cache.get(email) is cached
+    assert (cached.id, cached.email, cached.risk_tolerance, cached.automation_preference) == (
+        user.id, user.email, user.risk_tolerance, user.automation_preference
+    )
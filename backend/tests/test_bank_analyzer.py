@@ -0,0 +1,135 @@
+import csv
+from datetime import datetime
+
+import pytest
+
+from app.services import bank_analyzer
+from app.services.bank_analyzer import (
+    BankAnalyzer,
+    iter_csv_statement,
+    iter_ofx_statement,
+    iter_statement_columns,
+    parse_transaction_date,
+)
+
+pytestmark = pytest.mark.anyio
+
+# Monthly Netflix with two unparseable dates, a price change on Spotify
+# (dd/mm/yyyy), a recurring merchant that is not a known service and
+# one-off purchases.
+STATEMENT = [
+    ('2024-01-05', 'PAGAMENTO NETFLIX.COM', '39.90'),
+    ('05/01/2024', 'Spotify P1234', '21.90'),
+    ('2024-01-09', 'Padaria Pao Quente', '12.50'),
+    ('2024-02-05', 'PAGAMENTO NETFLIX.COM', '39.90'),
+    ('05/02/2024', 'Spotify P1234', '21.90'),
+    ('2024-02-10', 'Academia Local', '99.00'),
+    ('2024-02-31', 'PAGAMENTO NETFLIX.COM', '55.90'),
+    ('2024-03-05', 'PAGAMENTO NETFLIX.COM', '39.90'),
+    ('05/03/2024', 'Spotify P1234', '34.90'),
+    ('2024-03-10', 'Academia Local', '99.00'),
+    ('not a date', 'PAGAMENTO NETFLIX.COM', '39.90'),
+    ('2024-04-05', 'PAGAMENTO NETFLIX.COM', '39.90'),
+    ('2024-04-12', 'Uber One', '9.90'),
+]
+
+
+def _write_csv(path, rows, delimiter=',', quoting=csv.QUOTE_MINIMAL):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, delimiter=delimiter, quoting=quoting)
+        writer.writerow(['Date', 'Description', 'Amount'])
+        writer.writerows(rows)
+    return str(path)
+
+
+def _transactions():
+    return [{'date': d, 'description': desc, 'amount': float(amount)} for d, desc, amount in STATEMENT]
+
+
+def test_parse_transaction_date_formats():
+    assert parse_transaction_date('2024-01-05') == datetime(2024, 1, 5)
+    assert parse_transaction_date('05/01/2024') == datetime(2024, 1, 5)
+    assert parse_transaction_date('20240105120000[-3:BRT]') == datetime(2024, 1, 5, 12)
+    assert parse_transaction_date('20240105') == datetime(2024, 1, 5)
+    assert parse_transaction_date('2024-01-05T23:30:00-03:00') == datetime(2024, 1, 6, 2, 30)
+    assert parse_transaction_date('2024-01-05T10:00:00Z') == datetime(2024, 1, 5, 10)
+    assert parse_transaction_date('2024-02-31') is None
+    assert parse_transaction_date('') is None
+    assert parse_transaction_date(None) is None
+
+
+def test_csv_statement_parsing(tmp_path):
+    path = tmp_path / 'statement.csv'
+    path.write_text(
+        '﻿Data;Descrição;Valor\n'
+        '05/01/2024;"NETFLIX; Premium";"1.234,56"\n'
+        '\n'
+        '06/01/2024;Spotify\n',
+        encoding='utf-8',
+    )
+
+    assert list(iter_csv_statement(str(path))) == [
+        {'date': '05/01/2024', 'description': 'NETFLIX; Premium', 'amount': 1234.56},
+        {'date': '06/01/2024', 'description': 'Spotify', 'amount': 0.0},
+    ]
+
+
+def test_ofx_statement_parsing(tmp_path):
+    path = tmp_path / 'statement.ofx'
+    path.write_text(
+        'OFXHEADER:100\n<OFX><BANKTRANLIST>\n'
+        '<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240105120000[-3:BRT]<TRNAMT>-39.90<NAME>NETFLIX.COM\n'
+        '</STMTTRN>\n'
+        '<STMTTRN>\n<DTPOSTED>20240205</DTPOSTED>\n<TRNAMT>-39.90</TRNAMT>\n'
+        '<MEMO>NETFLIX.COM</MEMO>\n</STMTTRN>\n'
+        '</BANKTRANLIST></OFX>\n',
+        encoding='latin-1',
+    )
+
+    assert list(iter_ofx_statement(str(path))) == [
+        {'date': '20240105120000[-3:BRT]', 'description': 'NETFLIX.COM', 'amount': 39.9},
+        {'date': '20240205', 'description': 'NETFLIX.COM', 'amount': 39.9},
+    ]
+
+
+def test_csv_columns_are_read_in_bounded_chunks(tmp_path):
+    rows = STATEMENT[:4] + [('2024-02-06', 'Loja "Centro", SP', '10.00')] + STATEMENT[4:]
+    path = _write_csv(tmp_path / 'statement.csv', rows)
+
+    chunks = list(iter_statement_columns(path, chunk_rows=3))
+
+    assert [len(dates) for dates, _, _ in chunks] == [3, 3, 3, 3, 2]
+    assert [tuple(column) for chunk in chunks for column in zip(*chunk)] == rows
+
+
+async def test_engines_agree_on_statement_files(tmp_path, monkeypatch):
+    plain = _write_csv(tmp_path / 'plain.csv', STATEMENT, delimiter=';')
+    quoted = _write_csv(tmp_path / 'quoted.csv', STATEMENT, quoting=csv.QUOTE_ALL)
+    streaming, vectorized = BankAnalyzer(vectorized=False), BankAnalyzer(vectorized=True)
+
+    expected = await streaming.analyze_file(plain)
+    assert sorted(sub['service_name'] for sub in expected) == ['Netflix', 'Spotify']
+    netflix = next(sub for sub in expected if sub['service_name'] == 'Netflix')
+    # Undated rows count towards the total and the mean, not the cadence
+    assert netflix['raw_data']['transactions_count'] == 6
+    assert netflix['monthly_cost'] == 42.57
+    assert netflix['next_billing_date'] == '2024-05-06T00:00:00'
+    assert netflix['raw_data']['last_transaction'] == {
+        'date': '2024-04-05', 'description': 'PAGAMENTO NETFLIX.COM', 'amount': 39.9,
+    }
+
+    for chunk_rows in (bank_analyzer.STATEMENT_CHUNK_ROWS, 4):
+        monkeypatch.setattr(bank_analyzer, 'STATEMENT_CHUNK_ROWS', chunk_rows)
+        for path in (plain, quoted):
+            assert await vectorized.analyze_file(path) == expected
+            assert await streaming.analyze_file(path) == expected
+
+
+async def test_engines_agree_on_transactions():
+    streaming, vectorized = BankAnalyzer(vectorized=False), BankAnalyzer(vectorized=True)
+
+    expected = await streaming.analyze_transactions(_transactions())
+
+    assert len(expected) == 2
+    assert await vectorized.analyze_transactions(_transactions()) == expected
+    assert await streaming.analyze_stream(iter(_transactions())) == expected
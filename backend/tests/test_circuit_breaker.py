@@ -0,0 +1,211 @@
+import asyncio
+import uuid
+
+import pytest
+
+from app.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+pytestmark = pytest.mark.anyio
+
+
+async def _fail():
+    raise RuntimeError('provider down')
+
+
+async def _ok():
+    return 'ok'
+
+
+async def _trip(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(RuntimeError):
+            await breaker.call(_fail)
+
+
+async def test_opens_after_threshold_consecutive_failures_and_rejects_while_open():
+    breaker = CircuitBreaker('test-open', failure_threshold=3, reset_seconds=60)
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            await breaker.call(_fail)
+    assert await breaker.call(_ok) == 'ok'  # a success resets the streak
+    await _trip(breaker)
+    assert breaker.state == OPEN and breaker.is_open
+
+    called = False
+
+    async def should_not_run():
+        nonlocal called
+        called = True
+
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(should_not_run)
+    assert not called
+    assert (breaker.counts['opened'], breaker.counts['rejected'], breaker.counts['failures']) == (1, 1, 5)
+
+
+async def test_half_open_lets_a_single_probe_through():
+    breaker = CircuitBreaker('test-probe', failure_threshold=1, reset_seconds=0.05)
+    await _trip(breaker)
+    await asyncio.sleep(0.06)
+    assert breaker.state == HALF_OPEN and not breaker.is_open
+
+    release = asyncio.Event()
+
+    async def slow_probe():
+        await release.wait()
+        return 'probed'
+
+    probe = asyncio.ensure_future(breaker.call(slow_probe))
+    await asyncio.sleep(0)
+    assert breaker.is_open  # the probe holds the only slot
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(_ok)
+
+    release.set()
+    assert await probe == 'probed'
+    assert breaker.state == CLOSED
+
+
+async def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker('test-reopen', failure_threshold=2, reset_seconds=0.05)
+    await _trip(breaker)
+    await asyncio.sleep(0.06)
+
+    with pytest.raises(RuntimeError):
+        await breaker.call(_fail)  # one failure is enough while half-open
+
+    assert breaker.state == OPEN
+    assert breaker.counts['opened'] == 2
+
+
+async def test_cancellation_is_not_a_failure():
+    breaker = CircuitBreaker('test-cancel', failure_threshold=1, reset_seconds=0.05)
+    await _trip(breaker)
+    await asyncio.sleep(0.06)
+
+    # A caller giving up on the half-open probe frees the slot without re-opening
+    probe = asyncio.ensure_future(breaker.call(asyncio.Event().wait))
+    await asyncio.sleep(0)
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    assert breaker.state == HALF_OPEN and not breaker.is_open
+    assert breaker.counts['failures'] == 1
+    assert await breaker.call(_ok) == 'ok'
+    assert breaker.state == CLOSED
+
+
+async def test_slow_calls_count_as_failures_only_with_a_threshold():
+    breaker = CircuitBreaker('test-slow', failure_threshold=2, slow_call_seconds=0.01)
+
+    async def slow():
+        await asyncio.sleep(0.02)
+        return 'late'
+
+    assert await breaker.call(slow, slow_call_seconds=0) == 'late'
+    assert breaker.consecutive_failures == 0
+
+    for _ in range(2):
+        assert await breaker.call(slow) == 'late'  # the answer is still returned
+    assert breaker.state == OPEN
+    assert breaker.counts['slow_calls'] == 2
+
+
+AI_ANSWER = {
+    'current_plan_fit_score': 0.4, 'optimal_plan': 'Standard', 'monthly_savings': 11.0,
+    'yearly_savings': 132.0, 'reasoning': 'Rarely watched in 4K', 'confidence': 0.9,
+    'suggested_actions': ['downgrade'], 'ai_model_used': 'test',
+}
+
+
+async def _subscription():
+    from app.core.database import AsyncSessionLocal, SubscriptionDB, UserDB
+
+    async with AsyncSessionLocal() as db:
+        user = UserDB(email=f"{uuid.uuid4()}@breaker.test", hashed_password='x')
+        db.add(user)
+        await db.flush()
+        subscription = SubscriptionDB(user_id=user.id, service_name='Netflix', service_category='Streaming',
+                                      plan_name='Premium', monthly_cost=55.9, billing_cycle='monthly')
+        db.add(subscription)
+        await db.commit()
+        return subscription
+
+
+def _gate_ai(monkeypatch, release: asyncio.Event):
+    from app.services.gemini_service import gemini_service
+
+    calls = []
+
+    async def optimize_subscription(subscription_data, usage_data=None):
+        calls.append(subscription_data['id'])
+        await release.wait()
+        return dict(AI_ANSWER)
+
+    monkeypatch.setattr(gemini_service, 'optimize_subscription', optimize_subscription)
+    return calls
+
+
+async def test_over_budget_analysis_degrades_then_saves_the_refinement(database, monkeypatch):
+    from sqlalchemy import select
+
+    from app.core.database import AsyncSessionLocal, OptimizationDB
+    from app.services.event_bus import event_bus
+    from app.services.optimizer import SubscriptionOptimizer, _refinements
+
+    optimizer = SubscriptionOptimizer()
+    subscription = await _subscription()
+    release = asyncio.Event()
+    calls = _gate_ai(monkeypatch, release)
+    subscription_events = event_bus.subscribe(subscription.user_id)
+
+    analysis = await optimizer.analyze(subscription, budget=0.05)
+    assert analysis.degraded
+    # A second request while the refinement runs does not start another call
+    assert (await optimizer.analyze(subscription, budget=0.05)).degraded
+    assert calls == [subscription.id]
+
+    release.set()
+    event = await subscription_events.get(timeout=2)
+    assert event['event'] == 'analysis.refined'
+    assert event['data']['subscription_id'] == subscription.id
+    assert not event['data']['degraded']
+    assert subscription.id not in _refinements
+
+    async with AsyncSessionLocal() as db:
+        saved = (await db.execute(
+            select(OptimizationDB).where(OptimizationDB.subscription_id == subscription.id)
+        )).scalars().all()
+    assert [row.action_type for row in saved] == ['downgrade']
+    assert not saved[0].presented_to_user
+
+
+async def test_zero_budget_answers_with_the_rules_at_once(database, monkeypatch):
+    from app.services.optimizer import SubscriptionOptimizer
+
+    optimizer = SubscriptionOptimizer()
+    subscription = await _subscription()
+    release = asyncio.Event()
+    release.set()  # the AI would answer on its first await
+    _gate_ai(monkeypatch, release)
+
+    analysis = await optimizer.analyze(subscription, budget=0)
+
+    assert analysis.degraded
+    assert analysis.suggested_actions == optimizer._apply_optimization_rules(subscription)['suggested_actions']
+
+
+async def test_open_breaker_skips_the_ai_call(database, monkeypatch):
+    from app.services.optimizer import SubscriptionOptimizer
+
+    optimizer = SubscriptionOptimizer()
+    subscription = await _subscription()
+    calls = _gate_ai(monkeypatch, asyncio.Event())
+    monkeypatch.setattr(optimizer.gemini, 'breaker', CircuitBreaker('test-optimizer', failure_threshold=1))
+    await _trip(optimizer.gemini.breaker)
+
+    assert (await optimizer.analyze(subscription)).degraded
+    assert (await optimizer.analyze_batch([subscription]))[0].degraded
+    assert calls == []
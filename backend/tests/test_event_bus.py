@@ -0,0 +1,202 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.event_bus import EventBus, event_bus, publish_on_commit
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_publish_reaches_subscribers_of_that_user_only():
+    bus = EventBus(max_queue=10)
+    mine, other = bus.subscribe('u1'), bus.subscribe('u2')
+
+    assert bus.publish('u1', 'activity', {'title': 'hello'}) == 1
+    assert bus.publish('nobody', 'activity', {}) == 0
+
+    message = await mine.get(timeout=1)
+    assert message['event'] == 'activity'
+    assert message['data'] == {'title': 'hello'}
+    assert await other.get(timeout=0.01) is None
+
+
+async def test_full_queue_drops_the_oldest_event():
+    bus = EventBus(max_queue=3)
+    subscription = bus.subscribe('u1')
+
+    for index in range(5):
+        bus.publish('u1', 'tick', index)
+
+    assert subscription.dropped == 2
+    assert [(await subscription.get(timeout=1))['data'] for _ in range(3)] == [2, 3, 4]
+
+
+async def test_unsubscribe_stops_delivery():
+    bus = EventBus(max_queue=10)
+    subscription = bus.subscribe('u1')
+    bus.unsubscribe(subscription)
+
+    assert bus.publish('u1', 'activity', {}) == 0
+    assert bus.stats()['connections'] == 0
+
+
+async def _user(session_factory) -> str:
+    from app.core.database import UserDB
+
+    async with session_factory() as db:
+        user = UserDB(email=f"{uuid.uuid4()}@events.test", hashed_password='x')
+        db.add(user)
+        await db.commit()
+        return user.id
+
+
+async def test_publish_on_commit_waits_for_the_commit(database):
+    from app.core.database import AsyncSessionLocal
+
+    user_id = await _user(AsyncSessionLocal)
+    subscription = event_bus.subscribe(user_id)
+    try:
+        async with AsyncSessionLocal() as db:
+            publish_on_commit(db, user_id, 'negotiation', {'status': 'completed'})
+            assert subscription.queue.empty()
+            await db.commit()
+
+        message = await subscription.get(timeout=1)
+        assert message['event'] == 'negotiation'
+    finally:
+        event_bus.unsubscribe(subscription)
+
+
+async def test_activity_insert_is_published_on_commit_not_on_rollback(database):
+    from app.core.database import AsyncSessionLocal
+    from app.models.activity import Activity
+
+    user_id = await _user(AsyncSessionLocal)
+    subscription = event_bus.subscribe(user_id)
+    try:
+        async with AsyncSessionLocal() as db:
+            db.add(Activity(id=str(uuid.uuid4()), user_id=user_id,
+                            activity_type='subscription_added', title='rolled back'))
+            await db.flush()
+            await db.rollback()
+        assert await subscription.get(timeout=0.05) is None
+
+        async with AsyncSessionLocal() as db:
+            db.add(Activity(id=str(uuid.uuid4()), user_id=user_id,
+                            activity_type='subscription_added', title='committed'))
+            await db.commit()
+        message = await subscription.get(timeout=1)
+        assert (message['event'], message['data']['title']) == ('activity', 'committed')
+        assert subscription.queue.empty()
+    finally:
+        event_bus.unsubscribe(subscription)
+
+
+class _Request:
+    """Stands in for the Starlette request; disconnects after `polls` checks"""
+
+    def __init__(self, polls: int):
+        self.polls = polls
+
+    async def is_disconnected(self) -> bool:
+        self.polls -= 1
+        return self.polls < 0
+
+
+async def test_stream_authenticates_through_the_token_cache(database):
+    from fastapi import HTTPException
+    from fastapi.security import HTTPAuthorizationCredentials
+
+    from app.api.endpoints.events import get_stream_user
+    from app.core.database import AsyncSessionLocal, UserDB
+    from app.core.security import create_access_token, token_cache, user_cache
+
+    async with AsyncSessionLocal() as db:
+        user = UserDB(email=f"{uuid.uuid4()}@stream.test", hashed_password='x')
+        db.add(user)
+        await db.commit()
+        user_id, email = user.id, user.email
+    token = create_access_token({"sub": email})
+    bearer = HTTPAuthorizationCredentials(scheme='Bearer', credentials=token)
+
+    assert (await get_stream_user(ticket=None, credentials=bearer)).id == user_id
+    assert token_cache.get(token) and user_cache.get(email).id == user_id
+
+    with pytest.raises(HTTPException):
+        await get_stream_user(ticket=None, credentials=None)
+    # An access token is not a ticket
+    with pytest.raises(HTTPException):
+        await get_stream_user(ticket=token, credentials=None)
+
+
+async def test_stream_tickets_work_once_and_only_for_the_stream(database, monkeypatch):
+    import httpx
+    from fastapi import HTTPException
+
+    from app.api.endpoints.events import get_stream_user
+    from app.core.config import settings
+    from app.core.database import AsyncSessionLocal, UserDB
+    from app.core.security import create_access_token, create_stream_ticket, redeem_stream_ticket
+    from app.main import app
+
+    async with AsyncSessionLocal() as db:
+        user = UserDB(email=f"{uuid.uuid4()}@stream.test", hashed_password='x')
+        db.add(user)
+        await db.commit()
+        user_id, email = user.id, user.email
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+        headers = {'Authorization': f"Bearer {create_access_token({'sub': email, 'user_id': user_id})}"}
+        issued = (await client.post('/api/events/ticket', headers=headers)).json()
+        assert issued['expires_in'] == settings.EVENT_STREAM_TICKET_TTL_SECONDS
+        ticket = issued['ticket']
+
+        # A ticket is not a bearer token, and the access token no longer goes in the URL
+        assert (await client.get('/api/auth/me', headers={'Authorization': f"Bearer {ticket}"})).status_code == 401
+        assert (await client.get('/api/events/stream', params={'token': headers['Authorization'][7:]})).status_code == 401
+        assert (await client.post('/api/events/ticket')).status_code == 401
+
+    assert (await get_stream_user(ticket=ticket, credentials=None)).id == user_id
+    with pytest.raises(HTTPException) as used:
+        await get_stream_user(ticket=ticket, credentials=None)
+    assert used.value.status_code == 401
+
+    monkeypatch.setattr(settings, 'EVENT_STREAM_TICKET_TTL_SECONDS', -1)
+    expired = create_stream_ticket(SimpleNamespace(id=user_id, email=email))
+    with pytest.raises(HTTPException):
+        await redeem_stream_ticket(expired)
+
+
+async def test_stream_unsubscribes_when_the_client_disconnects(database):
+    from app.api.endpoints.events import stream_events
+    from app.core.database import AsyncSessionLocal, UserDB
+
+    async with AsyncSessionLocal() as db:
+        user = UserDB(email=f"{uuid.uuid4()}@stream.test", hashed_password='x', unread_activities=3)
+        db.add(user)
+        await db.commit()
+        user = SimpleNamespace(id=user.id)
+    response = await stream_events(_Request(polls=1), user)
+    body = response.body_iterator
+
+    ready = await body.__anext__()
+    assert ready.startswith('event: ready') and '"unread_count": 3' in ready
+    assert event_bus.publish(user.id, 'activity', {'title': 'live'}) == 1
+    assert 'live' in await body.__anext__()
+
+    with pytest.raises(StopAsyncIteration):
+        await body.__anext__()
+    assert event_bus.publish(user.id, 'activity', {}) == 0
+
+
+async def test_stream_unsubscribes_when_the_response_is_closed(database):
+    from app.api.endpoints.events import stream_events
+
+    user = SimpleNamespace(id=f"stream-{uuid.uuid4()}")
+    response = await stream_events(_Request(polls=100), user)
+    body = response.body_iterator
+
+    await body.__anext__()
+    await body.aclose()  # what the server does when the connection drops
+    assert event_bus.publish(user.id, 'activity', {}) == 0
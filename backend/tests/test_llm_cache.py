@@ -0,0 +1,136 @@
+import pytest
+
+from app.services.llm_cache import LLMResponseCache
+from app.utils import cache as cache_module
+from app.utils.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module.time, 'monotonic', clock)
+    return clock
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = TTLCache(max_entries=10, ttl=60)
+    cache.set('default', 1)
+    cache.set('short', 2, ttl=5)
+
+    clock.now += 5
+    assert cache.get('short', 'gone') == 'gone'
+    assert cache.get('default') == 1
+
+    clock.now += 55
+    assert cache.get('default') is None
+    assert len(cache) == 0  # expired entries are dropped on lookup
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TTLCache(max_entries=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1  # now b is the least recently used
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.evictions == 1
+
+    disabled = TTLCache(max_entries=0)
+    disabled.set('a', 1)
+    assert len(disabled) == 0
+
+
+def test_hit_and_miss_counters(clock):
+    cache = TTLCache(max_entries=10, ttl=60)
+    cache.set('a', 1)
+    cache.get('a')
+    cache.get('a')
+    cache.get('missing')
+    clock.now += 60
+    cache.get('a')  # an expired entry is a miss
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (2, 2, 0)
+    assert stats['hit_rate'] == 0.5
+
+
+@pytest.mark.anyio
+async def test_equivalent_inputs_are_computed_once():
+    cache = LLMResponseCache(max_entries=10, ttl=60, db_path='', model='test-model')
+    computed = []
+
+    async def compute():
+        computed.append(1)
+        return {'monthly_savings': 10, 'suggested_actions': ['downgrade']}
+
+    first = await cache.get_or_compute('optimization', {'service': 'Netflix  Premium'}, compute)
+    first['suggested_actions'].append('annotated by the caller')
+    second = await cache.get_or_compute('optimization', {'service': 'netflix premium'}, compute)
+
+    assert len(computed) == 1
+    assert second == {'monthly_savings': 10, 'suggested_actions': ['downgrade']}
+    assert cache.make_key('optimization', 'x') != cache.make_key('receipt', 'x')
+    assert cache.make_key('optimization', 'x') != LLMResponseCache(model='other').make_key('optimization', 'x')
+    assert cache.stats()['kinds'] == {'optimization': {'hits': 1, 'misses': 1}}
+
+
+@pytest.mark.anyio
+async def test_failed_computations_are_not_cached():
+    cache = LLMResponseCache(max_entries=10, ttl=60, db_path='')
+
+    async def fail():
+        raise TimeoutError('model too slow')
+
+    async def answer():
+        return {'ok': True}
+
+    with pytest.raises(TimeoutError):
+        await cache.get_or_compute('optimization', 'x', fail)
+    assert await cache.get_or_compute('optimization', 'x', answer) == {'ok': True}
+
+
+@pytest.mark.anyio
+async def test_disk_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / 'llm_cache.db')
+    await LLMResponseCache(ttl=60, db_path=path).set('receipt', 'template', {'service': 'Netflix'})
+
+    restarted = LLMResponseCache(ttl=60, db_path=path)
+    assert await restarted.get('receipt', 'template') == {'service': 'Netflix'}
+    assert restarted.disk_hits == 1
+
+    # Promoted to memory: the next read does not touch the disk
+    assert await restarted.get('receipt', 'template') == {'service': 'Netflix'}
+    assert restarted.disk_hits == 1
+    assert restarted.stats()['disk'] == {'enabled': True, 'hits': 1, 'errors': 0}
+
+
+@pytest.mark.anyio
+async def test_expired_disk_entries_miss_and_are_purged(tmp_path):
+    path = str(tmp_path / 'llm_cache.db')
+    cache = LLMResponseCache(ttl=60, db_path=path)
+    cache.disk.set(cache.make_key('receipt', 'old'), 'receipt', {'stale': True}, ttl=-1)
+    await cache.set('receipt', 'new', {'fresh': True})
+
+    assert await LLMResponseCache(ttl=60, db_path=path).get('receipt', 'old') is None
+    assert cache.disk.purge_expired() == 1
+    assert await LLMResponseCache(ttl=60, db_path=path).get('receipt', 'new') == {'fresh': True}
+
+
+@pytest.mark.anyio
+async def test_disk_errors_fall_back_to_memory(tmp_path):
+    cache = LLMResponseCache(ttl=60, db_path=str(tmp_path))  # a directory is not a database
+
+    await cache.set('receipt', 'x', {'service': 'Netflix'})
+    assert await cache.get('receipt', 'x') == {'service': 'Netflix'}
+    assert await cache.get('receipt', 'y') is None
+    assert cache.disk_errors == 2
@@ -0,0 +1,55 @@
+import json
+import os
+import threading
+
+import anyio
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def _write(path, price: float, mtime: float):
+    with open(path, 'w') as f:
+        json.dump({'version': str(price), 'services': {'netflix': {'plans': [
+            {'name': 'Basic', 'price': price, 'features': []}]}}}, f)
+    os.utime(path, (mtime, mtime))
+
+
+async def test_reload_runs_off_the_loop_and_serves_the_previous_catalog(tmp_path, monkeypatch):
+    from app.services.market_catalog import MarketCatalog, MarketCatalogProvider
+
+    path = tmp_path / 'catalog.json'
+    _write(path, 20.0, 1_000_000)
+    provider = MarketCatalogProvider(path=str(path), reload_seconds=0)
+    assert provider.current().version == '20.0'  # loaded up front
+
+    loading, release = threading.Event(), threading.Event()
+    load = MarketCatalog.from_file
+
+    def slow_load(file_path):
+        assert threading.current_thread() is not threading.main_thread()
+        loading.set()
+        release.wait(5)
+        return load(file_path)
+
+    monkeypatch.setattr(MarketCatalog, 'from_file', staticmethod(slow_load))
+    _write(path, 25.0, 2_000_000)
+
+    assert provider.current().version == '20.0'
+    await anyio.to_thread.run_sync(loading.wait, 5)
+    assert provider.current().version == '20.0'  # still loading; no second reload queued
+    release.set()
+
+    with anyio.fail_after(5):
+        while provider.current().version != '25.0':
+            await anyio.sleep(0.01)
+
+
+def test_reload_is_inline_without_an_event_loop(tmp_path):
+    from app.services.market_catalog import MarketCatalogProvider
+
+    path = tmp_path / 'catalog.json'
+    _write(path, 20.0, 1_000_000)
+    provider = MarketCatalogProvider(path=str(path), reload_seconds=0)
+    _write(path, 25.0, 2_000_000)
+    assert provider.current().version == '25.0'
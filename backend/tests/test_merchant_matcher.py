@@ -0,0 +1,110 @@
+import json
+import random
+import re
+
+from app.services.merchant_matcher import MerchantMatcher, normalize_text
+
+
+def test_long_texts_are_matched_without_being_cached():
+    matcher = MerchantMatcher({'netflix': [r'netflix'], 'spotify': [r'spotify']}, cache_max_length=32)
+
+    assert matcher.match('PAGAMENTO NETFLIX.COM') == 'netflix'
+    assert matcher.match('Your Spotify receipt. ' + 'Thanks for listening! ' * 20) == 'spotify'
+    assert matcher._match_normalized.cache_info().currsize == 1
+
+
+def test_match_many_agrees_with_match():
+    matcher = MerchantMatcher({'netflix': [r'netflix'], 'amazon': [r'amazon prime'], 'uber': [r'uber one']})
+    texts = ['PAGAMENTO NETFLIX.COM', 'amazon   prime video', 'amazon', 'Uber\tOne', 'padaria', '']
+
+    assert matcher.match_many(texts) == [matcher.match(text) for text in texts]
+    assert matcher.match_many(texts) == ['netflix', 'amazon', None, 'uber', None, None]
+
+
+def _regex_loop(patterns, text):
+    """The matching MerchantMatcher replaced: every pattern of every service, in order"""
+    for service, service_patterns in patterns.items():
+        for pattern in service_patterns:
+            if re.search(pattern, text, re.IGNORECASE):
+                return service
+    return None
+
+
+def test_automaton_agrees_with_the_regex_loop():
+    from app.services.bank_analyzer import BankAnalyzer
+    from app.services.email_parser import EmailParser
+
+    rng = random.Random(7)
+    noise = ['pagamento', 'compra', 'cartao', 'ltda', '*', '.com', 'br', 'assinatura', 'maxi', 'amazon',
+             'uber', 'apple', 'nflx0', 'adobe', 'disney', '+', 'plus', 'prime', 'one', 'video', 'tv', '365']
+    for patterns in (BankAnalyzer.TRANSACTION_PATTERNS, EmailParser.SUBSCRIPTION_PATTERNS):
+        matcher = MerchantMatcher(patterns)
+        aliases = [re.sub(r'\\(.)', r'\1', pattern) for values in patterns.values() for pattern in values]
+        for _ in range(3000):
+            words = rng.choices(noise, k=rng.randint(0, 5)) + rng.choices(aliases, k=rng.randint(0, 2))
+            rng.shuffle(words)
+            text = rng.choice([' ', '', '-']).join(words)
+            if rng.random() < 0.3:
+                text = text.upper()
+            assert matcher.match(text) == _regex_loop(patterns, normalize_text(text)), text
+
+
+def test_first_registered_service_wins():
+    from app.services.email_parser import EmailParser
+
+    matcher = MerchantMatcher(EmailParser.SUBSCRIPTION_PATTERNS)
+
+    # "max" belongs to hbo, which is registered after netflix and disney
+    assert matcher.match('HBO Max and Netflix bundle') == 'netflix'
+    assert matcher.match('Disney+ with Max') == 'disney'
+    assert matcher.match('Your Max receipt') == 'hbo'
+    # A match further into the text still wins on priority
+    assert matcher.match('itunes gift for spotify') == 'spotify'
+
+
+def test_regex_patterns_fall_back_in_priority_order():
+    matcher = MerchantMatcher({
+        'prime': [r'prime\s*video'],
+        'netflix': ['netflix'],
+        'telecom': [r'\bvivo\b', r'claro\s+(tv|net)'],
+    })
+
+    assert matcher.match('AMAZON PRIMEVIDEO') == 'prime'
+    assert matcher.match('primevideo via netflix') == 'prime'  # a regex can outrank a literal
+    assert matcher.match('netflix on claro tv') == 'netflix'
+    assert matcher.match('Claro  NET fatura') == 'telecom'
+    assert matcher.match('vivo fibra') == 'telecom'
+    assert matcher.match('vivofibra') is None
+    assert matcher.match_many(['claro tv', 'netflix', 'nothing']) == ['telecom', 'netflix', None]
+
+
+def test_aliases_load_from_json_and_csv(tmp_path):
+    json_path = tmp_path / 'aliases.json'
+    json_path.write_text(json.dumps({'netflix': ['NETFLIX.COM BR'], 'crunchyroll': ['crunchyroll', 'cr*anime']}),
+                         encoding='utf-8')
+    csv_path = tmp_path / 'aliases.csv'
+    csv_path.write_text('alias,service\nPAG*SPOTIFY , spotify\n\nincomplete\ncr*anime,crunchyroll\n',
+                        encoding='utf-8')
+
+    from_json = MerchantMatcher({'netflix': ['netflix'], 'spotify': ['spotify']})
+    assert from_json.load_aliases(str(json_path)) == 3
+    assert from_json.match('CR*ANIME 1234') == 'crunchyroll'  # aliases are literal text
+    assert from_json.match('crunchyroll netflix') == 'netflix'  # aliases of new services rank last
+
+    from_csv = MerchantMatcher({'netflix': ['netflix'], 'spotify': ['spotify']})
+    assert from_csv.load_aliases(str(csv_path)) == 2
+    assert from_csv.match('pag*spotify') == 'spotify'
+    assert from_csv.match('cr*anime') == 'crunchyroll'
+
+
+def test_configured_alias_file_is_loaded(tmp_path, monkeypatch):
+    from app.core.config import settings
+
+    path = tmp_path / 'aliases.csv'
+    path.write_text('PAG*NFLX,netflix\n', encoding='utf-8')
+    monkeypatch.setattr(settings, 'MERCHANT_ALIASES_PATH', str(path))
+    assert MerchantMatcher.from_settings({'netflix': ['netflix']}).match('PAG*NFLX 09/24') == 'netflix'
+
+    # A missing file is logged, not fatal
+    monkeypatch.setattr(settings, 'MERCHANT_ALIASES_PATH', str(tmp_path / 'missing.json'))
+    assert MerchantMatcher.from_settings({'netflix': ['netflix']}).match('netflix') == 'netflix'
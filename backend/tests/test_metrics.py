@@ -0,0 +1,51 @@
+import anyio
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def _requests_recorded() -> int:
+    from app.core.metrics import request_latency
+
+    series = request_latency._series.get(("GET", "unmatched", 200))
+    return series[-1] if series else 0
+
+
+async def _serve(content_type: bytes, started: anyio.Event, closed: anyio.Event):
+    """A response that stays open until closed is set"""
+    from app.core.metrics import RequestMetricsMiddleware
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", content_type)]})
+        await receive()
+        await send({"type": "http.response.body", "body": b""})
+
+    async def receive():
+        await closed.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            started.set()
+
+    await RequestMetricsMiddleware(app)({"type": "http", "method": "GET", "path": "/open"}, receive, send)
+
+
+@pytest.mark.parametrize("content_type, recorded_while_open", [
+    (b"text/event-stream; charset=utf-8", True),
+    (b"application/json", False),
+])
+async def test_event_streams_are_timed_to_the_response_start(content_type, recorded_while_open):
+    from app.core import metrics
+
+    before, in_flight = _requests_recorded(), metrics._in_flight
+    started, closed = anyio.Event(), anyio.Event()
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(_serve, content_type, started, closed)
+        await started.wait()
+        assert _requests_recorded() == before + recorded_while_open
+        assert metrics._in_flight == in_flight + (not recorded_while_open)
+        closed.set()
+    assert _requests_recorded() == before + 1
+    assert metrics._in_flight == in_flight
@@ -0,0 +1,75 @@
+import uuid
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+# What the schema gained after the first release
+ADDED_COLUMNS = ('users.potential_savings', 'users.unread_activities', 'negotiations.message_count')
+ADDED_INDEXES = ('uq_subscriptions_user_service', 'ix_activities_user_created', 'ix_activities_user_unread')
+ADDED_TABLES = ('negotiation_messages', 'monthly_snapshots', 'report_artifacts')
+
+
+async def _downgrade_to_first_release(conn):
+    from sqlalchemy import text
+
+    for index in ADDED_INDEXES:
+        await conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+    for name in ADDED_COLUMNS:
+        table, column = name.split('.')
+        await conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+    for table in ADDED_TABLES:
+        await conn.execute(text(f"DROP TABLE {table}"))
+
+
+async def test_upgrade_adds_columns_and_indexes_and_backfills(database):
+    from sqlalchemy import func, inspect, select, text
+
+    from app.core.database import AsyncSessionLocal, NegotiationDB, OptimizationDB, SubscriptionDB, UserDB
+    from app.core.migrations import upgrade_schema
+
+    async with database.begin() as conn:
+        await _downgrade_to_first_release(conn)
+        await conn.execute(text(
+            "INSERT INTO users (id, email, hashed_password, total_subscriptions) VALUES ('u-old', :email, 'x', 0)"
+        ), {'email': f"{uuid.uuid4()}@migrations.test"})
+        for subscription_id, status in (('s-cancelled', 'cancelled'), ('s-active', 'active')):
+            await conn.execute(text(
+                "INSERT INTO subscriptions (id, user_id, service_name, service_category, plan_name, "
+                "monthly_cost, billing_cycle, status, created_at) "
+                "VALUES (:id, 'u-old', 'Netflix', 'Streaming', 'Premium', 55.9, 'monthly', :status, :id)"
+            ), {'id': subscription_id, 'status': status})
+        await conn.execute(text(
+            "INSERT INTO optimizations (id, subscription_id, user_id, action_type, monthly_savings, executed) "
+            "VALUES ('o-old', 's-cancelled', 'u-old', 'downgrade', 10, 0)"
+        ))
+        await conn.execute(text(
+            "INSERT INTO negotiations (id, optimization_id, subscription_id, user_id, provider_name) "
+            "VALUES ('n-old', 'o-old', 's-active', 'u-old', 'Netflix')"
+        ))
+        await conn.execute(text(
+            "INSERT INTO activities (id, user_id, activity_type, title, read) "
+            "VALUES ('a-old', 'u-old', 'ai_analysis', 'Old', 0)"
+        ))
+
+    preview = await upgrade_schema(fix=False)
+    assert set(preview['columns']) == set(ADDED_COLUMNS)
+    assert set(preview['indexes']) == set(ADDED_INDEXES)
+    assert set(preview['tables']) == set(ADDED_TABLES)
+
+    report = await upgrade_schema()
+    assert report['subscriptions']['rows_removed'] == 1
+    remaining = await upgrade_schema(fix=False)
+    assert remaining['tables'] == remaining['columns'] == remaining['indexes'] == []
+
+    async with database.connect() as conn:
+        indexes = await conn.run_sync(lambda c: {i['name'] for i in inspect(c).get_indexes('activities')})
+    assert {'ix_activities_user_created', 'ix_activities_user_unread'} <= indexes
+
+    async with AsyncSessionLocal() as db:
+        user = await db.get(UserDB, 'u-old')
+        assert (user.total_subscriptions, user.potential_savings, user.unread_activities) == (1, 10, 1)
+        assert (await db.get(NegotiationDB, 'n-old')).message_count == 0
+        assert await db.get(SubscriptionDB, 's-cancelled') is None
+        moved = await db.scalar(select(func.count()).where(OptimizationDB.subscription_id == 's-active'))
+        assert moved == 1
@@ -0,0 +1,253 @@
+import json
+import uuid
+from datetime import datetime
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+YEAR, MONTH = 2024, 3
+
+
+async def _seed_user() -> str:
+    """A user with subscriptions, activities and negotiations in and around March 2024"""
+    from app.core.database import AsyncSessionLocal, NegotiationDB, SubscriptionDB, UserDB
+    from app.models.activity import Activity as ActivityDB
+
+    async with AsyncSessionLocal() as db:
+        user = UserDB(email=f"{uuid.uuid4()}@report.test", hashed_password='x')
+        db.add(user)
+        await db.flush()
+
+        for name, category, cost, created, status in [
+            ('Netflix', 'Streaming', 55.9, datetime(2023, 11, 2), 'active'),
+            ('Spotify', 'Music', 21.9, datetime(2024, 1, 15), 'active'),
+            ('Max', 'Streaming', 34.9, datetime(2024, 3, 10), 'active'),
+            ('Deezer', 'Music', 0.1, datetime(2024, 3, 20), 'active'),
+            ('Globoplay', 'Streaming', 24.9, datetime(2023, 5, 1), 'cancelled'),
+        ]:
+            db.add(SubscriptionDB(user_id=user.id, service_name=name, service_category=category,
+                                  plan_name='Premium', monthly_cost=cost, billing_cycle='monthly',
+                                  status=status, created_at=created))
+
+        # 14 in March over three types, one either side of it
+        types = ['subscription_added'] * 6 + ['ai_analysis'] * 5 + ['email_connected'] * 3
+        for day, activity_type in enumerate(types, start=1):
+            db.add(ActivityDB(id=str(uuid.uuid4()), user_id=user.id, activity_type=activity_type,
+                              title=f"{activity_type} {day}", description=f"March {day}",
+                              created_at=datetime(2024, 3, day, 9, 30)))
+        for created in (datetime(2024, 2, 29, 23, 59), datetime(2024, 4, 1)):
+            db.add(ActivityDB(id=str(uuid.uuid4()), user_id=user.id, activity_type='ai_analysis',
+                              title='Outside the month', created_at=created))
+
+        for status, accepted, offer, created in [
+            ('accepted', True, {'plan': 'Standard', 'savings': 12.5}, datetime(2024, 3, 3)),
+            ('accepted', True, json.dumps({'plan': 'Basic', 'savings': 7.25}), datetime(2024, 3, 4)),
+            ('accepted', True, {'plan': 'Annual'}, datetime(2024, 3, 5)),
+            ('accepted', True, 'not json', datetime(2024, 3, 6)),
+            ('accepted', True, {}, datetime(2024, 3, 7)),
+            ('in_progress', False, None, datetime(2024, 3, 8)),
+            ('in_progress', False, None, datetime(2024, 3, 9)),
+            ('accepted', True, {'savings': 99.0}, datetime(2024, 4, 2)),
+        ]:
+            db.add(NegotiationDB(optimization_id='opt', subscription_id='sub', user_id=user.id,
+                                 provider_name='Provider', status=status, offer_accepted=accepted,
+                                 final_offer=offer, created_at=created))
+        await db.commit()
+        return user.id
+
+
+async def _reference_report(db, user_id: str, year: int, month: int):
+    """The report as it was computed before the grouped queries, from ORM rows"""
+    from sqlalchemy import and_, select
+
+    from app.core.database import NegotiationDB, SubscriptionDB
+    from app.models.activity import Activity as ActivityDB
+
+    month_start = datetime(year, month, 1)
+    month_end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+
+    active_subs = (await db.execute(select(SubscriptionDB).where(
+        and_(SubscriptionDB.user_id == user_id, SubscriptionDB.status == 'active')
+    ))).scalars().all()
+    total_monthly_spend = sum(sub.monthly_cost for sub in active_subs)
+    spending_by_category = {}
+    for sub in active_subs:
+        category = sub.service_category
+        spending_by_category[category] = spending_by_category.get(category, 0) + sub.monthly_cost
+    active_subs_list = [
+        {"id": str(sub.id), "service_name": sub.service_name, "plan_name": sub.plan_name,
+         "monthly_cost": sub.monthly_cost, "category": sub.service_category, "status": sub.status}
+        for sub in active_subs
+    ]
+
+    activities = (await db.execute(select(ActivityDB).where(
+        and_(ActivityDB.user_id == user_id, ActivityDB.created_at >= month_start,
+             ActivityDB.created_at < month_end)
+    ).order_by(ActivityDB.created_at.desc()))).scalars().all()
+    activities_summary = {}
+    for act in activities:
+        activities_summary[act.activity_type] = activities_summary.get(act.activity_type, 0) + 1
+    recent_activities = [
+        {"id": str(act.id), "type": act.activity_type, "title": act.title,
+         "description": act.description, "created_at": act.created_at.isoformat()}
+        for act in activities[:10]
+    ]
+
+    negotiations = (await db.execute(select(NegotiationDB).where(
+        and_(NegotiationDB.user_id == user_id, NegotiationDB.created_at >= month_start,
+             NegotiationDB.created_at < month_end)
+    ))).scalars().all()
+    total_savings = 0
+    completed_negotiations = 0
+    for neg in negotiations:
+        if neg.offer_accepted and neg.final_offer:
+            try:
+                final_offer = json.loads(neg.final_offer) if isinstance(neg.final_offer, str) else neg.final_offer
+                total_savings += final_offer.get('savings', 0)
+                completed_negotiations += 1
+            except Exception:
+                pass
+    negotiations_summary = {
+        "total": len(negotiations),
+        "completed": completed_negotiations,
+        "in_progress": len([n for n in negotiations if n.status == 'in_progress']),
+        "total_savings": total_savings,
+    }
+
+    prev_month, prev_year = (month - 1, year) if month > 1 else (12, year - 1)
+    prev_subs = (await db.execute(select(SubscriptionDB).where(
+        and_(SubscriptionDB.user_id == user_id, SubscriptionDB.status == 'active',
+             SubscriptionDB.created_at < month_start)
+    ))).scalars().all()
+    prev_total_spend = sum(sub.monthly_cost for sub in prev_subs)
+
+    return {
+        "total_monthly_spend": round(total_monthly_spend, 2),
+        "active_subscriptions": len(active_subs),
+        "total_savings": round(total_savings, 2),
+        "negotiations_completed": completed_negotiations,
+        "month": month_start.strftime("%B"),
+        "year": year,
+        "spending_by_category": spending_by_category,
+        "active_subscriptions_list": active_subs_list,
+        "activities_summary": activities_summary,
+        "recent_activities": recent_activities,
+        "negotiations_summary": negotiations_summary,
+        "previous_month_comparison": {
+            "previous_month": prev_month,
+            "previous_year": prev_year,
+            "previous_spend": prev_total_spend,
+            "spend_change": total_monthly_spend - prev_total_spend,
+            "spend_change_percent": ((total_monthly_spend - prev_total_spend) / prev_total_spend * 100)
+            if prev_total_spend > 0 else 0,
+        },
+    }
+
+
+@pytest.fixture
+def statements():
+    """SQL statements run on the app engine during the test"""
+    from sqlalchemy import event
+
+    from app.core.database import engine
+
+    seen = []
+
+    def record(conn, cursor, statement, *args):
+        seen.append(statement)
+
+    event.listen(engine.sync_engine, 'after_cursor_execute', record)
+    yield seen
+    event.remove(engine.sync_engine, 'after_cursor_execute', record)
+
+
+async def test_report_matches_the_row_by_row_report(database):
+    from app.core.database import AsyncSessionLocal
+    from app.services.monthly_report import build_monthly_report
+
+    user_id = await _seed_user()
+
+    async with AsyncSessionLocal() as db:
+        for year, month in ((YEAR, MONTH), (2024, 4), (2024, 1), (2023, 12)):
+            expected = await _reference_report(db, user_id, year, month)
+            assert await build_monthly_report(db, user_id, year, month) == expected
+
+    # December 2023: only Netflix was active before the month
+    assert expected['previous_month_comparison']['previous_spend'] == 55.9
+    async with AsyncSessionLocal() as db:
+        report = await build_monthly_report(db, user_id, YEAR, MONTH)
+    assert report['activities_summary'] == {'subscription_added': 6, 'ai_analysis': 5, 'email_connected': 3}
+    assert [act['description'] for act in report['recent_activities']] == [f"March {day}" for day in range(14, 4, -1)]
+    assert report['negotiations_summary'] == {'total': 7, 'completed': 3, 'in_progress': 2, 'total_savings': 19.75}
+    assert report['previous_month_comparison']['previous_spend'] == pytest.approx(77.8)
+
+
+async def test_report_takes_two_queries(database, statements):
+    from app.core.database import AsyncSessionLocal
+    from app.services.monthly_report import build_monthly_report
+
+    user_id = await _seed_user()
+
+    async with AsyncSessionLocal() as db:
+        # March has JSON-string and empty offers, which need the legacy pass
+        statements.clear()
+        await build_monthly_report(db, user_id, YEAR, MONTH)
+        assert len(statements) == 3
+        statements.clear()
+        await build_monthly_report(db, user_id, 2024, 4)
+        assert len(statements) == 2
+
+
+async def test_cached_report_is_dropped_by_writes_it_shows(database):
+    from sqlalchemy import select
+
+    from app.core.database import AsyncSessionLocal, SubscriptionDB
+    from app.models.activity import Activity as ActivityDB
+    from app.services.monthly_report import get_cached_report, invalidate_reports, store_report
+
+    user_id = await _seed_user()
+
+    async def cache():
+        async with AsyncSessionLocal() as db:
+            await store_report(db, user_id, YEAR, MONTH, {'total_monthly_spend': 1.0})
+            await db.commit()
+
+    async def cached():
+        async with AsyncSessionLocal() as db:
+            return await get_cached_report(db, user_id, YEAR, MONTH)
+
+    await cache()
+    assert await cached() == {'total_monthly_spend': 1.0}
+
+    # Marking an activity read and logging a generated report change nothing shown
+    async with AsyncSessionLocal() as db:
+        activity = (await db.execute(select(ActivityDB).where(ActivityDB.user_id == user_id).limit(1))).scalar_one()
+        activity.read = 1
+        db.add(ActivityDB(id=str(uuid.uuid4()), user_id=user_id, activity_type='report_generated',
+                          title='Monthly Report Generated'))
+        await db.commit()
+    assert await cached() is not None
+
+    # An ORM write to a subscription drops it in the same flush
+    async with AsyncSessionLocal() as db:
+        subscription = (await db.execute(
+            select(SubscriptionDB).where(SubscriptionDB.user_id == user_id).limit(1)
+        )).scalar_one()
+        subscription.monthly_cost = 60.0
+        await db.commit()
+    assert await cached() is None
+
+    # So does a new activity
+    await cache()
+    async with AsyncSessionLocal() as db:
+        db.add(ActivityDB(id=str(uuid.uuid4()), user_id=user_id, activity_type='ai_analysis', title='New'))
+        await db.commit()
+    assert await cached() is None
+
+    # Core writes invalidate explicitly
+    await cache()
+    async with AsyncSessionLocal() as db:
+        await invalidate_reports(db, [user_id])
+        await db.commit()
+    assert await cached() is None
@@ -0,0 +1,185 @@
+import uuid
+from datetime import datetime
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def _months_ago(count: int):
+    from app.services.monthly_rollup import add_months, month_start
+
+    return add_months(month_start(datetime.utcnow().date()), -count)
+
+
+def _at(month, day: int = 10) -> datetime:
+    return datetime(month.year, month.month, day)
+
+
+@pytest.fixture
+async def rollup_db(tmp_path):
+    """Session factory over a database of its own, since a rollup covers every user"""
+    import app.main  # noqa: F401 - registers every model on Base.metadata
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.core.database import Base
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/rollup.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def _seed(db) -> str:
+    """A user with a long-running, a recent and a cancelled subscription, and one executed saving"""
+    from app.core.database import OptimizationDB, SubscriptionDB, UserDB
+
+    user = UserDB(email=f"{uuid.uuid4()}@rollup.test", hashed_password='x')
+    db.add(user)
+    await db.flush()
+    for name, cost, started, status, updated in [
+        ('Netflix', 55.9, _at(_months_ago(5)), 'active', None),
+        ('Spotify', 21.9, _at(_months_ago(1)), 'active', None),
+        ('Max', 34.9, _at(_months_ago(4)), 'cancelled', _at(_months_ago(2), 20)),
+    ]:
+        db.add(SubscriptionDB(user_id=user.id, service_name=name, service_category='Streaming',
+                              plan_name='Premium', monthly_cost=cost, billing_cycle='monthly',
+                              status=status, start_date=started, created_at=started,
+                              updated_at=updated or started))
+    db.add(OptimizationDB(subscription_id='sub', user_id=user.id, action_type='downgrade',
+                          monthly_savings=12.0, actual_savings=10.0, executed=True,
+                          execution_date=_at(_months_ago(3))))
+    await db.commit()
+    return user.id
+
+
+async def test_months_count_subscriptions_active_during_them(rollup_db):
+    from app.services.monthly_rollup import compute_month, compute_months
+
+    async with rollup_db() as db:
+        user_id = await _seed(db)
+        other_id = await _seed(db)
+        months = [_months_ago(count) for count in range(6, -1, -1)]
+        expected = {
+            _months_ago(6): None,
+            _months_ago(5): {'spend': 55.9, 'savings': 0.0, 'subscriptions': 1},
+            _months_ago(4): {'spend': 90.8, 'savings': 0.0, 'subscriptions': 2},
+            _months_ago(3): {'spend': 90.8, 'savings': 10.0, 'subscriptions': 2},
+            # Max was cancelled during this month, so it still counts
+            _months_ago(2): {'spend': 90.8, 'savings': 10.0, 'subscriptions': 2},
+            _months_ago(1): {'spend': 77.8, 'savings': 10.0, 'subscriptions': 2},
+            _months_ago(0): {'spend': 77.8, 'savings': 10.0, 'subscriptions': 2},
+        }
+
+        by_month = await compute_months(db, months)
+        for month in months:
+            assert by_month[month].get(user_id) == expected[month]
+            assert by_month[month] == await compute_month(db, month)
+        assert (await compute_months(db, months, user_id)) == {
+            month: {user_id: values} if values else {} for month, values in expected.items()
+        }
+        assert by_month[_months_ago(0)][other_id] == expected[_months_ago(0)]
+
+
+async def test_rollup_writes_only_changed_users(rollup_db):
+    from sqlalchemy import select
+
+    from app.core.database import SubscriptionDB
+    from app.services.monthly_rollup import rollup_month
+
+    current = _months_ago(0)
+    async with rollup_db() as db:
+        user_id = await _seed(db)
+        await _seed(db)
+
+        assert await rollup_month(db, current) == {'inserted': 2, 'updated': 0}
+        assert await rollup_month(db, current) == {'inserted': 0, 'updated': 0}
+
+        subscription = (await db.execute(
+            select(SubscriptionDB).where(SubscriptionDB.user_id == user_id, SubscriptionDB.service_name == 'Netflix')
+        )).scalar_one()
+        subscription.monthly_cost = 45.9
+        await db.commit()
+        assert await rollup_month(db, current) == {'inserted': 0, 'updated': 1}
+
+
+async def test_closed_month_gets_one_final_pass(rollup_db):
+    from sqlalchemy import update
+
+    from app.core.database import MonthlySnapshotDB
+    from app.services.monthly_rollup import close_month, rollup_month
+
+    previous = _months_ago(1)
+    async with rollup_db() as db:
+        await _seed(db)
+        # Never rolled up: left to --backfill
+        assert await close_month(db, previous) is None
+
+        await rollup_month(db, previous)
+        await db.execute(update(MonthlySnapshotDB).values(updated_at=_at(previous, 28)))
+        await db.commit()
+
+        assert await close_month(db, previous) == {'inserted': 0, 'updated': 0}
+        assert await close_month(db, previous) is None  # frozen from now on
+
+
+async def test_backfill_fills_every_month_without_snapshots(rollup_db):
+    from sqlalchemy import func, select
+
+    from app.core.database import MonthlySnapshotDB
+    from app.services.monthly_rollup import run_rollup
+
+    async with rollup_db() as db:
+        await _seed(db)
+
+    summary = await run_rollup(session_factory=rollup_db)
+    assert list(summary['months']) == [_months_ago(0).isoformat()]
+
+    summary = await run_rollup(backfill=True, session_factory=rollup_db)
+    assert list(summary['months']) == [_months_ago(count).isoformat() for count in range(5, -1, -1)]
+    async with rollup_db() as db:
+        assert await db.scalar(select(func.count(func.distinct(MonthlySnapshotDB.month)))) == 6
+
+
+async def test_trends_are_computed_live_until_the_first_rollup(rollup_db):
+    from app.services.monthly_rollup import get_user_trends, rollup_month
+
+    async with rollup_db() as db:
+        user_id = await _seed(db)
+
+        live = await get_user_trends(db, user_id, 6)
+        assert [snapshot.month for snapshot in live] == [_months_ago(count) for count in range(5, -1, -1)]
+        assert [snapshot.spend for snapshot in live] == [55.9, 90.8, 90.8, 90.8, 77.8, 77.8]
+        assert [snapshot.savings for snapshot in live] == [0.0, 0.0, 10.0, 10.0, 10.0, 10.0]
+        assert all(snapshot.id is None for snapshot in live)  # nothing was saved
+
+        for snapshot in live:
+            await rollup_month(db, snapshot.month, commit=False)
+        await db.commit()
+        stored = await get_user_trends(db, user_id, 6)
+        assert all(snapshot.id is not None for snapshot in stored)
+        assert ([(s.month, s.spend, s.savings, s.subscriptions) for s in stored]
+                == [(s.month, s.spend, s.savings, s.subscriptions) for s in live])
+
+
+async def test_trends_endpoint_answers_before_any_rollup(database):
+    import httpx
+
+    from app.core.database import AsyncSessionLocal, UserDB
+    from app.core.security import create_access_token
+    from app.main import app
+
+    async with AsyncSessionLocal() as db:
+        user_id = await _seed(db)
+        email = (await db.get(UserDB, user_id)).email
+
+    headers = {'Authorization': f"Bearer {create_access_token({'sub': email})}"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test',
+                                 headers=headers) as client:
+        response = await client.get('/api/optimizations/dashboard/trends', params={'months': 3})
+
+    assert response.status_code == 200
+    assert [trend['spend'] for trend in response.json()] == [90.8, 77.8, 77.8]
+    assert response.json()[-1]['month'] == _months_ago(0).strftime('%b %Y')
@@ -0,0 +1,93 @@
+import uuid
+
+import httpx
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_chat_history_is_paged_and_sends_return_only_new_messages(database):
+    from app.core.database import AsyncSessionLocal, UserDB
+    from app.core.security import create_access_token
+    from app.main import app
+
+    async with AsyncSessionLocal() as db:
+        user = UserDB(email=f"{uuid.uuid4()}@negotiations.test", hashed_password='x')
+        db.add(user)
+        await db.commit()
+    headers = {'Authorization': f"Bearer {create_access_token({'sub': user.email})}"}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test',
+                                 headers=headers) as client:
+        created = (await client.post('/api/negotiations/', json={
+            'optimization_id': 'o1', 'subscription_id': 's1', 'provider_name': 'Netflix',
+            'current_plan': 'Premium', 'proposed_savings': 10.0,
+        })).json()
+        for turn in range(2):
+            sent = (await client.post(f"/api/negotiations/{created['id']}/message",
+                                      params={'message': f"Turn {turn}"})).json()
+            assert [m['seq'] for m in sent['messages']] == [2 + 2 * turn, 3 + 2 * turn]
+
+        listed = (await client.get('/api/negotiations/')).json()
+        assert listed[0]['messages'] == [] and listed[0]['message_count'] == 5
+
+        latest = (await client.get(f"/api/negotiations/{created['id']}/messages", params={'limit': 2})).json()
+        assert [m['seq'] for m in latest['messages']] == [4, 5] and latest['has_more']
+        older = (await client.get(f"/api/negotiations/{created['id']}/messages",
+                                  params={'before_seq': 4})).json()
+        assert [m['seq'] for m in older['messages']] == [1, 2, 3]
+
+
+def _feed(chunks):
+    from app.services.ai_negotiator import FinalOfferParser
+
+    parser = FinalOfferParser()
+    shown = [parser.feed(chunk) for chunk in chunks]
+    return shown, parser.finish()
+
+
+def test_final_offer_marker_split_across_chunks_is_never_shown():
+    from app.services.ai_negotiator import parse_provider_response
+
+    reply = "We can offer 15% off for a year. FINAL_OFFER:33.90:12 month commitment"
+    marker_at = reply.index('FINAL_OFFER:')
+    for first in range(1, len(reply)):
+        for second in range(first, len(reply), 7):
+            shown, parsed = _feed([reply[:first], reply[first:second], reply[second:]])
+            assert ''.join(shown) == reply[:marker_at]
+            assert parsed == parse_provider_response(reply)
+
+    assert parsed == {'content': 'We can offer 15% off for a year.', 'ready_for_offer': True,
+                      'offer_price': 33.9, 'offer_terms': '12 month commitment'}
+    # One character at a time
+    shown, parsed = _feed(list(reply))
+    assert ''.join(shown) == reply[:marker_at] and parsed['offer_price'] == 33.9
+
+
+def test_stream_without_a_marker_shows_everything():
+    reply = "Let me check with my supervisor about FINAL"
+    shown, parsed = _feed(["Let me check with ", "my supervisor about FINAL"])
+
+    # The tail that could have started the marker is held back until the end
+    assert ''.join(shown) == "Let me check with my supervisor about "
+    assert parsed == {'content': reply, 'ready_for_offer': False}
+
+    shown, parsed = _feed(["No discount is available. FINAL_OFFER:", "soon"])
+    assert parsed == {'content': 'No discount is available.', 'ready_for_offer': False}
+
+
+async def test_streamed_reply_yields_tokens_then_the_parsed_offer():
+    from app.services.ai_negotiator import AINegotiator
+
+    class FakeLLM:
+        async def stream(self, prompt, kind):
+            for chunk in ["Best I can do ", "is R$ 30. FIN", "AL_OFF", "ER:30:6 months"]:
+                yield chunk
+
+    negotiator = AINegotiator()
+    negotiator.llm = FakeLLM()
+    events = [event async for event in negotiator.stream_provider_response('Netflix', 'Premium', 10.0, [])]
+
+    assert [kind for kind, _ in events][-1] == 'done'
+    assert ''.join(text for kind, text in events if kind == 'token') == "Best I can do is R$ 30. "
+    assert events[-1][1]['offer_price'] == 30.0 and events[-1][1]['offer_terms'] == '6 months'
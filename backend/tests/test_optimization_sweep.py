@@ -0,0 +1,178 @@
+import json
+import time
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def sweep_db(tmp_path):
+    """Session factory over a database of its own, so the sweep sees only this test's users"""
+    import app.main  # noqa: F401 - registers every model on Base.metadata
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.core.database import Base, SubscriptionDB, UserDB
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/sweep.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with session_factory() as db:
+        for index in range(5):
+            user = UserDB(email=f"user{index}@sweep.test", hashed_password='x')
+            db.add(user)
+            await db.flush()
+            for service in ('Netflix', 'Spotify'):
+                db.add(SubscriptionDB(user_id=user.id, service_name=service, service_category='streaming',
+                                      plan_name='Premium', monthly_cost=39.9, billing_cycle='monthly'))
+        await db.commit()
+
+    yield session_factory
+    await engine.dispose()
+
+
+async def _user_ids(session_factory):
+    from sqlalchemy import select
+
+    from app.core.database import UserDB
+
+    async with session_factory() as db:
+        return sorted((await db.execute(select(UserDB.id))).scalars().all())
+
+
+async def _pending_recommendations(session_factory) -> int:
+    from sqlalchemy import func, select
+
+    from app.core.database import OptimizationDB
+
+    async with session_factory() as db:
+        return await db.scalar(select(func.count()).select_from(OptimizationDB))
+
+
+def _sweep(session_factory, checkpoint, **options):
+    from app.services.optimization_sweep import OptimizationSweep
+
+    options = {'page_size': 2, 'workers': 0, 'use_llm': False, **options}
+    return OptimizationSweep(checkpoint_path=str(checkpoint), session_factory=session_factory, **options)
+
+
+async def test_sweep_pages_through_every_user_and_replaces_pending_rows(sweep_db, tmp_path):
+    checkpoint = tmp_path / 'checkpoint.json'
+    sweep = _sweep(sweep_db, checkpoint)
+    pages = []
+    next_user_page = sweep._next_user_page
+
+    async def record_page(db, after):
+        page = await next_user_page(db, after)
+        pages.append(page)
+        return page
+
+    sweep._next_user_page = record_page
+    summary = await sweep.run()
+
+    assert [len(page) for page in pages] == [2, 2, 1, 0]
+    assert [user_id for page in pages for user_id in page] == await _user_ids(sweep_db)
+    assert (summary['users'], summary['subscriptions'], summary['pages']) == (5, 10, 3)
+    assert summary['recommendations'] == 10  # one bundle suggestion per streaming subscription
+    assert not checkpoint.exists()
+
+    # A second sweep replaces the pending recommendations instead of adding to them
+    await _sweep(sweep_db, checkpoint).run()
+    assert await _pending_recommendations(sweep_db) == 10
+
+
+async def test_pool_shards_give_the_same_recommendations_as_in_process(sweep_db, tmp_path):
+    from concurrent.futures import ProcessPoolExecutor
+    from datetime import datetime
+
+    sweep = _sweep(sweep_db, tmp_path / 'checkpoint.json', page_size=5, workers=2)
+    async with sweep_db() as db:
+        rows = await sweep._load_subscriptions(db, await _user_ids(sweep_db))
+
+    # 10 rows in two shards of 5: the third user's subscriptions are split
+    now = datetime.utcnow()
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        sharded = await sweep._evaluate_rules(pool, rows, now)
+    in_process = await sweep._evaluate_rules(None, rows, now)
+
+    assert sharded == in_process
+    assert [rec['subscription_id'] for rec in sharded] == [row['id'] for row in rows]
+
+
+async def test_interrupted_sweep_resumes_after_the_last_written_page(sweep_db, tmp_path):
+    from app.services.optimization_sweep import OptimizationSweep
+
+    checkpoint = tmp_path / 'checkpoint.json'
+    user_ids = await _user_ids(sweep_db)
+    sweep = _sweep(sweep_db, checkpoint)
+    write = sweep._write
+    writes = 0
+
+    async def fail_on_second_page(db, rows, recommendations):
+        nonlocal writes
+        writes += 1
+        if writes == 2:
+            raise RuntimeError('worker killed')
+        await write(db, rows, recommendations)
+
+    sweep._write = fail_on_second_page
+    with pytest.raises(RuntimeError):
+        await sweep.run()
+
+    saved = json.loads(checkpoint.read_text())
+    assert (saved['users'], saved['pages'], saved['last_user_id']) == (2, 1, user_ids[1])
+
+    resumed = _sweep(sweep_db, checkpoint)
+    loaded = []
+    load_subscriptions = resumed._load_subscriptions
+
+    async def record_load(db, page_user_ids):
+        loaded.extend(page_user_ids)
+        return await load_subscriptions(db, page_user_ids)
+
+    resumed._load_subscriptions = record_load
+    summary = await resumed.run()
+
+    assert loaded == user_ids[2:]
+    assert (summary['users'], summary['subscriptions'], summary['pages']) == (5, 10, 3)
+    assert await _pending_recommendations(sweep_db) == 10
+    assert not checkpoint.exists()
+
+    # --restart ignores a checkpoint left behind
+    checkpoint.write_text(json.dumps(saved))
+    assert (await OptimizationSweep(page_size=2, workers=0, use_llm=False, checkpoint_path=str(checkpoint),
+                                    session_factory=sweep_db).run(resume=False))['users'] == 5
+
+
+async def test_rate_limiter_spaces_acquisitions_after_the_burst():
+    from app.utils.rate_limit import AsyncRateLimiter
+
+    limiter = AsyncRateLimiter(rate=20, burst=2)
+    started = time.monotonic()
+    for _ in range(6):
+        await limiter.acquire()
+    elapsed = time.monotonic() - started
+
+    # Two tokens up front, then one every 50 ms
+    assert 0.18 <= elapsed < 1.0
+
+
+async def test_ai_analysis_goes_through_the_rate_limiter_once_per_user(sweep_db, tmp_path):
+    sweep = _sweep(sweep_db, tmp_path / 'checkpoint.json', use_llm=True, llm_rate_per_minute=6000)
+    assert sweep.use_llm
+    acquired = 0
+    acquire = sweep.llm_limiter.acquire
+
+    async def count_acquire():
+        nonlocal acquired
+        acquired += 1
+        await acquire()
+
+    sweep.llm_limiter.acquire = count_acquire
+    summary = await sweep.run()
+
+    assert acquired == summary['llm_batches'] == 5
+    assert summary['llm_batches_skipped'] == 0
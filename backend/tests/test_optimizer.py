@@ -0,0 +1,119 @@
+import json
+import re
+import uuid
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def _answer(position, source='batch', **fields):
+    return {
+        'index': position, 'current_plan_fit_score': 0.4, 'optimal_plan': 'Standard',
+        'monthly_savings': 11.0, 'yearly_savings': 132.0, 'reasoning': f"from the {source} call",
+        'confidence': 0.8, 'suggested_actions': ['downgrade'], **fields,
+    }
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """Scripted model answers: batch(positions) -> response text, single() -> dict or raise"""
+    from app.services.gemini_service import gemini_service
+
+    script = {'batch': lambda positions: json.dumps([_answer(p) for p in positions]),
+              'single': lambda: _answer(None, 'single'), 'batches': [], 'singles': 0}
+
+    async def generate(prompt, kind):
+        if kind == 'batch_optimization_analysis':
+            positions = [int(p) for p in re.findall(r'"index": (\d+)', prompt)]
+            script['batches'].append(positions)
+            return script['batch'](positions)
+        script['singles'] += 1
+        answer = script['single']()
+        answer.pop('index', None)
+        return json.dumps(answer)
+
+    monkeypatch.setattr(gemini_service, '_generate', generate)
+    return script
+
+
+async def _subscriptions(count):
+    from app.core.database import AsyncSessionLocal, SubscriptionDB, UserDB
+
+    async with AsyncSessionLocal() as db:
+        user = UserDB(email=f"{uuid.uuid4()}@optimizer.test", hashed_password='x')
+        db.add(user)
+        await db.flush()
+        # Distinct plans, so no answer is already in the LLM cache
+        subscriptions = [
+            SubscriptionDB(user_id=user.id, service_name=f"Service {index}", service_category='Streaming',
+                           plan_name=f"Plan {uuid.uuid4()}", monthly_cost=20.0 + index, billing_cycle='monthly')
+            for index in range(count)
+        ]
+        db.add_all(subscriptions)
+        await db.commit()
+        return subscriptions
+
+
+def _sources(analyses):
+    return [analysis.reasoning.split('\n')[0] for analysis in analyses]
+
+
+async def test_subscriptions_are_packed_into_batches(database, llm, monkeypatch):
+    from app.core.config import settings
+    from app.services.optimizer import SubscriptionOptimizer
+
+    monkeypatch.setattr(settings, 'LLM_BATCH_SIZE', 2)
+    subscriptions = await _subscriptions(3)
+
+    analyses = await SubscriptionOptimizer().analyze_batch(subscriptions)
+
+    assert llm['batches'] == [[0, 1], [0]]
+    assert llm['singles'] == 0
+    assert [analysis.subscription_id for analysis in analyses] == [sub.id for sub in subscriptions]
+    assert _sources(analyses) == ['from the batch call'] * 3
+    assert not any(analysis.degraded for analysis in analyses)
+
+
+async def test_missing_and_invalid_batch_answers_are_retried_alone(database, llm):
+    from app.services.optimizer import SubscriptionOptimizer
+
+    subscriptions = await _subscriptions(5)
+    llm['batch'] = lambda positions: json.dumps([
+        _answer(0),
+        _answer(1, current_plan_fit_score=1.5),  # out of range
+        _answer(0, reasoning='duplicate'),  # index already answered
+        _answer(3, monthly_savings=-4),  # negative savings
+        'not an object',
+        _answer(4),
+        # no answer for 2
+    ])
+
+    analyses = await SubscriptionOptimizer().analyze_batch(subscriptions)
+
+    assert llm['singles'] == 3
+    assert _sources(analyses) == ['from the batch call', 'from the single call', 'from the single call',
+                                  'from the single call', 'from the batch call']
+    assert not any(analysis.degraded for analysis in analyses)
+
+
+async def test_malformed_batch_answer_falls_back_per_item(database, llm):
+    from app.services.optimizer import SubscriptionOptimizer
+
+    subscriptions = await _subscriptions(3)
+    llm['batch'] = lambda positions: 'Sure! Here are the analyses you asked for.'
+    failures = iter([False, True, False])
+
+    def single():
+        if next(failures):
+            raise RuntimeError('model unavailable')
+        return _answer(None, 'single')
+
+    llm['single'] = single
+
+    analyses = await SubscriptionOptimizer().analyze_batch(subscriptions)
+
+    assert llm['singles'] == 3
+    # Only the item whose own retry failed gets the rule-based analysis
+    assert [analysis.degraded for analysis in analyses] == [False, True, False]
+    assert _sources(analyses)[0] == 'from the single call'
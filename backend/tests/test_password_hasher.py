@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import uuid
+
+import pytest
+
+from app.core import security
+from app.core.security import PasswordHasher, PasswordPoolBusy
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def slow_verify(monkeypatch):
+    """verify_password that blocks until released, recording how many run at once"""
+    release = threading.Event()
+    running = {'now': 0, 'peak': 0}
+    lock = threading.Lock()
+
+    def verify_password(plain_password, hashed_password):
+        with lock:
+            running['now'] += 1
+            running['peak'] = max(running['peak'], running['now'])
+        release.wait(5)
+        with lock:
+            running['now'] -= 1
+        return plain_password == hashed_password
+
+    monkeypatch.setattr(security, 'verify_password', verify_password)
+    return release, running
+
+
+async def _settle(condition):
+    for _ in range(200):
+        if condition():
+            return
+        await asyncio.sleep(0.005)
+    raise AssertionError('condition never held')
+
+
+async def test_at_most_max_workers_hash_at_once(slow_verify):
+    release, running = slow_verify
+    hasher = PasswordHasher(max_workers=2, max_pending=10)
+
+    calls = [asyncio.ensure_future(hasher.verify('pw', 'pw')) for _ in range(5)]
+    await _settle(lambda: hasher.in_flight == 2 and hasher.waiting == 3)
+    assert running['now'] == 2
+
+    release.set()
+    assert await asyncio.gather(*calls) == [True] * 5
+    assert running['peak'] == 2
+    assert hasher.stats()['kinds']['verify']['calls'] == 5
+
+
+async def test_callers_beyond_max_pending_are_rejected(slow_verify):
+    release, _ = slow_verify
+    hasher = PasswordHasher(max_workers=1, max_pending=1)
+
+    running = asyncio.ensure_future(hasher.verify('pw', 'pw'))
+    waiting = asyncio.ensure_future(hasher.verify('pw', 'pw'))
+    await _settle(lambda: hasher.in_flight == 1 and hasher.waiting == 1)
+
+    with pytest.raises(PasswordPoolBusy):
+        await hasher.verify('pw', 'pw')
+    assert hasher.rejected == 1
+
+    release.set()
+    assert await asyncio.gather(running, waiting) == [True, True]
+
+
+async def _client():
+    import httpx
+
+    from app.main import app
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test')
+
+
+async def test_busy_pool_answers_503(database, monkeypatch):
+    async def busy(*args):
+        raise PasswordPoolBusy('64 password operations pending')
+
+    monkeypatch.setattr(security.password_hasher, 'verify', busy)
+    monkeypatch.setattr(security.password_hasher, 'hash', busy)
+    email = f"{uuid.uuid4()}@password.test"
+
+    async with await _client() as client:
+        registered = await client.post('/api/auth/register', json={'email': email, 'password': 'secret123'})
+        assert registered.status_code == 503
+        assert registered.headers['retry-after'] == '1'
+
+        from app.core.database import AsyncSessionLocal, UserDB
+
+        async with AsyncSessionLocal() as db:
+            db.add(UserDB(email=email, hashed_password='dev_hash_secret123'))
+            await db.commit()
+        login = await client.post('/api/auth/token', data={'username': email, 'password': 'secret123'})
+        assert login.status_code == 503
+
+
+async def test_login_upgrades_hashes_made_with_another_cost(database):
+    from app.core.config import settings
+    from app.core.database import AsyncSessionLocal, UserDB
+
+    try:
+        weak = security.pwd_context.hash('secret123', rounds=4)
+    except ValueError as e:
+        pytest.skip(f"bcrypt backend unusable here ({e}); requirements pin bcrypt==4.0.1")
+    assert security.password_hasher.needs_rehash(weak)
+    assert not security.password_hasher.needs_rehash('dev_hash_secret123')
+
+    email = f"{uuid.uuid4()}@password.test"
+    async with AsyncSessionLocal() as db:
+        user = UserDB(email=email, hashed_password=weak)
+        db.add(user)
+        await db.commit()
+        user_id = user.id
+
+    async def stored_hash():
+        async with AsyncSessionLocal() as db:
+            return (await db.get(UserDB, user_id)).hashed_password
+
+    async with await _client() as client:
+        assert (await client.post('/api/auth/token', data={'username': email, 'password': 'wrong'})).status_code == 401
+        assert await stored_hash() == weak  # a failed login changes nothing
+
+        assert (await client.post('/api/auth/token', data={'username': email, 'password': 'secret123'})).status_code == 200
+        upgraded = await stored_hash()
+        assert upgraded.startswith(f"$2b${settings.PASSWORD_BCRYPT_ROUNDS:02d}$")
+        assert not security.password_hasher.needs_rehash(upgraded)
+
+        assert (await client.post('/api/auth/token', data={'username': email, 'password': 'secret123'})).status_code == 200
+        assert await stored_hash() == upgraded  # already current: not hashed again
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from app.services.rule_engine import RuleSet
+
+pytest.importorskip('numpy')
+
+NOW = datetime(2024, 6, 1)
+
+RULES = RuleSet.from_config({
+    'expensive': {'when': [('monthly_cost', 'gt', 100)], 'action': 'downgrade', 'priority': 3},
+    'unused': {'when': [('usage', 'le', 1), ('status', 'eq', 'active')], 'action': 'cancel', 'priority': 2},
+    'old': {'when': [('last_used', 'older_than_days', 30)], 'action': 'review', 'priority': 1},
+    'flagged': {'when': [('usage', 'eq', True)], 'action': 'keep', 'priority': 0},
+})
+
+MIXED = [150, '150', True, False, Decimal('150'), None, 150.0, 1, 0, 0.5, float('nan'), 'active', -3]
+
+
+@pytest.mark.parametrize('field', ['monthly_cost', 'usage'])
+def test_batch_and_row_evaluation_agree_on_mixed_types(field):
+    rows = [
+        {'monthly_cost': 10, 'usage': 5, 'status': 'active',
+         'last_used': NOW - timedelta(days=days), field: value}
+        for value in MIXED for days in (0, 90)
+    ]
+
+    batch = RULES.best_rules(rows, NOW)
+    single = [RULES.best_rule(row, NOW) for row in rows]
+
+    assert [rule and rule.name for rule in batch] == [rule and rule.name for rule in single]
@@ -0,0 +1,37 @@
+import uuid
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_reconcile_rewrites_drifted_counters_from_source(database):
+    from sqlalchemy import update
+
+    from app.core.database import AsyncSessionLocal, SubscriptionDB, UserDB
+    from app.services.user_stats import reconcile_user_stats
+
+    async with AsyncSessionLocal() as db:
+        user = UserDB(email=f"{uuid.uuid4()}@stats.test", hashed_password='x')
+        db.add(user)
+        await db.flush()
+        db.add(SubscriptionDB(user_id=user.id, service_name='Netflix', service_category='Streaming',
+                              plan_name='Premium', monthly_cost=55.9,
+                              billing_cycle='monthly', status='active'))
+        await db.commit()
+        user_id = user.id
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(UserDB).where(UserDB.id == user_id)
+                         .values(total_subscriptions=7, total_monthly_spend=0))
+        await db.commit()
+
+    async with AsyncSessionLocal() as db:
+        report = await reconcile_user_stats(db)
+        drifted = {item['user_id']: item['differences'] for item in report['drifted']}
+        assert set(drifted[user_id]) == {'total_subscriptions', 'total_monthly_spend'}
+
+    async with AsyncSessionLocal() as db:
+        user = await db.get(UserDB, user_id)
+        assert (user.total_subscriptions, user.total_monthly_spend) == (1, pytest.approx(55.9))
+        assert (await reconcile_user_stats(db, fix=False))['users_drifted'] == 0
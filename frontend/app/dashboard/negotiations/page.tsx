@@ -10,6 +10,7 @@ interface Message {
   role: 'user' | 'provider';
   content: string;
   timestamp: string;
+  seq?: number;
 }
 
 interface FinalOffer {
@@ -26,7 +27,7 @@ interface Negotiation {
   current_plan: string;
   proposed_savings: number;
   status: 'active' | 'accepted' | 'rejected' | 'expired';
-  messages: Message[];
+  message_count: number;
   offer_accepted: boolean;
   final_offer?: FinalOffer;
   notes?: string;
@@ -39,6 +40,8 @@ export default function NegotiationsPage() {
   const [negotiations, setNegotiations] = useState<Negotiation[]>([]);
   const [loading, setLoading] = useState(true);
   const [expandedId, setExpandedId] = useState<string | null>(null);
+  // Chats are loaded per negotiation when it is expanded (the list carries only counts)
+  const [chats, setChats] = useState<Record<string, Message[]>>({});
   const [messageText, setMessageText] = useState('');
   const [sendingMessage, setSendingMessage] = useState(false);
 
@@ -58,6 +61,38 @@ export default function NegotiationsPage() {
     }
   }
 
+  async function loadMessages(negotiationId: string, beforeSeq?: number) {
+    try {
+      const response = await api.get(`/api/negotiations/${negotiationId}/messages`, {
+        params: beforeSeq ? { before_seq: beforeSeq } : {}
+      });
+      setChats(prev => ({
+        ...prev,
+        [negotiationId]: beforeSeq
+          ? [...response.data.messages, ...(prev[negotiationId] ?? [])]
+          : response.data.messages
+      }));
+      setNegotiations(prev =>
+        prev.map(n =>
+          n.id === negotiationId ? { ...n, message_count: response.data.message_count } : n
+        )
+      );
+    } catch (error) {
+      console.error('Failed to load messages:', error);
+    }
+  }
+
+  function toggleExpanded(negotiationId: string) {
+    if (expandedId === negotiationId) {
+      setExpandedId(null);
+      return;
+    }
+    setExpandedId(negotiationId);
+    if (!chats[negotiationId]) {
+      loadMessages(negotiationId);
+    }
+  }
+
   async function sendMessage(negotiationId: string) {
     if (!messageText.trim()) return;
 
@@ -71,11 +106,15 @@ export default function NegotiationsPage() {
         }
       );
 
-      // Atualizar negociação local
+      // The response carries only the new messages
+      setChats(prev => ({
+        ...prev,
+        [negotiationId]: [...(prev[negotiationId] ?? []), ...response.data.messages]
+      }));
       setNegotiations(prev =>
         prev.map(n =>
           n.id === negotiationId
-            ? { ...n, messages: response.data.messages }
+            ? { ...n, message_count: response.data.message_count }
             : n
         )
       );
@@ -171,11 +210,7 @@ export default function NegotiationsPage() {
             >
               {/* Card Header - Collapsed View */}
               <button
-                onClick={() =>
-                  setExpandedId(
-                    expandedId === negotiation.id ? null : negotiation.id
-                  )
-                }
+                onClick={() => toggleExpanded(negotiation.id)}
                 className="w-full p-4 text-left hover:opacity-75 transition-opacity"
               >
                 <div className="flex items-center justify-between">
@@ -194,7 +229,7 @@ export default function NegotiationsPage() {
                   </div>
                   <div className="text-right">
                     <span className="inline-block px-3 py-1 bg-white rounded-full text-xs font-medium text-gray-700">
-                      {negotiation.messages.length} messages
+                      {negotiation.message_count} messages
                     </span>
                   </div>
                 </div>
@@ -205,9 +240,17 @@ export default function NegotiationsPage() {
                 <div className="border-t-2 border-current p-4 space-y-4 bg-white/50">
                   {/* Chat Messages */}
                   <div className="space-y-3 max-h-96 overflow-y-auto">
-                    {negotiation.messages.map((msg, idx) => (
+                    {(chats[negotiation.id]?.[0]?.seq ?? 1) > 1 && (
+                      <button
+                        onClick={() => loadMessages(negotiation.id, chats[negotiation.id][0].seq)}
+                        className="w-full text-xs text-blue-600 hover:underline"
+                      >
+                        Load earlier messages
+                      </button>
+                    )}
+                    {(chats[negotiation.id] ?? []).map((msg, idx) => (
                       <div
-                        key={idx}
+                        key={msg.seq ?? idx}
                         className={`flex ${
                           msg.role === 'user'
                             ? 'justify-end'
@@ -2,7 +2,7 @@
 import { useState, useEffect, useRef } from 'react';
 import { useRouter } from 'next/navigation';
 import { Bell, Check, X, Sparkles, Plus, Trash2, Mail, FileText } from 'lucide-react';
-import { fetchActivities, getUnreadCount, markAsRead, Activity } from '@/lib/activities';
+import { fetchActivities, getUnreadCount, markAsRead, subscribeToActivities, Activity } from '@/lib/activities';
 import Badge from '@/components/ui/Badge';
 import Card from '@/components/ui/Card';
 import Button from '@/components/ui/Button';
@@ -16,6 +16,20 @@ export default function NotificationDropdown() {
   const dropdownRef = useRef<HTMLDivElement>(null);
 
   useEffect(() => {
+    const unsubscribe = subscribeToActivities({
+      onReady: setUnreadCount,
+      onActivity: (activity) => {
+        if (!activity.read) {
+          setUnreadCount((count) => count + 1);
+        }
+        setActivities((current) => [activity, ...current].slice(0, 5));
+      },
+    });
+    if (unsubscribe) {
+      return unsubscribe;
+    }
+
+    // No streaming support: fall back to polling
     loadUnreadCount();
     const interval = setInterval(loadUnreadCount, 30000); // Poll every 30s
     return () => clearInterval(interval);
@@ -21,6 +21,69 @@ export async function getUnreadCount(): Promise<number> {
   return response.data.count;
 }
 
+/**
+ * Live activity feed over Server-Sent Events (/api/events/stream).
+ * "ready" carries the unread count on every (re)connect; "activity" each new one.
+ * Returns the unsubscribe function, or null when the browser cannot stream.
+ */
+export function subscribeToActivities(handlers: {
+  onReady?: (unreadCount: number) => void;
+  onActivity?: (activity: Activity) => void;
+}): (() => void) | null {
+  if (!localStorage.getItem('access_token') || typeof EventSource === 'undefined') {
+    return null;
+  }
+
+  let source: EventSource | null = null;
+  let retry: ReturnType<typeof setTimeout> | undefined;
+  let failures = 0;
+  let closed = false;
+
+  function reconnect() {
+    source?.close();
+    source = null;
+    if (!closed) {
+      failures += 1;
+      retry = setTimeout(connect, Math.min(1000 * 2 ** failures, 30000));
+    }
+  }
+
+  // EventSource cannot send headers, and a token in the URL ends up in access
+  // logs, so each connection is opened with a one-time ticket. Its built-in
+  // retry would reuse a spent ticket, so every reconnect fetches a new one.
+  async function connect() {
+    let ticket: string;
+    try {
+      ticket = (await api.post('/api/events/ticket')).data.ticket;
+    } catch {
+      reconnect();
+      return;
+    }
+    if (closed) {
+      return;
+    }
+
+    source = new EventSource(
+      `${api.defaults.baseURL}/api/events/stream?ticket=${encodeURIComponent(ticket)}`
+    );
+    source.addEventListener('ready', (event) => {
+      failures = 0;
+      handlers.onReady?.(JSON.parse((event as MessageEvent).data).unread_count);
+    });
+    source.addEventListener('activity', (event) => {
+      handlers.onActivity?.(JSON.parse((event as MessageEvent).data));
+    });
+    source.onerror = reconnect;
+  }
+
+  connect();
+  return () => {
+    closed = true;
+    clearTimeout(retry);
+    source?.close();
+  };
+}
+
 export async function markAsRead(activityId: string): Promise<void> {
   await api.patch(`/api/activities/${activityId}/read`);
 }